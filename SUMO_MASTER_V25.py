@@ -3,7 +3,9 @@ from pybricks.pupdevices import Motor, UltrasonicSensor, Remote, ColorSensor, Fo
 from pybricks.parameters import Button, Color, Direction, Port, Side, Icon, Stop
 from pybricks.robotics import DriveBase
 from pybricks.tools import wait, StopWatch
+from array import array
 import select
+import struct
 import sys
 
 # ==============================================================================
@@ -25,11 +27,15 @@ G_VEL_SENS         = 150     # Velocidad de giro para que el sensor no se "maree
 VELOCIDAD_GOLPE    = 1000    # Potencia del motor D (Máx: 1500) [13, 16].
 ANGULO_GOLPE       = 180     # Recorrido en grados si no hay grabación manual [1, 16].
 PUPPETEERING_ACTIVO = True    # Permite grabar movimientos moviendo el arma con la mano [2, 17].
+PUPPET_MUESTRAS    = 500     # Capacidad de la grabación (muestras de 50 ms, ~25 s).
+PUPPET_TOLERANCIA  = 3       # Error máximo (grados) al reducir la grabación a claves.
 
 # --- D. SENSORES Y ESTRATEGIA (IA de Combate) ---
 DISTANCIA_ATAQUE   = 300     # "Ojo de Halcón": Rango para detectar al rival (mm) [5, 16].
 DISTANCIA_DISPARO  = 100     # Distancia crítica para soltar el martillazo [16, 18].
 ESTRATEGIA_ARIETE  = True    # Tras golpear, retrocede para ganar inercia [19, 20].
+ESTRATEGIA_COMBAT  = "SEMI"  # Estrategia del modo COMBAT (una de ESTRATEGIAS).
+ESTRATEGIA_AUTO    = "AUTO"  # Estrategia del modo AUTO (una de ESTRATEGIAS).
 DIST_RETROCESO     = 150     # Cuántos mm salta hacia atrás en modo Ariete [5, 20].
 UMBRAL_LINEA       = 35      # Calibración del suelo: <35 negro, >45 blanco [16, 21].
 
@@ -40,14 +46,44 @@ MODO_FANTASMA      = False   # Si es True, apaga la matriz en combate para no da
 DOUBLE_VISION_ON   = True    # Muestra números solapados con dos brillos en el Hub [26, 27].
 TIEMPO_ESPERA_INI  = 3000    # Pausa obligatoria por reglamento (ms) [14, 28].
 
+# --- F. MUESTREO DE SENSORES (intervalo mínimo entre lecturas, ms) ---
+PERIODO_OJOS       = 20      # Ultrasonido: refresca cada ~20 ms.
+PERIODO_SUELO      = 10      # Sensor de color (reflexión).
+PERIODO_IMU        = 10      # Orientación del hub (imu.up).
+PERIODO_MANDO      = 15      # Botones del mando (intervalo de conexión BLE).
+PERIODO_BOTONES    = 20      # Botones del hub.
+PERIODO_CONTROL    = 20      # Periodo objetivo del bucle principal (ms).
+
+# --- G. TELEMETRÍA (tramas binarias por stdout, tecla 'r' de la consola PC) ---
+TELEMETRIA_ACTIVA  = True    # Guarda cada tick en el buffer circular del hub.
+TELEMETRIA_MUESTRAS = 128    # Capacidad del buffer circular (ticks).
+TELEMETRIA_TRAMAS  = 4       # Máximo de tramas enviadas por tick.
+CONSOLA_PC_ACTIVA  = True    # Órdenes y teclas del PC por stdin (sección CONSOLA PC).
+ALMACEN_ACTIVO     = True    # Guarda config y grabación en el almacén del hub.
+GRABADOR_ACTIVO    = True    # Traza de entradas y órdenes del combate (tecla 'g' la vuelca).
+GRABADOR_BYTES     = 16384   # Capacidad de la traza; al llenarse deja de grabar.
+
+# --- H. MANDO (reconexión sin bloquear el bucle) ---
+MANDO_ESCANEO_MS   = 8       # Escaneo máximo por tick, sólo con holgura en el tick.
+MANDO_ESPERA_MIN   = 100     # Espera tras el primer intento fallido (ms).
+MANDO_ESPERA_MAX   = 3000    # La espera se duplica en cada fallo hasta este tope.
+
+# --- I. DIFUSIÓN BLE (hub a hub, sin PC conectado) ---
+DIFUSION_CANAL     = None    # Canal (0-255) en el que este hub publica su estado. None: no publica.
+DIFUSION_OBSERVAR  = None    # Canal de otro hub que se escucha (relé). None: no escucha.
+DIFUSION_PERIODO   = 100     # Intervalo mínimo entre publicaciones (ms).
+DIFUSION_LECTURA   = 50      # Intervalo entre lecturas del canal escuchado (ms).
+DIFUSION_SEGUIR_MODO = False # El hub que escucha adopta el modo del que publica.
+
 # ==============================================================================
 
 # --- GLOBALES Y ESTADO ---
-GRABACION_PUPPET = []
+GRABACION_PUPPET = array('h')  # claves (t ms, ángulo) intercaladas
 gear_idx = 1
 m_idx = 0
 pc_control_activo = False
 caido = False
+ko = False
 
 # --- MOTOR GRÁFICO ---
 FUENTES_COMPRIMIDAS = [
@@ -60,37 +96,189 @@ FUENTES_COMPRIMIDAS = [
 CARA_KO = [[100,0,0,0,100],[0,100,0,100,0],[0,0,0,0,0],[0,100,100,100,0],[0,0,0,0,0]]
 KANJI_DAI = [[0,0,100,0,0],[100,100,100,100,100],[0,0,100,0,0],[0,100,0,100,0],[100,0,0,0,100]]
 
+# Framebuffer: tablas de brillo 5x5 precalculadas para los 100 números (una por
+# variante de DOUBLE_VISION_ON) y copia de lo que muestra la matriz, para pintar
+# sólo los píxeles que cambian y saltarse los redibujados idénticos.
+def _tabla_numeros(dv):
+    tabla = bytearray(2500)
+    for n in range(100):
+        fil_d = FUENTES_COMPRIMIDAS[n // 10].replace(":", "")
+        fil_u = FUENTES_COMPRIMIDAS[n % 10].replace(":", "")
+        for i in range(25):
+            brillo = 0
+            if fil_d[i] == '9' and dv: brillo = 100
+            if fil_u[i] == '9':
+                if dv: brillo = max(brillo, 30)
+                else: brillo = 100
+            tabla[n * 25 + i] = brillo
+    return bytes(tabla)
+
+NUMEROS_FB = (_tabla_numeros(False), _tabla_numeros(True))
+FB_APAGADO = -1
+fb = bytearray(25)   # brillo actual de cada píxel (fila * 5 + columna)
+fb_ok = False        # False si la matriz muestra algo que fb no refleja
+fb_clave = None      # número (0-199), icono, carácter o FB_APAGADO en pantalla
+
+def _pintar_fb(tabla, base):
+    global fb_ok
+    for i in range(25):
+        b = tabla[base + i]
+        if b != fb[i] or not fb_ok:
+            hub.display.pixel(i // 5, i % 5, b)
+            fb[i] = b
+    fb_ok = True
+
 def mostrar_num_anton(n):
+    global fb_clave, fb_ok
     if MODO_FANTASMA and m_idx == 2:
-        hub.display.off()
+        if fb_clave != FB_APAGADO:
+            hub.display.off()
+            for i in range(25): fb[i] = 0
+            fb_ok, fb_clave = True, FB_APAGADO
         return
     n = max(0, min(99, n))
-    d, u = n // 10, n % 10
-    mapa_d, mapa_u = FUENTES_COMPRIMIDAS[d], FUENTES_COMPRIMIDAS[u]
-    for r in range(5):
-        fil_d, fil_u = mapa_d.split(":")[r], mapa_u.split(":")[r]
-        for c in range(5):
-            brillo = 0
-            if fil_d[c] == '9' and DOUBLE_VISION_ON: brillo = 100
-            if fil_u[c] == '9': 
-                if DOUBLE_VISION_ON: brillo = max(brillo, 30)
-                else: brillo = 100
-            hub.display.pixel(r, c, brillo)
-
-def tocar_sakura():
-    # Sakura Sakura - Adagio (Lento y Solemne)
-    melodia = [
-        (440, 800), (440, 800), (494, 1600),
-        (440, 800), (440, 800), (494, 1600),
-        (440, 800), (494, 800), (523, 800), (494, 800), (440, 800), (494, 800), (392, 1600)
-    ]
-    for f, d in melodia:
-        hub.speaker.beep(f, d)
-        wait(d // 4)
+    clave = n + 100 if DOUBLE_VISION_ON else n
+    if clave == fb_clave: return
+    _pintar_fb(NUMEROS_FB[1 if DOUBLE_VISION_ON else 0], n * 25)
+    fb_clave = clave
+
+def mostrar_icono(icono):
+    # Iconos propios (listas 5x5) quedan reflejados en fb; los Icon de
+    # Pybricks no, así que el siguiente número se repinta entero
+    global fb_clave, fb_ok
+    if icono is fb_clave: return
+    hub.display.icon(icono)
+    fb_ok = type(icono) is list
+    if fb_ok:
+        for i in range(25): fb[i] = icono[i // 5][i % 5]
+    fb_clave = icono
+
+def mostrar_char(c):
+    global fb_clave, fb_ok
+    if c == fb_clave: return
+    hub.display.char(c)
+    fb_ok, fb_clave = False, c
+
+def mostrar_texto(texto):
+    # display.text() deja la matriz apagada al terminar
+    global fb_clave, fb_ok
+    hub.display.text(texto)
+    for i in range(25): fb[i] = 0
+    fb_ok, fb_clave = True, FB_APAGADO
+
+# Sakura Sakura - Adagio (Lento y Solemne)
+MELODIA_SAKURA = (
+    (440, 800), (440, 800), (494, 1600),
+    (440, 800), (440, 800), (494, 1600),
+    (440, 800), (494, 800), (523, 800), (494, 800), (440, 800), (494, 800), (392, 1600)
+)
+
+def tarea_sakura():
+    # beep(f, -1) deja el tono sonando sin bloquear; beep(f, 0) lo corta
+    try:
+        for f, d in MELODIA_SAKURA:
+            hub.speaker.beep(f, -1)
+            yield d
+            hub.speaker.beep(f, 0)
+            yield d // 4
+    finally:
+        hub.speaker.beep(MELODIA_SAKURA[-1][0], 0)
+
+def tarea_pitido(f, ms):
+    # Pitido corto sin bloquear el tick (cambio de marcha)
+    try:
+        hub.speaker.beep(f, -1)
+        yield ms
+    finally:
+        hub.speaker.beep(f, 0)
+
+# --- ALMACÉN PERSISTENTE ---
+# Imagen binaria en hub.system.storage, leída de una sola vez al arrancar y
+# escrita sólo al salir del menú ingeniero (nunca desde el bucle de control):
+#   "S6" | fletcher16 u16 (de lo que sigue) | versión u8 | claves u8 |
+#   resumen del LIVE CONFIG del script u16 | ALM_CFG | claves puppet (t, ángulo)
+# Si la firma, la versión o la suma no cuadran se arranca con el LIVE CONFIG.
+# Si el LIVE CONFIG del script ha cambiado desde que se guardó, manda el script:
+# se descarta la configuración guardada y sólo se recupera la grabación.
+ALM_TAM = 512
+ALM_VERSION = 1
+ALM_CAB = "<2sHBBH"
+ALM_CFG = "<HHHHHHhHHHBBBBB"
+ALM_OFF_CFG = struct.calcsize(ALM_CAB)
+ALM_OFF_PUPPET = ALM_OFF_CFG + struct.calcsize(ALM_CFG)
+ALM_MAX_CLAVES = (ALM_TAM - ALM_OFF_PUPPET) // 4
+alm_img = bytearray(ALM_TAM)  # última imagen leída o escrita
+
+def _fletcher16(datos, ini, fin):
+    a = b = 0
+    for i in range(ini, fin):
+        a = (a + datos[i]) % 255
+        b = (b + a) % 255
+    return b << 8 | a
+
+def _config_actual():
+    banderas = PUPPETEERING_ACTIVO | ESTRATEGIA_ARIETE << 1 | MODO_FANTASMA << 2 | DOUBLE_VISION_ON << 3
+    return (MARCHAS_CONDUCCION[0], MARCHAS_CONDUCCION[1], MARCHAS_CONDUCCION[2],
+            ACELERACION_BASE, G_VEL_SENS, VELOCIDAD_GOLPE, ANGULO_GOLPE,
+            DISTANCIA_ATAQUE, DISTANCIA_DISPARO, DIST_RETROCESO,
+            UMBRAL_LINEA, VOLUMEN_GENERAL, INDICE_CARA, banderas, gear_idx)
+
+_cfg = struct.pack(ALM_CFG, *_config_actual())
+ALM_DEFECTO = _fletcher16(_cfg, 0, len(_cfg))
+
+def cargar_almacen():
+    global V_MAX, ACELERACION_BASE, G_VEL_SENS, VELOCIDAD_GOLPE, ANGULO_GOLPE
+    global DISTANCIA_ATAQUE, DISTANCIA_DISPARO, DIST_RETROCESO, UMBRAL_LINEA
+    global VOLUMEN_GENERAL, INDICE_CARA, PUPPETEERING_ACTIVO, ESTRATEGIA_ARIETE
+    global MODO_FANTASMA, DOUBLE_VISION_ON, gear_idx, GRABACION_PUPPET
+    try: img = hub.system.storage(0, read=ALM_TAM)
+    except: return  # firmware sin almacén de usuario
+    firma, suma, version, claves, defecto = struct.unpack_from(ALM_CAB, img, 0)
+    fin = ALM_OFF_PUPPET + 4 * claves
+    if firma != b"S6" or version != ALM_VERSION or claves > ALM_MAX_CLAVES \
+            or suma != _fletcher16(img, 4, fin):
+        print("ALMACEN vacio")
+        return
+    alm_img[:] = img
+    if defecto == ALM_DEFECTO:
+        (MARCHAS_CONDUCCION[0], MARCHAS_CONDUCCION[1], MARCHAS_CONDUCCION[2],
+         ACELERACION_BASE, G_VEL_SENS, VELOCIDAD_GOLPE, ANGULO_GOLPE,
+         DISTANCIA_ATAQUE, DISTANCIA_DISPARO, DIST_RETROCESO,
+         UMBRAL_LINEA, VOLUMEN_GENERAL, INDICE_CARA, banderas, gear_idx) = \
+            struct.unpack_from(ALM_CFG, img, ALM_OFF_CFG)
+        PUPPETEERING_ACTIVO = bool(banderas & 1)
+        ESTRATEGIA_ARIETE = bool(banderas & 2)
+        MODO_FANTASMA = bool(banderas & 4)
+        DOUBLE_VISION_ON = bool(banderas & 8)
+        gear_idx = min(gear_idx, 2)
+        V_MAX = MARCHAS_CONDUCCION[gear_idx]
+    if claves: GRABACION_PUPPET = array('h', img[ALM_OFF_PUPPET:fin])
+    print("ALMACEN config=%d claves=%d bytes=%d" % (defecto == ALM_DEFECTO, claves, fin))
+
+def guardar_almacen():
+    # La imagen completa se compone en RAM y se escribe en una sola llamada,
+    # y sólo si difiere de la que ya hay en el almacén
+    claves = len(GRABACION_PUPPET) // 2
+    if claves > ALM_MAX_CLAVES:
+        print("ALMACEN grabacion de %d claves no cabe (max %d)" % (claves, ALM_MAX_CLAVES))
+        claves = 0
+    fin = ALM_OFF_PUPPET + 4 * claves
+    img = bytearray(ALM_TAM)
+    struct.pack_into(ALM_CFG, img, ALM_OFF_CFG, *_config_actual())
+    if claves: img[ALM_OFF_PUPPET:fin] = bytes(GRABACION_PUPPET)
+    struct.pack_into(ALM_CAB, img, 0, b"S6", 0, ALM_VERSION, claves, ALM_DEFECTO)
+    struct.pack_into("<H", img, 2, _fletcher16(img, 4, fin))
+    if img == alm_img: return
+    try: hub.system.storage(0, write=img)
+    except: print("ALMACEN no disponible"); return
+    alm_img[:] = img
 
 # --- HARDWARE ---
-try: hub = PrimeHub()
-except: hub = InventorHub()
+DIF_PUBLICA = DIFUSION_CANAL is not None
+DIF_ESCUCHA = DIFUSION_OBSERVAR is not None
+try: hub = PrimeHub(broadcast_channel=DIFUSION_CANAL, observe_channels=[DIFUSION_OBSERVAR] if DIF_ESCUCHA else [])
+except: hub = InventorHub(broadcast_channel=DIFUSION_CANAL, observe_channels=[DIFUSION_OBSERVAR] if DIF_ESCUCHA else [])
+if ALMACEN_ACTIVO: cargar_almacen()
 hub.speaker.volume(VOLUMEN_GENERAL * 10)
 
 try:
@@ -105,38 +293,825 @@ except:
     print("Error: Hardware ports.")
 
 rc = None
-while rc is None:
-    try: rc = Remote(timeout=500); hub.display.icon(Icon.TRUE); wait(200)
-    except: wait(200)
+
+# --- DIFUSIÓN BLE ---
+# Estado del robot para otro hub, sin PC: un único entero de 16 bits (4 B en el
+# anuncio; una tupla con un valor por campo ocuparía el triple). Además es un
+# small int, así que publicarlo no crea objetos en el heap:
+#   bits 0-7 distancia en cm (255: sin lectura, p. ej. en DRIVE)
+#   bits 8-9 modo   10-11 marcha   12 caído   13-15 seq (cambia en cada publicación)
+# Sale con signo (int16) para que no pase a 4 bytes; quien lo lee hace & 0xFFFF.
+# Sólo se publica si el estado cambió, han pasado DIFUSION_PERIODO ms desde la
+# última publicación y queda holgura en el tick (broadcast rehace el anuncio
+# BLE); entre publicaciones el anuncio sigue en el aire. El hub que escucha lee
+# el canal como un sensor más (sen.vecino, cada DIFUSION_LECTURA ms) y, con
+# cada seq nueva, lo reenvía por stdout a su PC en tramas A5 5D | canal u8 |
+# dato u16 | suma u8 (de canal y dato) y, con DIFUSION_SEGUIR_MODO, adopta el
+# modo del otro hub.
+DIF_NADA = 0xFFFF    # sen.vecino sin dato (marcha 3 no existe: nunca es un estado)
+DIF_SIN_CM = 255
+DIF_HOLGURA = 5      # ms de holgura en el tick para publicar
+
+dif_estado = -1      # último estado publicado (sin seq)
+dif_seq = 0
+dif_t = -100000      # instante de la última publicación (ms)
+dif_visto = DIF_NADA # último dato escuchado ya atendido
+dif_trama = bytearray(6)
+dif_trama[0], dif_trama[1] = 0xA5, 0x5D
+
+def estado_difusion():
+    cm = DIF_SIN_CM if m_idx == 0 else min(DIF_SIN_CM - 1, sen.dist // 10)
+    return cm | m_idx << 8 | gear_idx << 10 | (1 << 12 if caido else 0)
+
+def difundir():
+    global dif_estado, dif_seq, dif_t, DIF_PUBLICA
+    e = estado_difusion()
+    if e == dif_estado or sen.t - dif_t < DIFUSION_PERIODO or holgura_tick() < DIF_HOLGURA: return
+    dif_seq = (dif_seq + 1) & 7
+    v = e | dif_seq << 13
+    try: hub.ble.broadcast(v - 65536 if v >= 32768 else v)
+    except: print("DIFUSION no disponible"); DIF_PUBLICA = False; return
+    dif_estado, dif_t = e, sen.t
+
+def leer_vecino():
+    d = hub.ble.observe(DIFUSION_OBSERVAR)
+    return d & 0xFFFF if isinstance(d, int) else DIF_NADA
+
+def atender_vecino():
+    # Un dato nuevo (otra seq u otro estado): relé a stdout y, si toca, modo
+    global dif_visto
+    d = sen.vecino
+    if d == dif_visto: return
+    dif_visto = d
+    if d == DIF_NADA: return
+    if listo(salida_poll):
+        dif_trama[2], dif_trama[3], dif_trama[4] = DIFUSION_OBSERVAR, d & 0xFF, d >> 8
+        dif_trama[5] = (DIFUSION_OBSERVAR + (d & 0xFF) + (d >> 8)) & 0xFF
+        salida_bin.write(dif_trama)
+    modo = (d >> 8) & 3
+    if DIFUSION_SEGUIR_MODO and modo != m_idx and modo < 3 and not caido and not pc_control_activo:
+        set_mode(modo)
+        leer_sensores()
+
+# --- GRABADOR DE COMBATE ---
+# Traza compacta de todo lo que entra en la lógica (ultrasonido, suelo, lado de
+# la IMU, botones del hub y del mando, conexión del mando, bytes de la consola
+# PC, el canal BLE escuchado y el tick en que el martillo o el chasis terminan un movimiento) y de las
+# órdenes que salen a ambos, para repetir el combate en el PC con
+# tools/repeticion.py. Se escribe sobre un bytearray fijo
+# y sólo se anota lo que cambia; delante de cada grupo va el tiempo transcurrido:
+#   "GR" | versión u8 | bytes del almacén u16 | imagen del almacén al arrancar |
+#   eventos: op u8 + datos (GR_LARGO); GR_TICK y GR_TICK_L avanzan el reloj (ms)
+# Al llenarse deja de grabar, y el menú ingeniero (que lee los botones por su
+# cuenta) la cierra. La tecla 'g' (u opcode 09) la vuelca por stdout sin bloquear
+# el bucle, en tramas fijas A5 5C | seq u16 | n u8 | GR_DATOS bytes | suma u8
+# (de seq, n y datos); la trama con n=0 cierra el volcado.
+GR_TICK, GR_TICK_L, GR_OJOS, GR_OJOS_D, GR_SUELO, GR_LADO, GR_MANDO, GR_BOTONES = 0, 1, 2, 3, 4, 5, 6, 7
+GR_CONEXION, GR_PC, GR_CONDUCIR, GR_PARAR, GR_RECTO, GR_GIRO, GR_ARMA, GR_INICIO = 8, 9, 10, 11, 12, 13, 14, 15
+GR_ARMA_LISTA, GR_CHASIS_LISTO, GR_VECINO = 16, 17, 18
+GR_LARGO = (1, 2, 2, 1, 1, 1, 1, 1, 1, 1, 4, 0, 2, 2, 4, 0, 0, 0, 2)  # bytes de datos por op
+GR_VERSION = 1
+GR_CAB = 5
+GR_DATOS = 32
+GR_LADOS = (Side.TOP, Side.BOTTOM, Side.FRONT, Side.BACK, Side.LEFT, Side.RIGHT)
+GR_MANIOBRA, GR_PARADO = 0x7FFF, 0x7FFE  # gr_g si el último mando del chasis no fue conducir()
+
+gr_buf = bytearray(GRABADOR_BYTES if GRABADOR_ACTIVO else 0)
+gr_activa = GRABADOR_ACTIVO and GRABADOR_BYTES > GR_CAB + ALM_TAM + 8
+gr_n = 0
+gr_t = 0             # instante del último evento anotado (ms)
+gr_ojos = gr_suelo = gr_lado = gr_mando = gr_botones = gr_vecino = -1000
+gr_v, gr_g = 0, GR_MANIOBRA
+gr_trama = bytearray(GR_DATOS + 6)
+gr_trama[0], gr_trama[1] = 0xA5, 0x5C
+gr_volcado = -1      # siguiente byte a volcar (-1 = sin volcado en curso)
+gr_fin_volcado = 0
+gr_seq = 0
+if gr_activa:
+    _alm = ALM_TAM if ALMACEN_ACTIVO else 0
+    struct.pack_into("<2sBH", gr_buf, 0, b"GR", GR_VERSION, _alm)
+    if _alm: gr_buf[GR_CAB:GR_CAB + _alm] = alm_img
+    gr_n = GR_CAB + _alm
+
+def _grabar(op, t, largo):
+    # Anota op (precedido del avance de reloj) y devuelve dónde van sus datos
+    global gr_n, gr_t, gr_activa
+    if not gr_activa: return -1
+    dt = max(0, t - gr_t)
+    if gr_n + largo + 4 + 3 * (dt >> 16) > len(gr_buf):
+        gr_activa = False
+        return -1
+    gr_t = t
+    while dt > 255:
+        d = min(dt, 65535)
+        struct.pack_into("<BH", gr_buf, gr_n, GR_TICK_L, d)
+        gr_n += 3; dt -= d
+    if dt:
+        gr_buf[gr_n] = GR_TICK; gr_buf[gr_n + 1] = dt
+        gr_n += 2
+    gr_buf[gr_n] = op
+    gr_n += 1 + largo
+    return gr_n - largo
+
+def _grabar_u8(op, t, v):
+    i = _grabar(op, t, 1)
+    if i >= 0: gr_buf[i] = v
+
+def _grabar_2h(op, t, a, b):
+    i = _grabar(op, t, 4)
+    if i >= 0: struct.pack_into("<hh", gr_buf, i, a, b)
+
+def grabar_sensores():
+    # Sólo lo que se ha leído en este tick y ha cambiado desde la última anotación
+    global gr_ojos, gr_suelo, gr_lado, gr_mando, gr_botones, gr_vecino
+    t = sen.t
+    if sen.t_dist == t and sen.dist != gr_ojos:
+        d = sen.dist - gr_ojos
+        if -128 <= d < 128: _grabar_u8(GR_OJOS_D, t, d & 0xFF)
+        else:
+            i = _grabar(GR_OJOS, t, 2)
+            if i >= 0: struct.pack_into("<H", gr_buf, i, min(65535, sen.dist))
+        gr_ojos = sen.dist
+    if sen.t_suelo == t and sen.suelo != gr_suelo:
+        _grabar_u8(GR_SUELO, t, sen.suelo); gr_suelo = sen.suelo
+    if sen.t_imu == t:
+        lado = GR_LADOS.index(sen.arriba)
+        if lado != gr_lado: _grabar_u8(GR_LADO, t, lado); gr_lado = lado
+    if sen.t_mando == t and sen.mando != gr_mando:
+        _grabar_u8(GR_MANDO, t, sen.mando); gr_mando = sen.mando
+    if sen.t_botones == t and sen.botones != gr_botones:
+        _grabar_u8(GR_BOTONES, t, sen.botones); gr_botones = sen.botones
+    if sen.t_vecino == t and sen.vecino != gr_vecino:
+        i = _grabar(GR_VECINO, t, 2)
+        if i >= 0: struct.pack_into("<H", gr_buf, i, sen.vecino)
+        gr_vecino = sen.vecino
+
+def grabar_conexion(t, conectado): _grabar_u8(GR_CONEXION, t, conectado)
+def grabar_pc(b): _grabar_u8(GR_PC, sen.t, b)
+
+def grabar_conducir(v, g):
+    global gr_v, gr_g
+    if v == gr_v and g == gr_g: return
+    gr_v, gr_g = v, g
+    _grabar_2h(GR_CONDUCIR, sen.t, v, g)
+
+def grabar_maniobra(op, valor):
+    # parar, recto y giro; el siguiente conducir() se anota aunque repita valores
+    global gr_g
+    if op == GR_PARAR:
+        if gr_g == GR_PARADO: return
+        gr_g = GR_PARADO
+    else: gr_g = GR_MANIOBRA
+    i = _grabar(op, sen.t, GR_LARGO[op])
+    if i >= 0 and op != GR_PARAR: struct.pack_into("<h", gr_buf, i, valor)
+
+def grabar_inicio(): _grabar(GR_INICIO, reloj.time(), 0)
+def grabar_listo(op): _grabar(op, sen.t, 0)
+
+def grabar_fin():
+    global gr_activa
+    gr_activa = False
+
+def volcar_traza():
+    global gr_volcado, gr_fin_volcado, gr_seq
+    gr_volcado, gr_fin_volcado, gr_seq = 0, gr_n, 0
+
+def enviar_traza():
+    # Como la telemetría: sólo mientras el enlace admite bytes (POLLOUT)
+    global gr_volcado, gr_seq
+    n = 0
+    while gr_volcado >= 0 and n < TELEMETRIA_TRAMAS and listo(salida_poll):
+        k = min(GR_DATOS, gr_fin_volcado - gr_volcado)
+        gr_trama[2], gr_trama[3], gr_trama[4] = gr_seq & 0xFF, (gr_seq >> 8) & 0xFF, k
+        suma = gr_trama[2] + gr_trama[3] + k
+        for i in range(GR_DATOS):
+            b = gr_buf[gr_volcado + i] if i < k else 0
+            gr_trama[5 + i] = b
+            suma += b
+        gr_trama[GR_DATOS + 5] = suma & 0xFF
+        salida_bin.write(gr_trama)
+        gr_seq += 1; n += 1
+        gr_volcado = gr_volcado + k if k else -1
+
+# --- PLANIFICADOR COOPERATIVO ---
+# Cada tarea es un generador que hace `yield ms` con la espera mínima antes de
+# reanudarse (0 = siguiente tick). El bucle principal llama a ejecutar_tareas()
+# una vez por tick, así que ninguna secuencia larga bloquea los sensores.
+tareas = {}  # nombre -> [generador, instante de reanudación (ms)]
+TAREAS = ("arma", "ariete", "escape", "sakura", "pitido")  # todas, en orden de ejecución
+reloj = StopWatch()  # reloj monotónico compartido (ms)
+
+def lanzar(nombre, gen):
+    # El primer paso se ejecuta ya, sin esperar al final del tick
+    cancelar(nombre)
+    tareas[nombre] = [gen, 0]
+    _paso(nombre, reloj.time())
+
+def _paso(nombre, ahora):
+    tarea = tareas.get(nombre)
+    if tarea is None or ahora < tarea[1]: return
+    try: tarea[1] = ahora + next(tarea[0])
+    except StopIteration: tareas.pop(nombre, None)
+
+def cancelar(nombre):
+    tarea = tareas.pop(nombre, None)
+    if tarea: tarea[0].close()  # GeneratorExit dentro de la tarea
+
+def cancelar_tareas():
+    for nombre in TAREAS: cancelar(nombre)
+
+def ejecutar_tareas():
+    # Recorre la tupla fija y no list(tareas): ninguna lista nueva por tick
+    ahora = reloj.time()
+    for nombre in TAREAS: _paso(nombre, ahora)
+
+# --- INSTANTÁNEA DE SENSORES ---
+# Se rellena una vez al principio de cada tick y toda la lógica lee de aquí, así
+# las decisiones de un mismo tick ven los mismos valores. Cada dispositivo sólo
+# se vuelve a leer cuando ha pasado su PERIODO_*; si no, se reutiliza el valor.
+# El ultrasonido no se consulta en DRIVE, donde ninguna decisión lo usa, y el
+# suelo sólo si la estrategia del modo vigila el borde. Los botones se guardan
+# como máscara de bits (B_*): pressed() devuelve un conjunto nuevo en cada
+# lectura, que así muere en el acto, y el resto del tick sólo compara enteros.
+BOTONES_BITS = (Button.LEFT, Button.RIGHT, Button.CENTER, Button.BLUETOOTH,
+                Button.LEFT_PLUS, Button.LEFT_MINUS, Button.RIGHT_PLUS, Button.RIGHT_MINUS)
+B_LEFT, B_RIGHT, B_CENTER, B_BLUETOOTH, B_LEFT_PLUS, B_LEFT_MINUS, B_RIGHT_PLUS, B_RIGHT_MINUS = 1, 2, 4, 8, 16, 32, 64, 128
+
+class Instantanea:
+    def __init__(self):
+        self.t = 0
+        self.dist, self.t_dist = 2000, -1000
+        self.suelo, self.t_suelo = 100, -1000
+        self.arriba, self.t_imu = Side.FRONT, -1000
+        self.mando, self.t_mando = 0, -1000
+        self.botones, self.t_botones = 0, -1000
+        self.vecino, self.t_vecino = DIF_NADA, -1000
+
+sen = Instantanea()
+
+def mascara_botones(botones):
+    m = 0
+    for i in range(8):
+        if BOTONES_BITS[i] in botones: m |= 1 << i
+    return m
+
+def leer_sensores():
+    global rc
+    t = reloj.time()
+    sen.t = t
+    if t - sen.t_imu >= PERIODO_IMU: sen.arriba = hub.imu.up(); sen.t_imu = t
+    if m_idx != 0:
+        if t - sen.t_dist >= PERIODO_OJOS:
+            sen.dist = sensor_ojos.distance(); sen.t_dist = t
+            seguir_rival(sen.dist, t)
+        if est_banderas & EST_BORDE and t - sen.t_suelo >= PERIODO_SUELO:
+            sen.suelo = sensor_suelo.reflection(); sen.t_suelo = t
+    if t - sen.t_botones >= PERIODO_BOTONES:
+        sen.botones = mascara_botones(hub.buttons.pressed()); sen.t_botones = t
+    if rc is None: sen.mando = 0
+    elif t - sen.t_mando >= PERIODO_MANDO:
+        try: sen.mando = mascara_botones(rc.buttons.pressed())
+        except: sen.mando = 0; rc = None; grabar_conexion(t, 0)
+        sen.t_mando = t
+    if DIF_ESCUCHA and t - sen.t_vecino >= DIFUSION_LECTURA:
+        sen.vecino = leer_vecino(); sen.t_vecino = t
+    if gr_activa: grabar_sensores()
+
+# --- PLANIFICADOR DE TICK ---
+# El bucle apunta a un periodo fijo: cada tick tiene un instante límite y sólo se
+# duerme lo que falte hasta él. Si un tick se pasa, el siguiente arranca ya
+# (recupera); si se pasa más de un periodo entero, se descartan los ticks
+# perdidos y se vuelve a sincronizar.
+t_tick = 0           # inicio programado del tick en curso (ms)
+t_ini_tick = 0       # inicio real del tick en curso (ms)
+tick_n = 0
+tick_overruns = 0
+tick_jitter_max = 0  # máximo retraso del inicio real frente al programado (ms)
+tick_carga = 0       # trabajo / periodo, media móvil en % (x8 en tick_carga8)
+tick_carga8 = 0
+
+def inicio_tick():
+    global t_ini_tick, tick_n, tick_jitter_max
+    t_ini_tick = reloj.time()
+    jitter = t_ini_tick - t_tick
+    if jitter > tick_jitter_max: tick_jitter_max = jitter
+    tick_n += 1
+
+def esperar_tick():
+    global t_tick, tick_overruns, tick_carga, tick_carga8
+    ahora = reloj.time()
+    carga = (ahora - t_ini_tick) * 100 // PERIODO_CONTROL
+    tick_carga8 += carga - (tick_carga8 >> 3)
+    tick_carga = tick_carga8 >> 3
+    t_tick += PERIODO_CONTROL
+    resto = t_tick - ahora
+    if resto > 0:
+        wait(resto)
+        return
+    tick_overruns += 1
+    if -resto >= PERIODO_CONTROL: t_tick = ahora  # descartar ticks perdidos
+
+def resincronizar_tick():
+    # Tras una pausa larga deliberada (menú ingeniero) no cuenta como retraso
+    global t_tick
+    t_tick = reloj.time()
+
+def holgura_tick():
+    # ms que quedan hasta el límite del tick en curso
+    return t_tick + PERIODO_CONTROL - reloj.time()
+
+def informe_tick():
+    print("TICK n=%d periodo=%d overruns=%d jitter_max=%d carga=%d%%"
+          % (tick_n, PERIODO_CONTROL, tick_overruns, tick_jitter_max, tick_carga))
+
+# --- MANDO: RECONEXIÓN ---
+# Sin mando, cada intento escanea como mucho MANDO_ESCANEO_MS y sólo si cabe en
+# la holgura que le queda al tick, así que el periodo del bucle no se resiente
+# y los modos autónomos siguen a pleno ritmo. Tras cada fallo el siguiente
+# intento se aplaza el doble, de MANDO_ESPERA_MIN hasta MANDO_ESPERA_MAX.
+mando_t_intento = 0    # no se reintenta antes de este instante (ms)
+mando_espera = MANDO_ESPERA_MIN
+mando_intentos = 0
+mando_t_conexion = -1  # instante de la última conexión (ms)
+
+def _intentar_mando(timeout):
+    global rc, mando_intentos, mando_t_conexion, mando_espera
+    mando_intentos += 1
+    try: rc = Remote(timeout=timeout)
+    except: return False
+    mando_t_conexion = reloj.time()
+    mando_espera = MANDO_ESPERA_MIN
+    grabar_conexion(mando_t_conexion, 1)
+    luz_modo()
+    return True
+
+def gestionar_mando():
+    global mando_t_intento, mando_espera
+    if rc is not None or reloj.time() < mando_t_intento: return
+    presupuesto = min(MANDO_ESCANEO_MS, holgura_tick() - 2)
+    if presupuesto < 1: return
+    if not _intentar_mando(presupuesto):
+        mando_t_intento = reloj.time() + mando_espera
+        mando_espera = min(MANDO_ESPERA_MAX, mando_espera * 2)
+
+# --- TELEMETRÍA ---
+# Buffer circular preasignado: un registro de 14 bytes por tick, empaquetado con
+# pack_into sobre un bytearray fijo (sin asignaciones en el heap). Con la
+# emisión activa cada registro sale como trama:
+#   A5 5A | seq u16 | t u32, trabajo u8, dist u16, suelo u8, modo u8,
+#   v i16, giro i16, flags u8 | suma u8 (de seq+registro)
+# Si el enlace no admite más bytes (POLLOUT) las tramas esperan en el buffer y,
+# cuando éste se llena, se pierden las más antiguas; el bucle nunca se bloquea.
+TEL_FMT = "<IBHBBhhB"
+TEL_REG = 14
+TEL_TRAMA = TEL_REG + 5
+F_CAIDO, F_PC, F_ARMA, F_ARIETE, F_ESCAPE, F_MANDO = 1, 2, 4, 8, 16, 32
+
+tel_buf = bytearray(TELEMETRIA_MUESTRAS * TEL_REG)
+tel_trama = bytearray(TEL_TRAMA)
+tel_trama[0], tel_trama[1] = 0xA5, 0x5A
+tel_escrito = 0      # registros escritos desde el arranque
+tel_enviado = 0      # registros ya enviados (o descartados)
+tel_perdidas = 0
+tel_emitir = False
+cmd_v, cmd_g = 0, 0  # última orden de conducción
+
+salida_bin = sys.stdout.buffer
+salida_poll = select.poll()
+salida_poll.register(sys.stdout, select.POLLOUT)
+
+def listo(p):
+    # ipoll() itera sobre el propio objeto poll; poll() crearía una lista nueva
+    for _ in p.ipoll(0): return True
+    return False
+
+def conducir(v, g):
+    global cmd_v, cmd_g
+    cmd_v, cmd_g = v, g
+    grabar_conducir(v, g)
+    db.drive(v, g)
+
+def parar():
+    global cmd_v, cmd_g
+    cmd_v, cmd_g = 0, 0
+    grabar_maniobra(GR_PARAR, 0)
+    db.stop()
+
+def recto(mm):
+    global cmd_v, cmd_g
+    cmd_v, cmd_g = 0, 0
+    grabar_maniobra(GR_RECTO, mm)
+    db.straight(mm, wait=False)
+
+def girar(grados):
+    global cmd_v, cmd_g
+    cmd_v, cmd_g = 0, 0
+    grabar_maniobra(GR_GIRO, grados)
+    db.turn(grados, wait=False)
+
+def mover_arma(v, ang):
+    _grabar_2h(GR_ARMA, sen.t, v, ang)
+    mot_d.run_target(v, ang, wait=False)
+
+def registrar_tick():
+    global tel_escrito
+    flags = 0
+    if caido: flags |= F_CAIDO
+    if pc_control_activo: flags |= F_PC
+    if "arma" in tareas: flags |= F_ARMA
+    if "ariete" in tareas: flags |= F_ARIETE
+    if "escape" in tareas: flags |= F_ESCAPE
+    if rc is not None: flags |= F_MANDO
+    struct.pack_into(TEL_FMT, tel_buf, (tel_escrito % TELEMETRIA_MUESTRAS) * TEL_REG,
+                     sen.t, min(255, reloj.time() - t_ini_tick), min(65535, sen.dist),
+                     sen.suelo, m_idx, cmd_v, cmd_g, flags)
+    tel_escrito += 1
+
+def enviar_telemetria():
+    global tel_enviado, tel_perdidas
+    if tel_escrito - tel_enviado > TELEMETRIA_MUESTRAS:
+        tel_perdidas += tel_escrito - tel_enviado - TELEMETRIA_MUESTRAS
+        tel_enviado = tel_escrito - TELEMETRIA_MUESTRAS
+    n = 0
+    while tel_enviado < tel_escrito and n < TELEMETRIA_TRAMAS and listo(salida_poll):
+        off = (tel_enviado % TELEMETRIA_MUESTRAS) * TEL_REG
+        seq = tel_enviado & 0xFFFF
+        tel_trama[2], tel_trama[3] = seq & 0xFF, seq >> 8
+        suma = tel_trama[2] + tel_trama[3]
+        for i in range(TEL_REG):
+            b = tel_buf[off + i]
+            tel_trama[4 + i] = b
+            suma += b
+        tel_trama[TEL_TRAMA - 1] = suma & 0xFF
+        salida_bin.write(tel_trama)
+        tel_enviado += 1; n += 1
+
+def telemetria_tick():
+    global tel_enviado
+    if not TELEMETRIA_ACTIVA: return
+    registrar_tick()
+    if tel_emitir: enviar_telemetria()
+    else: tel_enviado = tel_escrito
+
+# --- PUPPETEERING ---
+# La grabación llena un array('h') de capacidad fija con pares (t ms, ángulo) y,
+# al terminar, se reduce a claves con Douglas-Peucker sobre ángulo(t): sólo se
+# conservan los puntos que se alejan más de PUPPET_TOLERANCIA grados de la recta
+# entre sus vecinos. Al reproducir, cada tramo ordena run_target hacia la clave
+# siguiente a la velocidad que la hace llegar a su hora, y cada tick se compara
+# el ángulo real con la trayectoria interpolada (error de reproducción).
+puppet_crudo = array('h', bytearray(4 * PUPPET_MUESTRAS)) if PUPPETEERING_ACTIVO else None
+puppet_muestras = 0    # muestras de la última grabación
+puppet_err_simpl = 0   # peor desviación descartada al simplificar (grados)
+puppet_err_max = 0     # error de la última reproducción (grados)
+puppet_err_suma = 0
+puppet_err_n = 0
+
+def simplificar_puppet(n):
+    global puppet_err_simpl
+    c = puppet_crudo
+    marca = bytearray(n)
+    marca[0] = marca[n - 1] = 1
+    pila = [(0, n - 1)]
+    puppet_err_simpl = 0
+    while pila:
+        i, j = pila.pop()
+        ti, ai, tj, aj = c[2*i], c[2*i + 1], c[2*j], c[2*j + 1]
+        peor, k_peor = 0, -1
+        for k in range(i + 1, j):
+            e = abs(c[2*k + 1] - ai - (aj - ai) * (c[2*k] - ti) // max(1, tj - ti))
+            if e > peor: peor, k_peor = e, k
+        if peor > PUPPET_TOLERANCIA:
+            marca[k_peor] = 1
+            pila.append((i, k_peor)); pila.append((k_peor, j))
+        elif peor > puppet_err_simpl: puppet_err_simpl = peor
+    claves = array('h')
+    for k in range(n):
+        if marca[k]: claves.append(c[2*k]); claves.append(c[2*k + 1])
+    return claves
+
+def informe_puppet():
+    claves = len(GRABACION_PUPPET) // 2
+    print("PUPPET muestras=%d claves=%d bytes=%d buffer=%d err_simpl=%d err_max=%d err_medio=%d"
+          % (puppet_muestras, claves, 4 * claves, 4 * PUPPET_MUESTRAS if PUPPETEERING_ACTIVO else 0,
+             puppet_err_simpl, puppet_err_max, puppet_err_suma // max(1, puppet_err_n)))
+
+def impacto_puppet():
+    # Instante de la clave más alejada del reposo: ahí golpea la grabación
+    c = GRABACION_PUPPET
+    t, mejor = 0, -1
+    for k in range(0, len(c), 2):
+        if abs(c[k + 1]) > mejor: t, mejor = c[k], abs(c[k + 1])
+    return t
+
+# --- SEGUIMIENTO DEL RIVAL ---
+# Mediana de las 3 últimas lecturas del ultrasonido (un eco suelto no mueve
+# nada) y filtro alfa-beta en enteros: distancia (mm) y velocidad de cierre
+# (mm/s, positiva si el rival se acerca). El disparo se adelanta el tiempo que
+# tarda el martillo en llegar (t_arma, medido en cada golpe): se dispara si la
+# distancia prevista para cuando llegue ya es menor que DISTANCIA_DISPARO.
+# Un rival que aparece de golpe cerca (el barrido de BUSCAR lo pone delante)
+# no espera a que la mediana y la puerta lo acepten: dos lecturas seguidas
+# dentro de DISTANCIA_ATAQUE, separadas un PERIODO_OJOS y coherentes entre sí
+# (RIVAL_COHERENCIA) lo fijan ya confirmado. Un eco corto suelto nunca basta.
+RIVAL_SIN_ECO = 2000   # lectura del sensor cuando no hay nada delante
+RIVAL_ALFA = 4         # ganancia de posición, /8
+RIVAL_BETA = 2         # ganancia de velocidad, /16
+RIVAL_PUERTA = 120     # mm: una innovación mayor es un eco espurio...
+RIVAL_SALTOS = 2       # ...salvo que se repita: entonces el rival es otro
+RIVAL_COHERENCIA = 10  # mm entre dos lecturas cercanas seguidas para fijar al rival
+RIVAL_VEL_MAX = 3000   # mm/s; acota el adelanto
+riv_z1 = riv_z2 = RIVAL_SIN_ECO  # lecturas anteriores
+riv_dist = RIVAL_SIN_ECO
+riv_vel = 0
+riv_t = 0
+riv_n = 0              # muestras seguidas en seguimiento (0 = sin rival)
+riv_saltos = 0
+t_arma = impacto_puppet() if GRABACION_PUPPET else ANGULO_GOLPE * 1000 // VELOCIDAD_GOLPE
+
+def _mediana3(a, b, c):
+    if a > b: a, b = b, a
+    if b > c: b = c
+    return a if a > b else b
+
+def seguir_rival(z, t):
+    global riv_z1, riv_z2, riv_dist, riv_vel, riv_t, riv_n, riv_saltos
+    m = _mediana3(z, riv_z1, riv_z2)
+    z1 = riv_z1
+    riv_z2 = riv_z1; riv_z1 = z
+    dt = t - riv_t
+    riv_t = t
+    if (z < DISTANCIA_ATAQUE and -RIVAL_COHERENCIA <= z - z1 <= RIVAL_COHERENCIA and dt <= 2 * PERIODO_OJOS
+            and (riv_n == 0 or riv_dist - z >= RIVAL_PUERTA)):
+        # Dos lecturas cercanas coherentes seguidas: el rival está ahí
+        riv_dist = z; riv_vel = 0
+        riv_n = 2 if riv_n < 2 else riv_n + 1; riv_saltos = 0
+        return
+    if riv_n > 0 and 0 < dt <= 200:
+        pred = riv_dist - riv_vel * dt // 1000
+        e = pred - m  # > 0: más cerca de lo previsto
+        if -RIVAL_PUERTA < e < RIVAL_PUERTA:
+            riv_dist = pred - e * RIVAL_ALFA // 8
+            riv_vel = max(-RIVAL_VEL_MAX, min(RIVAL_VEL_MAX, riv_vel + e * 1000 * RIVAL_BETA // (16 * dt)))
+            riv_n += 1; riv_saltos = 0
+            return
+        riv_saltos += 1
+        if riv_saltos < RIVAL_SALTOS:
+            riv_dist = pred  # se ignora la lectura y se extrapola
+            return
+    # Sin rival, rival nuevo o lectura muy antigua: se arranca sin velocidad
+    riv_saltos = 0; riv_dist = m; riv_vel = 0
+    riv_n = 0 if m >= RIVAL_SIN_ECO else 1
+
+def rival_en_rango():
+    return riv_n > 0 and riv_dist < DISTANCIA_ATAQUE
+
+def rival_a_tiro():
+    # La mediana va una lectura por detrás en una rampa: se suma al adelanto
+    adelanto = riv_vel * (t_arma + PERIODO_OJOS) // 1000 if riv_vel > 0 else 0
+    return riv_n >= 2 and riv_dist - adelanto < DISTANCIA_DISPARO
+
+def medir_arma(ms):
+    global t_arma
+    t_arma = (3 * t_arma + ms) // 4
 
 # --- LÓGICA DE COMBATE ---
+def tarea_arma():
+    global puppet_err_max, puppet_err_suma, puppet_err_n
+    try:
+        if GRABACION_PUPPET:
+            c = GRABACION_PUPPET
+            t_fin = c[len(c) - 2]
+            puppet_err_max = puppet_err_suma = puppet_err_n = 0
+            t0 = reloj.time(); k = -1
+            while True:
+                t = reloj.time() - t0
+                if t >= t_fin: break
+                j = max(k, 0)
+                while c[2*j + 2] <= t: j += 1
+                ang = mot_d.angle()
+                if j != k:
+                    # Tramo nuevo: llegar a la clave j+1 justo a su hora
+                    k = j
+                    v = abs(c[2*k + 3] - ang) * 1000 // max(1, c[2*k + 2] - t)
+                    mover_arma(max(50, min(1500, v)), c[2*k + 3])
+                else:
+                    t_k, a_k = c[2*k], c[2*k + 1]
+                    ref = a_k + (c[2*k + 3] - a_k) * (t - t_k) // (c[2*k + 2] - t_k)
+                    e = abs(ang - ref)
+                    if e > puppet_err_max: puppet_err_max = e
+                    puppet_err_suma += e; puppet_err_n += 1
+                yield 0
+        else:
+            t0 = reloj.time()
+            mover_arma(VELOCIDAD_GOLPE, ANGULO_GOLPE)
+            while not mot_d.done(): yield 0
+            grabar_listo(GR_ARMA_LISTA)
+            medir_arma(reloj.time() - t0)
+        mover_arma(VELOCIDAD_GOLPE, 0)
+        while not mot_d.done(): yield 0
+        grabar_listo(GR_ARMA_LISTA)
+    except GeneratorExit:
+        # Golpe abortado (p. ej. por el borde): recoger el martillo
+        mover_arma(VELOCIDAD_GOLPE, 0)
+        raise
+
 def accionar_arma():
-    if GRABACION_PUPPET:
-        for p in GRABACION_PUPPET:
-            mot_d.run_target(VELOCIDAD_GOLPE, p, wait=False)
-            wait(50)
-        mot_d.run_target(VELOCIDAD_GOLPE, 0)
-    else:
-        mot_d.run_target(VELOCIDAD_GOLPE, ANGULO_GOLPE)
-        mot_d.run_target(VELOCIDAD_GOLPE, 0)
+    if "arma" not in tareas: lanzar("arma", tarea_arma())
+
+def tarea_ariete():
+    # Tras golpear, retrocede y vuelve a la carga
+    while "arma" in tareas: yield 0
+    recto(-DIST_RETROCESO)
+    while not db.done(): yield 0
+    grabar_listo(GR_CHASIS_LISTO)
+    conducir(V_MAX, 0)
+    yield 400
+
+def tarea_escape():
+    recto(-100)
+    while not db.done(): yield 0
+    grabar_listo(GR_CHASIS_LISTO)
+    girar(120)
+    while not db.done(): yield 0
+    grabar_listo(GR_CHASIS_LISTO)
+
+COLORES_MODO = (Color.GREEN, Color.ORANGE, Color.MAGENTA, Color.BLUE)
+
+def luz_modo():
+    hub.light.on(COLORES_MODO[m_idx])
+    if rc: 
+        try: rc.light.on(COLORES_MODO[m_idx])
+        except: pass
 
 def set_mode(n):
     global m_idx
     m_idx = n
-    cols = [Color.GREEN, Color.ORANGE, Color.MAGENTA, Color.BLUE]
-    hub.light.on(cols[m_idx])
-    if rc: 
-        try: rc.light.on(cols[m_idx])
-        except: pass
+    luz_modo()
+    iniciar_estrategia(ESTRATEGIAS_MODO[n])
+
+# --- MÁQUINA DE ESTADOS ---
+# Cada modo sigue una estrategia: una tabla (estado, evento) -> estado
+# precalculada en un bytearray. En cada tick el estado actual produce un evento
+# y la tabla da el siguiente, así que el despacho es O(1) y sin cadenas if/elif.
+# Caída, borde y presupuesto de tiempo se evalúan antes que el propio estado:
+# la huida del borde siempre gana a un ataque. Para una estrategia nueva basta
+# con añadirla a ESTRATEGIAS y elegirla en ESTRATEGIA_COMBAT / ESTRATEGIA_AUTO.
+E_MANUAL, E_BUSCAR, E_CARGA, E_GOLPE, E_RETIRADA, E_BORDE, E_CAIDO = 0, 1, 2, 3, 4, 5, 6
+N_ESTADOS = 7
+EV_NADA, EV_RIVAL, EV_PERDIDO, EV_A_TIRO, EV_FIN, EV_TIEMPO, EV_BORDE, EV_CAIDA, EV_LEVANTADO = 0, 1, 2, 3, 4, 5, 6, 7, 8
+N_EVENTOS = 9
+EST_BORDE, EST_AVISO = 1, 2  # banderas: vigila el borde / luz roja al cargar
+# ms que puede durar cada estado antes de EV_TIEMPO (0 = sin límite)
+PRESUPUESTO = (0, 0, 3000, 2000, 1500, 4000, 0)
+
+sw_caida = StopWatch()
+estado = E_MANUAL
+t_estado = 0
+est_tabla = None
+est_banderas = 0
+
+def _entrar_carga():
+    if est_banderas & EST_AVISO: hub.light.pulse(Color.RED, 500)
+    conducir(V_MAX, 0)
+
+def _entrar_retirada(): lanzar("ariete", tarea_ariete())
+def _salir_retirada(): cancelar("ariete")
+
+def _entrar_borde():
+    # Anti-Salida: aborta el golpe en curso
+    cancelar("arma")
+    lanzar("escape", tarea_escape())
+
+def _salir_borde(): cancelar("escape")
+
+def _entrar_caido():
+    global caido, ko
+    caido = True; ko = False
+    sw_caida.reset(); cancelar_tareas(); parar()
+
+def _salir_caido():
+    global caido
+    caido = False
+    cancelar("sakura"); luz_modo()
+
+def _paso_manual():
+    pressed = sen.mando
+    s, t = 0, 0
+    if pressed & B_LEFT_PLUS: s = V_MAX
+    if pressed & B_LEFT_MINUS: s = -V_MAX
+    if pressed & B_RIGHT_PLUS: t = G_VEL_SENS * 3
+    if pressed & B_RIGHT_MINUS: t = -G_VEL_SENS * 3
+    conducir(s, t)
+    if pressed & B_LEFT: accionar_arma()
+    return EV_NADA
+
+def _paso_buscar():
+    if rival_en_rango(): return EV_RIVAL
+    conducir(0, G_VEL_SENS)
+    return EV_NADA
+
+def _paso_carga():
+    if not rival_en_rango(): return EV_PERDIDO
+    conducir(V_MAX, 0)
+    return EV_A_TIRO if rival_a_tiro() else EV_NADA
+
+def _paso_golpe():
+    if "arma" not in tareas: return EV_FIN
+    return EV_NADA if rival_en_rango() else EV_PERDIDO
+
+def _paso_retirada(): return EV_NADA if "ariete" in tareas else EV_FIN
+def _paso_borde(): return EV_NADA if "escape" in tareas else EV_FIN
+
+def _paso_caido():
+    # Sakura Respect: cuenta atrás de 9 s y, si sigue caído, KO
+    global ko
+    if sen.arriba == Side.FRONT: return EV_LEVANTADO
+    t = 9000 - sw_caida.time()
+    if t > 0: mostrar_num_anton(t // 1000)
+    elif not ko:
+        ko = True
+        mostrar_icono(CARA_KO)
+        lanzar("sakura", tarea_sakura())
+    return EV_NADA
+
+# Por estado, en el orden de E_*: acción de cada tick, de entrada y de salida
+PASO = (_paso_manual, _paso_buscar, _paso_carga, _paso_golpe, _paso_retirada, _paso_borde, _paso_caido)
+ENTRAR = (None, None, _entrar_carga, accionar_arma, _entrar_retirada, _entrar_borde, _entrar_caido)
+SALIR = (None, None, None, None, _salir_retirada, _salir_borde, _salir_caido)
+
+def _estrategia(inicial, banderas, reglas):
+    # Sin regla, un evento deja el estado como está. Comunes a todas: caer
+    # lleva a E_CAIDO y al levantarse se vuelve a empezar por `inicial`.
+    tabla = bytearray(N_ESTADOS * N_EVENTOS)
+    for e in range(N_ESTADOS):
+        for ev in range(N_EVENTOS): tabla[e * N_EVENTOS + ev] = e
+        tabla[e * N_EVENTOS + EV_CAIDA] = E_CAIDO
+        if banderas & EST_BORDE and e != E_CAIDO: tabla[e * N_EVENTOS + EV_BORDE] = E_BORDE
+    tabla[E_CAIDO * N_EVENTOS + EV_LEVANTADO] = inicial
+    for e, ev, sig in reglas: tabla[e * N_EVENTOS + ev] = sig
+    return (tabla, inicial, banderas)
+
+ESTRATEGIAS = {
+    # DRIVE: manda el piloto; sólo la caída interrumpe
+    "MANDO": _estrategia(E_MANUAL, 0, ()),
+    # COMBAT: gira buscando, carga y golpea; el borde lo vigila el piloto
+    "SEMI": _estrategia(E_BUSCAR, EST_AVISO, (
+        (E_BUSCAR, EV_RIVAL, E_CARGA),
+        (E_CARGA, EV_PERDIDO, E_BUSCAR), (E_CARGA, EV_A_TIRO, E_GOLPE), (E_CARGA, EV_TIEMPO, E_BUSCAR),
+        (E_GOLPE, EV_FIN, E_CARGA), (E_GOLPE, EV_PERDIDO, E_BUSCAR), (E_GOLPE, EV_TIEMPO, E_CARGA))),
+    # AUTO: además huye del borde y, con ESTRATEGIA_ARIETE, retrocede tras golpear
+    "AUTO": _estrategia(E_BUSCAR, EST_BORDE, (
+        (E_BUSCAR, EV_RIVAL, E_CARGA),
+        (E_CARGA, EV_PERDIDO, E_BUSCAR), (E_CARGA, EV_A_TIRO, E_GOLPE), (E_CARGA, EV_TIEMPO, E_BUSCAR),
+        (E_GOLPE, EV_FIN, E_RETIRADA if ESTRATEGIA_ARIETE else E_CARGA),
+        (E_GOLPE, EV_PERDIDO, E_GOLPE if ESTRATEGIA_ARIETE else E_BUSCAR), (E_GOLPE, EV_TIEMPO, E_CARGA),
+        (E_RETIRADA, EV_FIN, E_CARGA), (E_RETIRADA, EV_TIEMPO, E_CARGA),
+        (E_BORDE, EV_FIN, E_BUSCAR), (E_BORDE, EV_TIEMPO, E_BUSCAR))),
+}
+ESTRATEGIAS_MODO = (ESTRATEGIAS["MANDO"], ESTRATEGIAS[ESTRATEGIA_COMBAT], ESTRATEGIAS[ESTRATEGIA_AUTO])
+
+def cambiar_estado(e):
+    global estado, t_estado
+    f = SALIR[estado]
+    if f: f()
+    estado = e; t_estado = sen.t
+    f = ENTRAR[e]
+    if f: f()
+
+def iniciar_estrategia(est):
+    global est_tabla, est_banderas
+    est_tabla, est_banderas = est[0], est[2]
+    cambiar_estado(est[1])
+
+def _transicion(ev):
+    e = est_tabla[estado * N_EVENTOS + ev]
+    if e == estado: return False
+    cambiar_estado(e)
+    return True
+
+def ejecutar_estado():
+    # Primero los eventos prioritarios; si no cambian de estado, actúa el estado
+    if sen.arriba != Side.FRONT: ev = EV_CAIDA
+    elif pc_control_activo and estado != E_CAIDO: return  # conduce el PC
+    elif est_banderas & EST_BORDE and sen.suelo < UMBRAL_LINEA: ev = EV_BORDE
+    elif PRESUPUESTO[estado] and sen.t - t_estado >= PRESUPUESTO[estado]: ev = EV_TIEMPO
+    else: ev = EV_NADA
+    if _transicion(ev): return
+    # Tras un cambio, el estado nuevo actúa ya en este tick (una sola vez: así
+    # BUSCAR -> CARGA -> GOLPE no pierde un tick si el rival ya está a tiro)
+    if _transicion(PASO[estado]()): _transicion(PASO[estado]())
 
 def ejecutar_modo_ingeniero():
-    global V_MAX, gear_idx, GRABACION_PUPPET
-    db.stop(); mot_d.stop()
+    global V_MAX, gear_idx, GRABACION_PUPPET, puppet_muestras, t_arma
+    grabar_fin()  # el menú lee los botones por su cuenta: la traza acaba aquí
+    cancelar_tareas()
+    parar(); mot_d.stop()
     hub.speaker.beep(1000, 100)
     while Button.BLUETOOTH in hub.buttons.pressed(): wait(10)
-    opciones = ["M", "V", "C"]; o_idx = 0
+    opciones = ["M", "V", "C", "T"]; o_idx = 0
     while True:
-        hub.display.char(opciones[o_idx])
+        mostrar_char(opciones[o_idx])
         btns = hub.buttons.pressed()
         if Button.RIGHT in btns: o_idx = (o_idx + 1) % len(opciones); wait(250)
         elif Button.LEFT in btns: o_idx = (o_idx - 1) % len(opciones); wait(250)
@@ -145,14 +1120,21 @@ def ejecutar_modo_ingeniero():
             hub.speaker.beep(1500, 100); wait(500)
             if op == "M" and PUPPETEERING_ACTIVO:
                 mot_d.stop(Stop.COAST)
-                temp_gr = []
-                hub.display.icon(Icon.CLOCK)
-                while not Button.BLUETOOTH in hub.buttons.pressed():
-                    ang = mot_d.angle()
-                    temp_gr.append(ang)
+                mostrar_icono(Icon.CLOCK)
+                n = 0; t0 = reloj.time()
+                while n < PUPPET_MUESTRAS and not Button.BLUETOOTH in hub.buttons.pressed():
+                    t = reloj.time() - t0
+                    if t > 32000: break  # los tiempos se guardan en 16 bits
+                    ang = max(-32768, min(32767, mot_d.angle()))
+                    puppet_crudo[2*n] = t; puppet_crudo[2*n + 1] = ang
+                    n += 1
                     mostrar_num_anton(abs(ang) // 10)
                     wait(50)
-                if len(temp_gr) > 5: GRABACION_PUPPET = temp_gr
+                if n > 5:
+                    GRABACION_PUPPET = simplificar_puppet(n)
+                    puppet_muestras = n
+                    t_arma = impacto_puppet()
+                    informe_puppet()
                 mot_d.run_target(VELOCIDAD_GOLPE, 0)
             elif op == "V":
                 while not Button.BLUETOOTH in hub.buttons.pressed():
@@ -160,102 +1142,253 @@ def ejecutar_modo_ingeniero():
                     if Button.RIGHT in b: gear_idx = (gear_idx + 1) % 3; wait(250)
                     V_MAX = MARCHAS_CONDUCCION[gear_idx]
                     mostrar_num_anton(V_MAX // 10)
-            hub.display.text("OK"); wait(500); set_mode(m_idx); break
+            elif op == "T":
+                # Tiempos del bucle: carga media en pantalla, detalle por stdout
+                informe_tick(); informe_puppet()
+                while not Button.BLUETOOTH in hub.buttons.pressed():
+                    mostrar_num_anton(min(99, tick_carga))
+                    wait(50)
+            if ALMACEN_ACTIVO: guardar_almacen()
+            mostrar_texto("OK"); wait(500); set_mode(m_idx); break
         wait(10)
 
-# --- BUCLE PRINCIPAL ---
+# --- CONSOLA PC ---
+# Cada tick se vacía todo lo pendiente en stdin (hasta PC_BYTES_TICK bytes) con
+# un decodificador de estados sin asignaciones, y sólo se aplica la orden de
+# conducción más reciente. Trama PC -> hub:
+#   AA | op | datos | suma u8 (de op + datos)
+#   01 conducir: seq u8, v i16, giro i16    02 parar    03 golpe
+#   04 ping: seq u8    05 telemetría: 0/1    06 informe de tiempos
+#   07 ajuste: id u8, valor i16    08 confirmar ajustes: seq u8
+#   09 volcar la traza del combate (ver GRABADOR DE COMBATE)
+# Respuesta hub -> PC (conducir aplicado y ping): AA | 80+op | seq | suma
+# Fuera de trama, los bytes ASCII siguen siendo las teclas de siempre.
+PC_SYNC = 0xAA
+PC_LARGO = (0, 5, 0, 0, 1, 1, 0, 3, 1, 0)  # bytes de datos por opcode
+PC_BYTES_TICK = 64
+PC_V_LIMITE = max(MARCHAS_CONDUCCION)  # se recalcula al confirmar ajustes
+PC_GIRO_LIMITE = 720
+ORDEN_NADA, ORDEN_CONDUCIR, ORDEN_PARAR = 0, 1, 2
+
 input_poll = select.poll()
 input_poll.register(sys.stdin, select.POLLIN)
-sw_caida, sw_ing = StopWatch(), StopWatch()
+entrada_bin = sys.stdin.buffer
+pc_b1 = bytearray(1)
+pc_datos = bytearray(5)
+pc_resp = bytearray(4)
+pc_resp[0] = PC_SYNC
+pc_estado = 0        # 0 fuera de trama, 1 opcode, 2 datos, 3 suma
+pc_op = 0
+pc_pos = 0
+pc_suma = 0
+pc_orden = ORDEN_NADA  # orden de conducción pendiente de este tick
+pc_v = 0
+pc_g = 0
+pc_seq = -1          # seq a confirmar (-1 = tecla suelta, sin ack)
+
+# Ajustes en caliente: cada 07 deja un parámetro en una zona de preparación y
+# 08 confirma el lote. Si todo está en rango (y DISPARO <= ATAQUE) se aplica de
+# golpe y responde AA 88 seq; si no, se descarta entero y responde AA 89 seq.
+# db.settings sólo se repite si cambia V_MAX, ACELERACION_BASE o G_VEL_SENS.
+# V_MAX vale hasta el próximo cambio de marcha: la tabla de marchas (la que
+# guarda el almacén) no se toca. El tope de la consola PC es la marcha más
+# larga o el V_MAX recargado, si es mayor.
+# ids: 0 V_MAX, 1 ACELERACION_BASE, 2 G_VEL_SENS, 3 DISTANCIA_ATAQUE,
+#      4 DISTANCIA_DISPARO, 5 DIST_RETROCESO, 6 UMBRAL_LINEA, 7 VELOCIDAD_GOLPE
+AJ_MIN = (50, 100, 20, 40, 40, 0, 0, 50)
+AJ_MAX = (1000, 2000, 720, 2000, 2000, 500, 100, 1500)
+aj_valor = array('h', bytearray(2 * len(AJ_MIN)))
+aj_pend = 0          # máscara de ids preparados
+aj_error = False     # algún ajuste del lote fuera de rango
+
+def _aj_preparar(i, v):
+    global aj_pend, aj_error
+    if i >= len(AJ_MIN) or not AJ_MIN[i] <= v <= AJ_MAX[i]:
+        aj_error = True
+        return
+    aj_valor[i] = v
+    aj_pend |= 1 << i
+
+def _aj(i, actual):
+    return aj_valor[i] if aj_pend & (1 << i) else actual
+
+def _aj_confirmar(seq):
+    global V_MAX, ACELERACION_BASE, G_VEL_SENS, DISTANCIA_ATAQUE, DISTANCIA_DISPARO
+    global DIST_RETROCESO, UMBRAL_LINEA, VELOCIDAD_GOLPE, aj_pend, aj_error
+    global PC_V_LIMITE, t_arma
+    ok = not aj_error and _aj(4, DISTANCIA_DISPARO) <= _aj(3, DISTANCIA_ATAQUE)
+    if ok:
+        v, a, g = _aj(0, V_MAX), _aj(1, ACELERACION_BASE), _aj(2, G_VEL_SENS)
+        if v != V_MAX or a != ACELERACION_BASE or g != G_VEL_SENS:
+            V_MAX, ACELERACION_BASE, G_VEL_SENS = v, a, g
+            db.settings(V_MAX, ACELERACION_BASE, G_VEL_SENS, ACELERACION_BASE)
+        DISTANCIA_ATAQUE = _aj(3, DISTANCIA_ATAQUE)
+        DISTANCIA_DISPARO = _aj(4, DISTANCIA_DISPARO)
+        DIST_RETROCESO = _aj(5, DIST_RETROCESO)
+        UMBRAL_LINEA = _aj(6, UMBRAL_LINEA)
+        vg = _aj(7, VELOCIDAD_GOLPE)
+        if vg != VELOCIDAD_GOLPE and not GRABACION_PUPPET:
+            t_arma = ANGULO_GOLPE * 1000 // vg  # medir_arma lo afina en los golpes siguientes
+        VELOCIDAD_GOLPE = vg
+        # Lo derivado al arrancar sigue a los valores nuevos
+        PC_V_LIMITE = max(V_MAX, max(MARCHAS_CONDUCCION))
+    aj_pend = 0
+    aj_error = False
+    _pc_responder(0x88 if ok else 0x89, seq)
+
+def alternar_telemetria(activa):
+    global tel_emitir, tel_enviado
+    tel_emitir = activa
+    tel_enviado = tel_escrito
+
+def _pc_ordenar(orden, v, g, seq):
+    global pc_orden, pc_v, pc_g, pc_seq
+    pc_orden = orden
+    pc_v = max(-PC_V_LIMITE, min(PC_V_LIMITE, v))
+    pc_g = max(-PC_GIRO_LIMITE, min(PC_GIRO_LIMITE, g))
+    pc_seq = seq
+
+def _pc_golpe():
+    global pc_control_activo
+    pc_control_activo = True
+    accionar_arma()
+
+def _pc_responder(op, seq):
+    # Sin sitio en el enlace la respuesta se pierde; el PC la da por caducada
+    if not listo(salida_poll): return
+    pc_resp[1] = op
+    pc_resp[2] = seq
+    pc_resp[3] = (op + seq) & 0xFF
+    salida_bin.write(pc_resp)
+
+def _pc_tecla(c):
+    # Consultas ('t' tiempos, 'p' puppet, 'r' telemetría on/off, 'g' volcar la
+    # traza del combate): no toman el control
+    if c == 0x74: informe_tick()                    # t
+    elif c == 0x70: informe_puppet()                # p
+    elif c == 0x72: alternar_telemetria(not tel_emitir)  # r
+    elif c == 0x67: volcar_traza()                  # g
+    elif c == 0x77: _pc_ordenar(ORDEN_CONDUCIR, V_MAX, 0, -1)   # w
+    elif c == 0x73: _pc_ordenar(ORDEN_CONDUCIR, -V_MAX, 0, -1)  # s
+    elif c == 0x61: _pc_ordenar(ORDEN_CONDUCIR, 0, -G_VEL_SENS*2, -1)  # a
+    elif c == 0x64: _pc_ordenar(ORDEN_CONDUCIR, 0, G_VEL_SENS*2, -1)   # d
+    elif c == 0x20: _pc_golpe()                     # espacio
+    elif c == 0x78: _pc_ordenar(ORDEN_PARAR, 0, 0, -1)  # x
+
+def _pc_i16(i):
+    v = pc_datos[i] | pc_datos[i + 1] << 8
+    return v - 65536 if v >= 32768 else v
+
+def _pc_trama():
+    op = pc_op
+    if op == 1: _pc_ordenar(ORDEN_CONDUCIR, _pc_i16(1), _pc_i16(3), pc_datos[0])
+    elif op == 2: _pc_ordenar(ORDEN_PARAR, 0, 0, -1)
+    elif op == 3: _pc_golpe()
+    elif op == 4: _pc_responder(0x84, pc_datos[0])
+    elif op == 5: alternar_telemetria(pc_datos[0] != 0)
+    elif op == 6: informe_tick()
+    elif op == 7: _aj_preparar(pc_datos[0], _pc_i16(1))
+    elif op == 8: _aj_confirmar(pc_datos[0])
+    elif op == 9: volcar_traza()
+
+def _pc_byte(b):
+    global pc_estado, pc_op, pc_pos, pc_suma
+    if pc_estado == 0:
+        if b == PC_SYNC: pc_estado = 1
+        else: _pc_tecla(b)
+    elif pc_estado == 1:
+        if 0 < b < len(PC_LARGO):
+            pc_op = b; pc_pos = 0; pc_suma = b
+            pc_estado = 2 if PC_LARGO[b] else 3
+        elif b != PC_SYNC: pc_estado = 0  # opcode desconocido: resincronizar
+    elif pc_estado == 2:
+        pc_datos[pc_pos] = b
+        pc_pos += 1; pc_suma += b
+        if pc_pos == PC_LARGO[pc_op]: pc_estado = 3
+    else:
+        pc_estado = 0
+        if b == pc_suma & 0xFF: _pc_trama()
+
+def consola_pc():
+    global pc_orden, pc_control_activo
+    n = 0
+    while n < PC_BYTES_TICK and listo(input_poll):
+        entrada_bin.readinto(pc_b1)
+        grabar_pc(pc_b1[0])
+        _pc_byte(pc_b1[0])
+        n += 1
+    if pc_orden == ORDEN_CONDUCIR:
+        pc_control_activo = True
+        conducir(pc_v, pc_g)
+        if pc_seq >= 0: _pc_responder(0x81, pc_seq)
+    elif pc_orden == ORDEN_PARAR:
+        parar(); pc_control_activo = False
+    pc_orden = ORDEN_NADA
+
+# --- BUCLE PRINCIPAL ---
+# En régimen estable un tick no crea objetos en el heap (listas, conjuntos,
+# cadenas, tuplas): constantes y buffers están preasignados, así que el GC no
+# mete pausas en el control. Sólo quedan los conjuntos de pressed(), que la API
+# no permite evitar. tools/asignaciones.py lo audita.
+t_pulsado_bt = -1    # inicio de la pulsación larga de BLUETOOTH (-1 = suelto)
+t_rearme_mando = 0   # CENTER y RIGHT del mando ignorados hasta este instante
 set_mode(0)
 
-# Espera inicial por reglamento
-hub.display.icon(KANJI_DAI if INDICE_CARA == 5 else Icon.HAPPY)
-wait(TIEMPO_ESPERA_INI)
+# Espera inicial por reglamento: el emparejamiento del mando corre dentro de
+# ella. Si al acabar aún no hay mando, el bucle arranca y gestionar_mando()
+# sigue buscándolo.
+mostrar_icono(KANJI_DAI if INDICE_CARA == 5 else Icon.HAPPY)
+t_listo = reloj.time() + TIEMPO_ESPERA_INI
+while reloj.time() < t_listo:
+    if rc is None: _intentar_mando(min(500, t_listo - reloj.time()))
+    else: wait(t_listo - reloj.time())
+print("ARRANQUE listo=%d ms mando=%d ms intentos=%d" % (reloj.time(), mando_t_conexion, mando_intentos))
+resincronizar_tick()
+grabar_inicio()
 
 while True:
-    # A. Detección Caída y Sakura Respect
-    if hub.imu.up() != Side.FRONT:
-        if not caido: caido = True; sw_caida.reset(); db.stop()
-        t = 9000 - sw_caida.time()
-        if t > 0: mostrar_num_anton(t // 1000)
-        else:
-            hub.display.icon(CARA_KO)
-            tocar_sakura()
-            while hub.imu.up() != Side.FRONT: wait(100)
-    elif caido: caido = False; set_mode(m_idx)
-
-    # B. Consola PC
-    if input_poll.poll(0):
-        c = sys.stdin.read(1)
-        pc_control_activo = True
-        if c == 'w': db.drive(V_MAX, 0)
-        elif c == 's': db.drive(-V_MAX, 0)
-        elif c == 'a': db.drive(0, -G_VEL_SENS*2)
-        elif c == 'd': db.drive(0, G_VEL_SENS*2)
-        elif c == ' ': accionar_arma()
-        elif c == 'x': db.stop(); pc_control_activo = False
-
-    # C. Control Mando
-    try: pressed = rc.buttons.pressed()
-    except: pressed = []; rc = None
-    if rc is None:
-        try: rc = Remote(timeout=0); set_mode(m_idx)
-        except: pass
+    inicio_tick()
+    leer_sensores()
+
+    # A. Consola PC
+    if CONSOLA_PC_ACTIVA: consola_pc()
+
+    # B. Control Mando: cambio de modo y caja de cambios
+    pressed = sen.mando
 
     if not caido and not pc_control_activo:
-        if Button.CENTER in pressed: set_mode((m_idx + 1) % 3); wait(300)
-        
+        # Antirrebote sin bloquear: tras una pulsación se ignoran 300 ms
+        rearmado = sen.t >= t_rearme_mando
+        if pressed & B_CENTER and rearmado:
+            set_mode((m_idx + 1) % 3)
+            t_rearme_mando = sen.t + 300; rearmado = False
+            leer_sensores()  # el modo nuevo lee sensores que el anterior no usaba
+
         # Gearbox (Botón Derecho/Rojo)
-        if Button.RIGHT in pressed and m_idx == 0:
+        if pressed & B_RIGHT and m_idx == 0 and rearmado:
             gear_idx = (gear_idx + 1) % 3
             V_MAX = MARCHAS_CONDUCCION[gear_idx]
             db.settings(V_MAX, ACELERACION_BASE, G_VEL_SENS, ACELERACION_BASE)
-            hub.speaker.beep(400 + gear_idx*200, 100)
-            wait(300)
-
-        # MODO 0: DRIVE (Conducción)
-        if m_idx == 0:
-            s, t = 0, 0
-            if Button.LEFT_PLUS in pressed: s = V_MAX
-            if Button.LEFT_MINUS in pressed: s = -V_MAX
-            if Button.RIGHT_PLUS in pressed: t = G_VEL_SENS * 3
-            if Button.RIGHT_MINUS in pressed: t = -G_VEL_SENS * 3
-            db.drive(s, t)
-            if Button.LEFT in pressed: accionar_arma()
-
-        # MODO 1: COMBAT (Semi-Automático)
-        elif m_idx == 1:
-            if sensor_ojos.distance() < DISTANCIA_ATAQUE:
-                hub.light.pulse(Color.RED, 500)
-                db.drive(V_MAX, 0)
-                if sensor_ojos.distance() < DISTANCIA_DISPARO: accionar_arma()
-            else:
-                db.drive(0, G_VEL_SENS)
-
-        # MODO 2: AUTO (IA Completa con Ariete)
-        elif m_idx == 2:
-            dist = sensor_ojos.distance()
-            if dist < DISTANCIA_ATAQUE:
-                db.drive(V_MAX, 0)
-                if dist < DISTANCIA_DISPARO:
-                    accionar_arma()
-                    if ESTRATEGIA_ARIETE:
-                        db.straight(-DIST_RETROCESO)
-                        db.drive(V_MAX, 0) # Vuelve a la carga
-                        wait(400)
-            else:
-                db.drive(0, G_VEL_SENS)
-            
-            # Anti-Salida
-            if sensor_suelo.reflection() < UMBRAL_LINEA:
-                db.straight(-100)
-                db.turn(120)
-
-    # D. Engineer Menu
-    if Button.BLUETOOTH in hub.buttons.pressed():
-        sw_ing.reset()
-        while Button.BLUETOOTH in hub.buttons.pressed():
-            if sw_ing.time() > 1500: ejecutar_modo_ingeniero(); break
-    
-    wait(20)
+            lanzar("pitido", tarea_pitido(400 + gear_idx*200, 100))
+            t_rearme_mando = sen.t + 300
+
+    # B2. Hub vecino por difusión BLE: relé al PC y, opcional, su modo
+    if DIF_ESCUCHA: atender_vecino()
+
+    # C. Modo: caída (Sakura Respect), borde y combate (ver MÁQUINA DE ESTADOS)
+    ejecutar_estado()
+
+    # D. Engineer Menu (pulsación larga medida entre ticks, sin espera activa)
+    if not sen.botones & B_BLUETOOTH: t_pulsado_bt = -1
+    elif t_pulsado_bt < 0: t_pulsado_bt = sen.t
+    elif sen.t - t_pulsado_bt > 1500:
+        t_pulsado_bt = -1
+        ejecutar_modo_ingeniero()
+        resincronizar_tick()
+
+    ejecutar_tareas()
+    telemetria_tick()
+    if DIF_PUBLICA: difundir()
+    if gr_volcado >= 0: enviar_traza()
+    gestionar_mando()
+    esperar_tick()
@@ -0,0 +1,420 @@
+"""Per-tick heap-allocation audit for the main loop of a hub script.
+
+Runs SUMO_MASTER_V25.py through the bench_bucle.py scenarios on the simulated
+pybricks layer with tracemalloc on and, over a steady-state window, attributes
+what every executed line allocates to that line, tick by tick. CPython and
+MicroPython do not allocate the same things (CPython boxes ints above 256 and
+recycles tuples and lists from free lists), so tracemalloc gives the bytes and
+a model of the MicroPython compiler decides which lines allocate on the hub:
+containers, non-folded tuples, strings, floats, slices, closures, generators,
+allocating builtins, and fresh containers returned by a pybricks call (as the
+set from ``buttons.pressed()``). What the simulator allocates internally is not
+counted. Sites are checked against asignaciones_baseline.json: any new one
+fails.
+
+    python tools/asignaciones.py                   # compara con la línea base
+    python tools/asignaciones.py --actualizar      # acepta los sitios actuales
+    python tools/asignaciones.py -v                # también el ruido de CPython
+"""
+
+import ast
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+from bench_bucle import ESCENARIOS, SCRIPT_POR_DEFECTO, T_LISTO_MS
+from pybricks_sim import Simulador
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+BASELINE_POR_DEFECTO = os.path.join(AQUI, "asignaciones_baseline.json")
+
+T_VENTANA_MS = T_LISTO_MS + 2500   # tras entrar en el modo (ver _entrar_modo)
+DURACION_MS = 30000
+MARCA_TICK = "inicio_tick"         # función que abre cada tick del bucle
+UMBRAL_RUIDO = 96                  # B por ejecución: más que 3 enteros de CPython
+
+# Llamadas que crean un objeto en el heap de MicroPython
+CONSTRUCTORES = {"list", "tuple", "dict", "set", "frozenset", "bytearray", "bytes", "str",
+                 "sorted", "reversed", "enumerate", "zip", "map", "filter", "range", "iter",
+                 "repr", "format", "memoryview", "array", "super", "StopWatch", "Remote"}
+METODOS = {"split", "join", "format", "replace", "strip", "encode", "decode", "copy",
+           "keys", "values", "items", "unpack", "unpack_from", "pack", "append",
+           "extend", "insert"}
+# Tipos que una llamada a pybricks sólo puede devolver creándolos
+DEVUELTOS = {set: "conjunto", frozenset: "conjunto", list: "lista", dict: "diccionario",
+             tuple: "tupla", str: "cadena", bytes: "bytes", bytearray: "bytes", float: "float"}
+
+
+# ==============================================================================
+# --- MODELO DE MICROPYTHON ---
+# ==============================================================================
+
+
+def _constante(nodo):
+    if isinstance(nodo, ast.Constant):
+        return True
+    return isinstance(nodo, ast.Tuple) and all(_constante(e) for e in nodo.elts)
+
+
+def _cadena(nodo):
+    return isinstance(nodo, ast.Constant) and isinstance(nodo.value, str)
+
+
+class _Modelo(ast.NodeVisitor):
+    """Por línea, qué objetos crea en el heap del hub (lista de motivos)."""
+
+    def __init__(self, arbol):
+        self.motivos = {}
+        self.generadores = {f.name for f in ast.walk(arbol) if isinstance(f, ast.FunctionDef)
+                            and any(isinstance(n, (ast.Yield, ast.YieldFrom)) for n in ast.walk(f))}
+        self.clases = {c.name for c in ast.walk(arbol) if isinstance(c, ast.ClassDef)}
+        self._en_funcion = False
+
+    def _anotar(self, nodo, motivo):
+        for linea in range(nodo.lineno, (nodo.end_lineno or nodo.lineno) + 1):
+            lista = self.motivos.setdefault(linea, [])
+            if motivo not in lista:
+                lista.append(motivo)
+
+    def _expresion(self, raiz, exentas=()):
+        for n in ast.walk(raiz):
+            if isinstance(n, ast.ListComp) or isinstance(n, ast.List) and isinstance(n.ctx, ast.Load):
+                self._anotar(n, "lista")
+            elif isinstance(n, (ast.Set, ast.SetComp)):
+                self._anotar(n, "conjunto")
+            elif isinstance(n, (ast.Dict, ast.DictComp)):
+                self._anotar(n, "diccionario")
+            elif isinstance(n, ast.GeneratorExp):
+                self._anotar(n, "generador")
+            elif isinstance(n, ast.Tuple):
+                if isinstance(n.ctx, ast.Load) and n not in exentas and not _constante(n):
+                    self._anotar(n, "tupla")
+            elif isinstance(n, ast.JoinedStr):
+                self._anotar(n, "cadena")
+            elif isinstance(n, ast.BinOp):
+                if isinstance(n.op, (ast.Mod, ast.Add)) and (_cadena(n.left) or _cadena(n.right)):
+                    self._anotar(n, "cadena")
+                elif isinstance(n.op, ast.Div) or any(isinstance(o, ast.Constant) and isinstance(o.value, float)
+                                                      for o in (n.left, n.right)):
+                    self._anotar(n, "float")
+            elif isinstance(n, ast.Subscript) and isinstance(n.slice, ast.Slice):
+                self._anotar(n, "corte")
+            elif isinstance(n, ast.Lambda):
+                self._anotar(n, "función")
+            elif isinstance(n, ast.Starred):
+                self._anotar(n, "tupla de *args")
+            elif isinstance(n, ast.Call):
+                self._llamada(n, exentas)
+
+    def _llamada(self, n, exentas):
+        f = n.func
+        if isinstance(f, ast.Name):
+            if f.id in self.generadores:
+                self._anotar(n, "generador")
+            elif f.id in self.clases:
+                self._anotar(n, "objeto")
+            elif f.id in CONSTRUCTORES and n not in exentas:
+                self._anotar(n, "%s()" % f.id)
+        elif isinstance(f, ast.Attribute) and f.attr in METODOS:
+            self._anotar(n, ".%s()" % f.attr)
+        if any(k.arg is None for k in n.keywords):
+            self._anotar(n, "diccionario de **kwargs")
+
+    # Sentencias: en las compuestas sólo cuenta la cabecera
+
+    def generic_visit(self, nodo):
+        if isinstance(nodo, ast.stmt):
+            self._expresion(nodo)
+        else:
+            super().generic_visit(nodo)
+
+    def visit_Module(self, nodo):
+        for s in nodo.body:
+            self.visit(s)
+
+    def _cuerpo(self, *bloques):
+        for bloque in bloques:
+            for s in bloque:
+                self.visit(s)
+
+    def visit_FunctionDef(self, nodo):
+        if self._en_funcion:
+            self._anotar(nodo, "cierre")
+            return
+        self._en_funcion = True
+        self._cuerpo(nodo.body)
+        self._en_funcion = False
+
+    def visit_ClassDef(self, nodo):
+        self._cuerpo(nodo.body)
+
+    def visit_If(self, nodo):
+        self._expresion(nodo.test)
+        self._cuerpo(nodo.body, nodo.orelse)
+
+    visit_While = visit_If
+
+    def visit_For(self, nodo):
+        # `for x in range(...)` compila a un contador, sin objeto range
+        exentas = (nodo.iter,) if isinstance(nodo.iter, ast.Call) and \
+            isinstance(nodo.iter.func, ast.Name) and nodo.iter.func.id == "range" else ()
+        self._expresion(nodo.iter, exentas)
+        self._cuerpo(nodo.body, nodo.orelse)
+
+    def visit_Try(self, nodo):
+        self._cuerpo(nodo.body, nodo.orelse, nodo.finalbody, *[h.body for h in nodo.handlers])
+
+    def visit_With(self, nodo):
+        for item in nodo.items:
+            self._expresion(item.context_expr)
+        self._cuerpo(nodo.body)
+
+    def visit_Raise(self, nodo):
+        self._anotar(nodo, "excepción")
+        self._expresion(nodo)
+
+    def visit_Assign(self, nodo):
+        # a, b = c, d (2 o 3 elementos) se resuelve en la pila, sin tupla
+        exentas = ()
+        if len(nodo.targets) == 1 and isinstance(nodo.targets[0], (ast.Tuple, ast.List)) \
+                and isinstance(nodo.value, ast.Tuple) \
+                and len(nodo.value.elts) == len(nodo.targets[0].elts) in (2, 3):
+            exentas = (nodo.value,)
+        self._expresion(nodo, exentas)
+
+
+def modelo(fuente):
+    """{línea: [motivos]} de lo que asigna cada línea en MicroPython."""
+    arbol = ast.parse(fuente)
+    m = _Modelo(arbol)
+    m.visit(arbol)
+    return m.motivos
+
+
+# ==============================================================================
+# --- AUDITOR ---
+# ==============================================================================
+
+
+class Auditor:
+    """Traza línea a línea el script con sys.settrace y reparte lo que asigna.
+
+    Cada evento de línea lee el pico de tracemalloc desde el evento anterior y
+    lo carga a la línea que acaba de ejecutarse; lo asignado dentro de las
+    llamadas a pybricks y al crear marcos no cuenta (en el hub los marcos van
+    en la pila).
+    """
+
+    def __init__(self, ruta, motivos):
+        self.ruta = ruta
+        self.motivos = motivos
+        self.ticks = 0
+        self.sitios = {}     # (función, línea) -> [ticks, ejecuciones, bytes]
+        self.api = {}        # (función, línea) -> motivo dinámico
+        self._tick = {}      # (función, línea) -> [ejecuciones, bytes] del tick en curso
+        self._linea = None
+        self._base = 0
+        self._loc = self._local
+        self._ret = self._retorno
+        self._activo = False
+        self._abierto = False  # se descarta el tick a medias en que empieza
+
+    # Contabilidad
+
+    def _medir(self):
+        # Carga a la línea en curso lo asignado desde la última base. Es lo
+        # primero que hace cada trazador: lo que éste asigne después, hasta
+        # _descartar(), no se carga a nadie
+        pico = tracemalloc.get_traced_memory()[1]
+        if self._linea is not None:
+            cuenta = self._tick.get(self._linea)
+            if cuenta is None:
+                cuenta = self._tick[self._linea] = [0, 0]
+            cuenta[0] += 1
+            cuenta[1] += max(0, pico - self._base)
+
+    def _descartar(self):
+        self._base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    def _cerrar_tick(self):
+        if not self._abierto:
+            self._tick = {}
+            self._abierto = True
+            return
+        for clave, (n, b) in self._tick.items():
+            s = self.sitios.get(clave)
+            if s is None:
+                s = self.sitios[clave] = [0, 0, 0]
+            s[0] += 1; s[1] += n; s[2] += b
+        self._tick = {}
+        self.ticks += 1
+
+    # Trazadores
+
+    def _global(self, marco, evento, arg):
+        codigo = marco.f_code
+        if codigo.co_filename == self.ruta:
+            if codigo.co_name == MARCA_TICK:
+                self._medir()
+                self._cerrar_tick()
+            self._descartar()  # el marco nuevo no existe en el heap del hub
+            return self._loc
+        anterior = marco.f_back
+        if anterior is not None and anterior.f_code.co_filename == self.ruta:
+            marco.f_trace_lines = False
+            self._descartar()
+            return self._ret
+        return None
+
+    def _local(self, marco, evento, arg):
+        if evento == "line":
+            self._medir()
+            self._linea = (marco.f_code.co_name, marco.f_lineno)
+            self._descartar()
+        elif evento == "return":
+            self._medir()
+            # Lo que queda de la línea que llamó se carga a ella
+            anterior = marco.f_back
+            if anterior is not None and anterior.f_code.co_filename == self.ruta:
+                self._linea = (anterior.f_code.co_name, anterior.f_lineno)
+            else:
+                self._linea = None
+            self._descartar()
+        return self._loc
+
+    def _retorno(self, marco, evento, arg):
+        # Vuelta de una llamada a pybricks: lo asignado dentro es del simulador
+        if evento == "return":
+            tipo = DEVUELTOS.get(type(arg))
+            # Sólo la tupla, la cadena y los bytes vacíos son únicos en MicroPython
+            if tipo is not None and (arg or type(arg) in (set, frozenset, list, dict, bytearray, float)) \
+                    and self._linea is not None:
+                self.api[self._linea] = "%s de %s()" % (tipo, marco.f_code.co_name)
+                cuenta = self._tick.setdefault(self._linea, [0, 0])
+                cuenta[1] += sys.getsizeof(arg)
+            self._descartar()
+        return self._ret
+
+    def empezar(self):
+        # Se llama desde el simulador, en mitad de una llamada del script
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        m = sys._getframe(1)
+        while m is not None:
+            anterior = m.f_back
+            if m.f_code.co_filename == self.ruta:
+                m.f_trace = self._loc
+                if self._linea is None:
+                    self._linea = (m.f_code.co_name, m.f_lineno)
+            elif anterior is not None and anterior.f_code.co_filename == self.ruta:
+                m.f_trace_lines = False
+                m.f_trace = self._ret
+            m = anterior
+        self._activo = True
+        self._descartar()
+        sys.settrace(self._global)
+
+    def terminar(self):
+        sys.settrace(None)
+        if self._activo:
+            tracemalloc.stop()
+            self._activo = False
+
+    # Resultado
+
+    def informe(self, lineas):
+        """Sitios ``(clave, datos)``; clave = 'función: código' (estable entre ediciones)."""
+        sitios, ruido = [], []
+        for (funcion, n), (ticks, ejec, b) in self.sitios.items():
+            motivos = list(self.motivos.get(n, ()))
+            if (funcion, n) in self.api:
+                motivos.append(self.api[(funcion, n)])
+            if not motivos and b > UMBRAL_RUIDO * ejec:
+                motivos.append("sin clasificar (%d B en CPython)" % (b // max(1, ejec)))
+            datos = {"linea": n, "funcion": funcion, "ticks": ticks, "bytes": b,
+                     "motivo": ", ".join(motivos),
+                     "clave": "%s: %s" % (funcion, lineas[n - 1].strip() if n <= len(lineas) else "?")}
+            if motivos:
+                sitios.append(datos)
+            elif b:
+                ruido.append(datos)
+        orden = lambda d: (-d["ticks"], d["linea"])
+        return sorted(sitios, key=orden), sorted(ruido, key=orden)
+
+
+def auditar(nombre, script=SCRIPT_POR_DEFECTO, duracion_ms=DURACION_MS, semilla=69):
+    """Ejecuta un escenario y devuelve (ticks, sitios, ruido) de su ventana estable."""
+    with open(script, encoding="utf-8") as f:
+        fuente = f.read()
+    sim = Simulador()
+    ESCENARIOS[nombre](sim, random.Random(semilla))
+    auditor = Auditor(script, modelo(fuente))
+    sim.en(T_VENTANA_MS, auditor.empezar)
+    try:
+        res = sim.ejecutar(script, duracion_ms, fuente=fuente)
+    finally:
+        auditor.terminar()
+    if res.error is not None:
+        raise RuntimeError("%s: el script falló: %r" % (nombre, res.error))
+    sitios, ruido = auditor.informe(fuente.splitlines())
+    return auditor.ticks, sitios, ruido
+
+
+def _tabla(ticks, filas):
+    for d in filas:
+        print("  %5d %-22s %6.1f%% %8.1f  %s" % (
+            d["linea"], d["funcion"][:22], 100.0 * d["ticks"] / max(1, ticks),
+            d["bytes"] / max(1, ticks), d["motivo"] or "enteros de CPython"))
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--script", default=SCRIPT_POR_DEFECTO)
+    ap.add_argument("--baseline", default=BASELINE_POR_DEFECTO)
+    ap.add_argument("--modo", choices=sorted(ESCENARIOS), action="append")
+    ap.add_argument("--ms", type=int, default=DURACION_MS, help="duración simulada por modo")
+    ap.add_argument("--actualizar", action="store_true", help="acepta los sitios actuales como línea base")
+    ap.add_argument("-v", "--ruido", action="store_true", help="lista también el ruido de enteros de CPython")
+    args = ap.parse_args(argv)
+
+    base = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            base = json.load(f)
+
+    actual = {}
+    nuevos = []
+    for modo in args.modo or list(ESCENARIOS):
+        ticks, sitios, ruido = auditar(modo, args.script, args.ms)
+        por_tick = sum(d["ticks"] for d in sitios) / max(1, ticks)
+        print("%s: %d ticks, %.2f sitios de asignación por tick" % (modo, ticks, por_tick))
+        print("  %5s %-22s %7s %8s  %s" % ("línea", "función", "ticks", "B/tick", "motivo"))
+        _tabla(ticks, sitios)
+        if args.ruido:
+            _tabla(ticks, ruido)
+        actual[modo] = {d["clave"]: d["motivo"] for d in sitios}
+        nuevos += [(modo, d) for d in sitios if d["clave"] not in base.get(modo, {})]
+
+    if args.actualizar:
+        base.update(actual)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(base, f, indent=2, sort_keys=True, ensure_ascii=False)
+            f.write("\n")
+        print("línea base actualizada:", args.baseline)
+        return 0
+
+    if not base:
+        print("sin línea base; ejecuta con --actualizar")
+        return 0
+    for modo, d in nuevos:
+        print("NUEVA ASIGNACIÓN %s línea %d (%s): %s" % (modo, d["linea"], d["motivo"], d["clave"]))
+    return 1 if nuevos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
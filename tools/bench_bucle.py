@@ -0,0 +1,224 @@
+"""Per-tick latency benchmark for the main loop of a hub script.
+
+Drives SUMO_MASTER_V25.py through scripted scenarios on the simulated
+pybricks layer (see pybricks_sim.py), one per mode (m_idx 0/1/2), and reports
+tick-period percentiles, the worst stall and the latency from stimulus to the
+first ``mot_d`` command. Results are checked against bench_baseline.json.
+
+    python tools/bench_bucle.py                    # compara con la línea base
+    python tools/bench_bucle.py --actualizar       # reescribe la línea base
+"""
+
+import ast
+import json
+import os
+import random
+import sys
+
+from generar_hub import live_config
+from pybricks_sim import Button, Side, Simulador
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_POR_DEFECTO = os.path.join(AQUI, os.pardir, "SUMO_MASTER_V25.py")
+BASELINE_POR_DEFECTO = os.path.join(AQUI, "bench_baseline.json")
+
+DURACION_MS = 180000
+T_LISTO_MS = 3500          # tras la pausa de reglamento (TIEMPO_ESPERA_INI)
+MARCADOR_TICK = "imu.up"   # primera lectura de cada iteración del bucle
+
+# Margen permitido antes de considerar regresión: relativo y absoluto (ms)
+TOLERANCIA_REL = 0.10
+TOLERANCIA_ABS_MS = 2.0
+
+METRICAS = ("p50", "p95", "p99", "stall", "lat_media", "lat_max")
+
+
+def valor_config(nombre, script=SCRIPT_POR_DEFECTO):
+    """Valor literal de ``nombre`` en el LIVE CONFIG de ``script``."""
+    with open(script, encoding="utf-8") as f:
+        fuente = f.read()
+    return ast.literal_eval(live_config(ast.parse(fuente), fuente)[nombre].value)
+
+
+DISTANCIA_DISPARO = valor_config("DISTANCIA_DISPARO")  # de la plantilla: sigue a su LIVE CONFIG
+
+
+# ==============================================================================
+# --- ESCENARIOS ---
+# ==============================================================================
+
+
+def _entrar_modo(sim, m_idx, t0=T_LISTO_MS):
+    # Cada pulsación de CENTER avanza un modo (el script espera 300 ms tras ella)
+    for i in range(m_idx):
+        sim.pulsar_mando(t0 + i * 500, Button.CENTER, 60)
+    return t0 + m_idx * 500 + 500
+
+
+def _aproximaciones(sim, t_ini, rng, estimulos, periodo=1800):
+    # El rival entra a rango de ataque, cruza DISTANCIA_DISPARO y se aleja
+    t = t_ini
+    inicios = []
+    while t < DURACION_MS - periodo:
+        # Instantes con fracción de ms para no quedar en fase con el tick
+        t_ataque = t + rng.uniform(200, 600)
+        t_disparo = t_ataque + rng.uniform(100, 400)
+        sim.distancia(t_ataque, 250)
+        sim.distancia(t_disparo, DISTANCIA_DISPARO - 30)
+        sim.distancia(t_disparo + 150, 2000)
+        estimulos.append(t_disparo)
+        inicios.append(t)
+        t += periodo
+    return inicios
+
+
+def escenario_drive(sim, rng):
+    """Conducción con el mando: cambios de dirección, marchas y golpes manuales."""
+    estimulos = []
+    t = _entrar_modo(sim, 0)
+    combos = [Button.LEFT_PLUS, Button.LEFT_MINUS, Button.RIGHT_PLUS, Button.RIGHT_MINUS]
+    while t < DURACION_MS - 1000:
+        sim.pulsar_mando(t, {rng.choice(combos), rng.choice(combos)}, rng.randint(200, 600))
+        t += 700 + rng.random() * 20
+        if rng.random() < 0.3:
+            sim.pulsar_mando(t, Button.LEFT, 60)
+            estimulos.append(t)
+            t += 700
+        if rng.random() < 0.1:
+            sim.pulsar_mando(t, Button.RIGHT, 60)
+            t += 700
+    return estimulos
+
+
+def escenario_combat(sim, rng):
+    """Semi-automático: búsqueda y disparo al acercarse el rival."""
+    estimulos = []
+    _aproximaciones(sim, _entrar_modo(sim, 1), rng, estimulos)
+    return estimulos
+
+
+def escenario_auto(sim, rng):
+    """IA completa: aproximaciones con ariete y bordes del dohyo."""
+    estimulos = []
+    # Los bordes caen entre aproximaciones (tras golpe y ariete) para que la
+    # latencia mida la reacción y no un disparo descartado por la huida
+    for t in _aproximaciones(sim, _entrar_modo(sim, 2), rng, estimulos, periodo=5000):
+        sim.reflexion(t + 3000, 20)
+        sim.reflexion(t + 3060, 60)
+    sim.orientacion(DURACION_MS - 6000, Side.TOP)
+    sim.orientacion(DURACION_MS - 5000, Side.FRONT)
+    return estimulos
+
+
+ESCENARIOS = {
+    "DRIVE": escenario_drive,
+    "COMBAT": escenario_combat,
+    "AUTO": escenario_auto,
+}
+
+
+# ==============================================================================
+# --- MEDIDA ---
+# ==============================================================================
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    orden = sorted(valores)
+    k = (len(orden) - 1) * p / 100.0
+    i = int(k)
+    j = min(i + 1, len(orden) - 1)
+    return orden[i] + (orden[j] - orden[i]) * (k - i)
+
+
+def medir(nombre, script=SCRIPT_POR_DEFECTO, duracion_ms=DURACION_MS, semilla=69):
+    """Ejecuta un escenario y devuelve sus métricas en ms."""
+    sim = Simulador(registrar_lecturas=True)
+    estimulos = ESCENARIOS[nombre](sim, random.Random(semilla))
+    res = sim.ejecutar(script, duracion_ms)
+    if res.error is not None:
+        raise RuntimeError("%s: el script falló: %r" % (nombre, res.error))
+
+    marcas = [t for t, clave, _ in res.lecturas if clave == MARCADOR_TICK and t >= T_LISTO_MS]
+    periodos = [b - a for a, b in zip(marcas, marcas[1:])]
+
+    golpes = [a.t for a in res.filtrar("motorD", "run_target")]
+    latencias = []
+    for te in estimulos:
+        siguiente = next((t for t in golpes if t >= te), None)
+        if siguiente is not None:
+            latencias.append(siguiente - te)
+
+    return {
+        "ticks": len(periodos),
+        "p50": percentil(periodos, 50),
+        "p95": percentil(periodos, 95),
+        "p99": percentil(periodos, 99),
+        "stall": max(periodos) if periodos else 0.0,
+        "lat_media": sum(latencias) / len(latencias) if latencias else 0.0,
+        "lat_max": max(latencias) if latencias else 0.0,
+        "estimulos": len(estimulos),
+        "respondidos": len(latencias),
+    }
+
+
+def comparar(actual, base):
+    """Lista de regresiones (modo, métrica, actual, base) frente a la línea base."""
+    fallos = []
+    for modo, m in actual.items():
+        ref = base.get(modo)
+        if ref is None:
+            continue
+        for k in METRICAS:
+            if k in ref and m[k] > ref[k] * (1 + TOLERANCIA_REL) + TOLERANCIA_ABS_MS:
+                fallos.append((modo, k, m[k], ref[k]))
+        if m["respondidos"] < ref.get("respondidos", 0):
+            fallos.append((modo, "respondidos", m["respondidos"], ref["respondidos"]))
+    return fallos
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--script", default=SCRIPT_POR_DEFECTO)
+    ap.add_argument("--baseline", default=BASELINE_POR_DEFECTO)
+    ap.add_argument("--modo", choices=sorted(ESCENARIOS), action="append")
+    ap.add_argument("--actualizar", action="store_true", help="guarda los resultados como línea base")
+    args = ap.parse_args(argv)
+
+    modos = args.modo or list(ESCENARIOS)
+    actual = {m: medir(m, args.script) for m in modos}
+
+    print("%-7s %6s %7s %7s %7s %8s %9s %8s %6s"
+          % ("modo", "ticks", "p50", "p95", "p99", "stall", "lat_med", "lat_max", "resp"))
+    for modo, m in actual.items():
+        print("%-7s %6d %7.1f %7.1f %7.1f %8.1f %9.1f %8.1f %3d/%-3d"
+              % (modo, m["ticks"], m["p50"], m["p95"], m["p99"], m["stall"],
+                 m["lat_media"], m["lat_max"], m["respondidos"], m["estimulos"]))
+
+    if args.actualizar:
+        base = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                base = json.load(f)
+        base.update({k: {n: round(v, 2) for n, v in m.items()} for k, m in actual.items()})
+        with open(args.baseline, "w") as f:
+            json.dump(base, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("línea base actualizada:", args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("sin línea base; ejecuta con --actualizar")
+        return 0
+    with open(args.baseline) as f:
+        fallos = comparar(actual, json.load(f))
+    for modo, k, v, ref in fallos:
+        print("REGRESIÓN %s.%s: %.1f (base %.1f)" % (modo, k, v, ref))
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""Strike-timing benchmark for the opponent tracker of a hub script.
+
+Feeds noisy ultrasonic traces (synthetic approaches at several closing speeds,
+plus a rival wandering out of reach, with spurious short echoes and dropouts)
+to SUMO_MASTER_V25.py in COMBAT mode on the simulated pybricks layer, and
+reports when the hammer lands relative to the instant the rival crosses
+DISTANCIA_DISPARO, missed approaches and false triggers. ``--traza`` replays
+the ``t``/``dist`` columns of a telemetry CSV (see telemetria.py) instead.
+
+    python tools/bench_rival.py
+    python tools/bench_rival.py --referencia viejo.py     # compara dos scripts
+    python tools/bench_rival.py --traza captura.csv
+"""
+
+import csv
+import random
+import sys
+
+from bench_bucle import DISTANCIA_DISPARO, SCRIPT_POR_DEFECTO, T_LISTO_MS, percentil
+from pybricks_sim import Button, Simulador
+
+VELOCIDADES = (300, 600, 900, 1200)  # mm/s de cierre
+APROX_POR_VELOCIDAD = 8
+D_INICIAL = 600        # mm: empieza fuera de DISTANCIA_ATAQUE
+D_CONTACTO = 40        # mm: el rival se queda pegado...
+T_CONTACTO = 300       # ...este tiempo, y luego desaparece
+T_AUSENTE = 1500
+T_DEAMBULA = 60000     # tramo sin ataque posible: sólo cuenta falsos disparos
+D_DEAMBULA = (250, 1500)
+PASO_MS = 5            # resolución de la traza sintética
+RUIDO_MM = 8
+P_ECO = 0.04           # eco corto espurio (suelo, borde, el propio martillo)
+P_PERDIDA = 0.03       # lectura sin eco (2000 mm)
+SIN_ECO = 2000
+
+
+# ==============================================================================
+# --- TRAZAS ---
+# ==============================================================================
+
+
+def _lectura(rng, d):
+    r = rng.random()
+    if r < P_ECO:
+        return rng.uniform(20, 90)
+    if r < P_ECO + P_PERDIDA:
+        return SIN_ECO
+    return max(20, d + rng.gauss(0, RUIDO_MM))
+
+
+def traza_sintetica(rng, t0):
+    """Lista de (t, mm medido, mm real) y los tramos a evaluar.
+
+    Devuelve ``(muestras, aproximaciones, deambula)``: cada aproximación es
+    ``(t_inicio, t_fin, v)``, con el rival a D_INICIAL en t_inicio y acercándose
+    a ``v`` mm/s; ``deambula`` es el intervalo sin ataque posible.
+    """
+    muestras = []
+    aproximaciones = []
+    t = t0
+    orden = [v for v in VELOCIDADES for _ in range(APROX_POR_VELOCIDAD)]
+    rng.shuffle(orden)
+    for v in orden:
+        # Fracción de ms aleatoria para no quedar en fase con el tick
+        t_ini = t + rng.uniform(0, 20)
+        t_contacto = t_ini + (D_INICIAL - D_CONTACTO) * 1000.0 / v
+        t_fin = t_contacto + T_CONTACTO
+        s = t_ini
+        while s < t_fin:
+            d = max(D_CONTACTO, D_INICIAL - v * (s - t_ini) / 1000.0)
+            muestras.append((s, _lectura(rng, d), d))
+            s += PASO_MS
+        while s < t_fin + T_AUSENTE:
+            muestras.append((s, SIN_ECO, SIN_ECO))
+            s += PASO_MS
+        aproximaciones.append((t_ini, t_fin, v))
+        t = s
+    # El rival deambula fuera de alcance: cualquier golpe aquí es falso
+    ini = t
+    d, v = D_DEAMBULA[1], 0.0
+    while t < ini + T_DEAMBULA:
+        v = max(-400.0, min(400.0, v + rng.gauss(0, 60)))
+        d += v * PASO_MS / 1000.0
+        if not D_DEAMBULA[0] <= d <= D_DEAMBULA[1]:
+            v = -v
+            d = max(D_DEAMBULA[0], min(D_DEAMBULA[1], d))
+        muestras.append((t, _lectura(rng, d), d))
+        t += PASO_MS
+    # Sin esto la última lectura (quizá un eco corto) quedaría fija
+    muestras.append((t, SIN_ECO, SIN_ECO))
+    return muestras, aproximaciones, (ini, t)
+
+
+def cargar_traza(ruta, t0):
+    """(t, mm) de las columnas ``t`` y ``dist`` de un CSV de telemetria.py."""
+    muestras = []
+    with open(ruta, newline="") as f:
+        filas = [(float(r["t"]), float(r["dist"])) for r in csv.DictReader(f)]
+    if filas:
+        base = filas[0][0]
+        muestras = [(t - base + t0, d, None) for t, d in filas]
+    return muestras
+
+
+# ==============================================================================
+# --- MEDIDA ---
+# ==============================================================================
+
+
+def _simular(script, muestras, duracion_ms):
+    sim = Simulador()
+    # COMBAT: una pulsación de CENTER desde DRIVE
+    sim.pulsar_mando(T_LISTO_MS, Button.CENTER, 60)
+    for t, mm, _ in muestras:
+        sim.distancia(t, int(mm))
+    res = sim.ejecutar(script, duracion_ms)
+    if res.error is not None:
+        raise RuntimeError("el script falló: %r" % (res.error,))
+    # Golpe: (instante de la orden, instante en que el martillo llega)
+    return [(a.t, a.t + abs(a.args[1]) * 1000.0 / max(1, abs(a.args[0])))
+            for a in res.filtrar("motorD", "run_target") if a.args[1] != 0]
+
+
+def medir(script=SCRIPT_POR_DEFECTO, semilla=69):
+    """Métricas en ms sobre la traza sintética."""
+    muestras, aproximaciones, deambula = traza_sintetica(random.Random(semilla), T_LISTO_MS + 1000)
+    golpes = _simular(script, muestras, deambula[1] + 500)
+
+    errores = {v: [] for v in VELOCIDADES}
+    fallos = 0
+    for t_ini, t_fin, v in aproximaciones:
+        g = next((llega for t, llega in golpes if t_ini <= t < t_fin), None)
+        if g is None:
+            fallos += 1
+        else:
+            # Instante en que el rival real cruza DISTANCIA_DISPARO
+            errores[v].append(g - (t_ini + (D_INICIAL - DISTANCIA_DISPARO) * 1000.0 / v))
+    todos = [e for lista in errores.values() for e in lista]
+    falsos = sum(1 for t, _ in golpes if deambula[0] <= t < deambula[1])
+    return {
+        "por_velocidad": {v: sum(e) / len(e) if e else 0.0 for v, e in errores.items()},
+        "error_medio": sum(todos) / len(todos) if todos else 0.0,
+        "error_abs_p95": percentil([abs(e) for e in todos], 95),
+        "fallos": fallos,
+        "aproximaciones": len(aproximaciones),
+        "falsos": falsos,
+        "falsos_min": falsos * 60000.0 / (deambula[1] - deambula[0]),
+    }
+
+
+def medir_traza(ruta, script=SCRIPT_POR_DEFECTO):
+    """Golpes sobre una traza grabada (sin verdad de referencia)."""
+    t0 = T_LISTO_MS + 1000
+    muestras = cargar_traza(ruta, t0)
+    if not muestras:
+        return {"golpes": 0, "duracion_ms": 0.0, "golpes_min": 0.0}
+    golpes = _simular(script, muestras, muestras[-1][0] + 500)
+    dur = muestras[-1][0] - t0
+    return {"golpes": len(golpes), "duracion_ms": dur,
+            "golpes_min": len(golpes) * 60000.0 / dur if dur > 0 else 0.0}
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--script", default=SCRIPT_POR_DEFECTO)
+    ap.add_argument("--referencia", help="otro script con el que comparar")
+    ap.add_argument("--traza", help="CSV de telemetria.py con columnas t y dist")
+    ap.add_argument("--semilla", type=int, default=69)
+    args = ap.parse_args(argv)
+
+    scripts = [("script", args.script)]
+    if args.referencia:
+        scripts.append(("referencia", args.referencia))
+
+    if args.traza:
+        print("%-11s %7s %10s %9s" % ("", "golpes", "duracion_s", "golpes/min"))
+        for nombre, ruta in scripts:
+            m = medir_traza(args.traza, ruta)
+            print("%-11s %7d %10.1f %9.2f" % (nombre, m["golpes"], m["duracion_ms"] / 1000.0, m["golpes_min"]))
+        return 0
+
+    cab = " ".join("%7s" % ("v%d" % v) for v in VELOCIDADES)
+    print("%-11s %s %8s %8s %7s %7s %9s" % ("", cab, "err_med", "err_p95", "fallos", "falsos", "falsos/min"))
+    for nombre, ruta in scripts:
+        m = medir(ruta, args.semilla)
+        fila = " ".join("%7.0f" % m["por_velocidad"][v] for v in VELOCIDADES)
+        print("%-11s %s %8.1f %8.1f %3d/%-3d %7d %9.2f" % (
+            nombre, fila, m["error_medio"], m["error_abs_p95"], m["fallos"], m["aproximaciones"],
+            m["falsos"], m["falsos_min"]))
+    print("(error = llegada del martillo - cruce real de DISTANCIA_DISPARO, ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
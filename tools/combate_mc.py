@@ -0,0 +1,435 @@
+"""Monte Carlo bout simulator for sweeping LIVE CONFIG parameters.
+
+Builds SUMO_MASTER_V25.py for every point of a parameter grid (generar_hub.py)
+and runs it on the simulated pybricks layer inside a 2D dohyo: differential
+drive kinematics from DIAMETRO_RUEDA / ANCHO_EJE with saturated wheel motors,
+a scripted opponent, an ultrasonic cone, the black ring line under the floor
+sensor and the hammer's reach. Bouts are spread over a process pool and the
+result is the win rate and mean time to push the rival out over the grid.
+NumPy, if installed, expands the opponent scripts of each batch and writes
+the surfaces with ``--npz``.
+
+    python tools/combate_mc.py -p DISTANCIA_ATAQUE=200,300,400 -p G_VEL_SENS=100,150,250
+    python tools/combate_mc.py -p MARCHAS_CONDUCCION=350/500/1000,350/650/1000 -n 100 --csv mc.csv
+"""
+
+import ast
+import itertools
+import math
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from bench_bucle import T_LISTO_MS
+from generar_hub import ErrorConfig, generar
+from pybricks_sim import Button, DriveBase, Port, Simulador
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Dohyo: círculo blanco con línea negra en el borde (UMBRAL_LINEA: <35 negro)
+R_DOHYO = 385            # mm (77 cm de diámetro)
+ANCHO_LINEA = 25
+REFLEJO_BLANCO, REFLEJO_NEGRO, REFLEJO_FUERA = 60, 8, 0
+
+# Robots como círculos; sensores en el morro
+R_ROBOT = R_RIVAL = 75
+OJOS_X = 70              # ultrasonido, mm por delante del centro
+SUELO_X = 80             # sensor de color
+CONO = math.radians(30)  # apertura del ultrasonido
+RANGO_OJOS = 2000
+RUIDO_OJOS = 5.0
+MOTOR_MAX_GS = 1000      # grados/s de rueda a plena carga de batería
+ALCANCE_MARTILLO = 110   # mm desde el morro hasta donde llega la cabeza
+ARCO_MARTILLO = math.radians(35)
+EMPUJE_GOLPE = 60        # mm que desplaza un golpe acertado
+
+SALIDA = 150             # líneas de salida a ±150 mm del centro
+PASO_MS = 5              # paso de la física
+T_INICIO = T_LISTO_MS + 1000  # tras la pausa de reglamento y el cambio a AUTO
+DURACION_MS = 30000
+SEG_RIVAL_MS = 1000      # el guion del rival cambia de rumbo cada segundo
+MARGEN_RIVAL = 100       # el rival no se acerca solo a menos de esto del borde
+GUIONES = ("quieto", "embiste", "merodea")
+MODOS = {"COMBAT": 1, "AUTO": 2}
+
+GANA, PIERDE, EMPATE = 1, -1, 0
+
+
+# ==============================================================================
+# --- RIVAL ---
+# ==============================================================================
+
+
+def guiones_rival(semillas, guion=None):
+    """(rumbo, velocidad) por segmento de SEG_RIVAL_MS para cada combate."""
+    n_seg = DURACION_MS // SEG_RIVAL_MS
+    lote = []
+    for semilla in semillas:
+        rng = random.Random(semilla * 7919 + 1)
+        tipo = guion or rng.choice(GUIONES)
+        if tipo == "quieto":
+            segs = [(0.0, 0.0)] * n_seg
+        elif tipo == "embiste":
+            # Espera un poco y carga en línea recta hacia la salida del robot
+            espera = rng.randint(0, 2)
+            rumbo, v = math.pi + rng.uniform(-0.3, 0.3), rng.uniform(150, 400)
+            segs = [(0.0, 0.0)] * espera + [(rumbo, v)] * (n_seg - espera)
+        else:
+            segs = [(rng.uniform(-math.pi, math.pi), rng.uniform(100, 300)) for _ in range(n_seg)]
+        lote.append((tipo, segs))
+    return lote
+
+
+def velocidades_rival(lote):
+    """Tablas vx, vy (mm/s) por paso de física, una fila por combate."""
+    rep = SEG_RIVAL_MS // PASO_MS
+    if np is not None:
+        seg = np.array([s for _, s in lote], dtype=float)  # (combates, segmentos, 2)
+        vx = np.repeat(np.cos(seg[:, :, 0]) * seg[:, :, 1], rep, axis=1)
+        vy = np.repeat(np.sin(seg[:, :, 0]) * seg[:, :, 1], rep, axis=1)
+        return vx.tolist(), vy.tolist()
+    vx = [[math.cos(r) * v for r, v in s for _ in range(rep)] for _, s in lote]
+    vy = [[math.sin(r) * v for r, v in s for _ in range(rep)] for _, s in lote]
+    return vx, vy
+
+
+# ==============================================================================
+# --- FÍSICA ---
+# ==============================================================================
+
+
+class Combate:
+    """Mundo 2D enganchado al simulador: órdenes del script -> sensores."""
+
+    def __init__(self, sim, vx, vy, rng, diametro, eje):
+        self.sim, self.vx, self.vy, self.rng = sim, vx, vy, rng
+        self.diametro, self.eje = diametro, eje
+        self.v_rueda_max = MOTOR_MAX_GS / 360.0 * math.pi * diametro
+        # Como DriveBase: velocidad, aceleración, giro, aceleración de giro
+        self.cfg = [diametro * 4, diametro * 4, eje * 4, eje * 4]
+        self.orden = (0.0, 0.0, None)  # mm/s, grados/s, fin de maniobra (None = drive)
+        self.v = self.w = 0.0
+        self.x, self.y = -SALIDA + rng.uniform(-20, 20), rng.uniform(-20, 20)
+        self.th = rng.uniform(-1.0, 1.0)
+        self.rx, self.ry = SALIDA + rng.uniform(-20, 20), rng.uniform(-20, 20)
+        self.impactos = []  # instantes en que llega el martillo
+        self.golpes = self.aciertos = 0
+        self.resultado, self.t_fin = EMPATE, None
+        sim.observadores.append(self._accion)
+        self._sensores()
+        sim.en(PASO_MS, self._paso)
+
+    # --- Órdenes del script ---
+
+    def _accion(self, acc):
+        t = acc.t
+        if acc.disp == "db":
+            if acc.metodo == "settings":
+                self.cfg = list(acc.args)
+            elif acc.metodo == "drive":
+                self.orden = (float(acc.args[0]), float(acc.args[1]), None)
+            elif acc.metodo in ("stop", "brake"):
+                self.orden = (0.0, 0.0, None)
+                self.v = self.w = 0.0
+            elif acc.metodo == "straight":
+                d = acc.args[0]
+                dur = DriveBase._duracion(d, self.cfg[0], self.cfg[1])
+                self.orden = (math.copysign(abs(d) * 1000.0 / max(dur, 1.0), d), 0.0, t + dur)
+            elif acc.metodo == "turn":
+                a = acc.args[0]
+                dur = DriveBase._duracion(a, self.cfg[2], self.cfg[3])
+                self.orden = (0.0, math.copysign(abs(a) * 1000.0 / max(dur, 1.0), a), t + dur)
+        elif acc.disp == "motorD" and acc.metodo == "run_target" and acc.args[1] != 0:
+            self.golpes += 1
+            self.impactos.append(t + abs(acc.args[1]) * 1000.0 / max(1, abs(acc.args[0])))
+
+    # --- Paso de integración ---
+
+    def _paso(self):
+        t = self.sim.ahora()
+        if t >= T_INICIO:
+            self._mover(t, PASO_MS / 1000.0)
+        self._sensores()
+        if self.t_fin is None:
+            self.sim.en(t + PASO_MS, self._paso)
+        else:
+            self.sim.reloj.limite = t  # el script termina en su próxima llamada
+
+    def _mover(self, t, dt):
+        v_obj, w_obj, fin = self.orden
+        if fin is not None:
+            # straight()/turn(): velocidad media de la maniobra hasta su fin
+            if t >= fin:
+                v_obj = w_obj = 0.0
+            self.v, self.w = v_obj, w_obj
+        else:
+            self.v = _rampa(self.v, v_obj, self.cfg[1] * dt)
+            self.w = _rampa(self.w, w_obj, self.cfg[3] * dt)
+        # Cinemática diferencial con las ruedas saturadas
+        w = math.radians(self.w)
+        vl, vr = self.v - w * self.eje / 2.0, self.v + w * self.eje / 2.0
+        k = max(abs(vl), abs(vr)) / self.v_rueda_max
+        if k > 1.0:
+            vl, vr = vl / k, vr / k
+        v, w = (vl + vr) / 2.0, (vr - vl) / self.eje
+        vx_r, vy_r = v * math.cos(self.th), v * math.sin(self.th)
+        self.x += vx_r * dt
+        self.y += vy_r * dt
+        self.th += w * dt
+
+        # Rival: sigue su guion, pero no se tira solo del dohyo
+        i = min(int((t - T_INICIO) // PASO_MS), len(self.vx) - 1)
+        ox, oy = self.vx[i], self.vy[i]
+        nx, ny = self.rx + ox * dt, self.ry + oy * dt
+        if math.hypot(nx, ny) > R_DOHYO - MARGEN_RIVAL and nx * ox + ny * oy > 0:
+            ox = oy = 0.0
+        self.rx += ox * dt
+        self.ry += oy * dt
+
+        # Contacto: gana terreno quien empuja más fuerte hacia el otro
+        dx, dy = self.rx - self.x, self.ry - self.y
+        d = math.hypot(dx, dy) or 1e-6
+        nxn, nyn = dx / d, dy / d
+        pen = R_ROBOT + R_RIVAL - d
+        if pen > 0:
+            fa = max(0.0, vx_r * nxn + vy_r * nyn)
+            fb = max(0.0, -(ox * nxn + oy * nyn))
+            parte = 0.5 if fa + fb == 0 else fb / (fa + fb)
+            self.x -= nxn * pen * parte
+            self.y -= nyn * pen * parte
+            self.rx += nxn * pen * (1 - parte)
+            self.ry += nyn * pen * (1 - parte)
+
+        # Martillo: acierta si al llegar el rival está delante y a su alcance
+        while self.impactos and self.impactos[0] <= t:
+            self.impactos.pop(0)
+            rumbo = _angulo(math.atan2(dy, dx) - self.th)
+            if d - R_ROBOT - R_RIVAL <= ALCANCE_MARTILLO and abs(rumbo) <= ARCO_MARTILLO:
+                self.aciertos += 1
+                self.rx += nxn * EMPUJE_GOLPE
+                self.ry += nyn * EMPUJE_GOLPE
+
+        if math.hypot(self.x, self.y) > R_DOHYO:
+            self.resultado, self.t_fin = PIERDE, t - T_INICIO
+        elif math.hypot(self.rx, self.ry) > R_DOHYO:
+            self.resultado, self.t_fin = GANA, t - T_INICIO
+
+    # --- Sensores ---
+
+    def _sensores(self):
+        c, s = math.cos(self.th), math.sin(self.th)
+        # Ultrasonido: superficie del rival si cae dentro del cono
+        ox, oy = self.x + OJOS_X * c, self.y + OJOS_X * s
+        dx, dy = self.rx - ox, self.ry - oy
+        dc = math.hypot(dx, dy)
+        dist = RANGO_OJOS
+        if dc > R_RIVAL:
+            medio = math.asin(R_RIVAL / dc)
+            if abs(_angulo(math.atan2(dy, dx) - self.th)) <= CONO / 2 + medio:
+                dist = dc - R_RIVAL + self.rng.gauss(0, RUIDO_OJOS)
+        else:
+            dist = 0
+        self.sim.dist_mm = int(max(0, min(RANGO_OJOS, dist)))
+        # Suelo bajo el sensor de color
+        r = math.hypot(self.x + SUELO_X * c, self.y + SUELO_X * s)
+        if r > R_DOHYO:
+            self.sim.reflejo = REFLEJO_FUERA
+        elif r > R_DOHYO - ANCHO_LINEA:
+            self.sim.reflejo = REFLEJO_NEGRO
+        else:
+            self.sim.reflejo = REFLEJO_BLANCO
+
+
+def _rampa(actual, objetivo, paso):
+    if actual < objetivo:
+        return min(objetivo, actual + paso)
+    return max(objetivo, actual - paso)
+
+
+def _angulo(a):
+    return (a + math.pi) % (2 * math.pi) - math.pi
+
+
+def combate(fuente, vx, vy, semilla, modo="AUTO", diametro=56, eje=80):
+    """Un combate: (resultado, ms hasta el final o None, golpes, aciertos)."""
+    sim = Simulador()
+    for i in range(MODOS[modo]):
+        sim.pulsar_mando(T_LISTO_MS + i * 500, Button.CENTER, 60)
+    mundo = Combate(sim, vx, vy, random.Random(semilla), diametro, eje)
+    res = sim.ejecutar("SUMO_MASTER_V25.py", T_INICIO + DURACION_MS, fuente=fuente)
+    if res.error is not None:
+        raise RuntimeError("el script falló: %r" % (res.error,))
+    if Port.D not in sim.motores:
+        raise RuntimeError("el script no creó el motor del arma")
+    return mundo.resultado, mundo.t_fin, mundo.golpes, mundo.aciertos
+
+
+def _lote(tarea):
+    # Trabajo de un proceso: varios combates del mismo punto de la rejilla
+    indice, fuente, semillas, guion, modo, diametro, eje = tarea
+    lote = guiones_rival(semillas, guion)
+    vx, vy = velocidades_rival(lote)
+    return indice, [combate(fuente, vx[k], vy[k], s, modo, diametro, eje) for k, s in enumerate(semillas)]
+
+
+# ==============================================================================
+# --- REJILLA ---
+# ==============================================================================
+
+
+def parsear_parametro(texto):
+    """``NOMBRE=v1,v2`` -> (nombre, [valores]); ``a/b/c`` es una lista."""
+    nombre, _, valores = texto.partition("=")
+    if not nombre or not valores:
+        raise ValueError("usa NOMBRE=v1,v2,...: %r" % texto)
+    salida = []
+    try:
+        for v in valores.split(","):
+            if "/" in v:
+                salida.append([ast.literal_eval(x) for x in v.split("/")])
+            else:
+                salida.append(ast.literal_eval(v))
+    except (ValueError, SyntaxError):
+        raise ValueError("valor no válido en %r" % texto)
+    return nombre.strip(), salida
+
+
+def resumir(resultados):
+    n = len(resultados)
+    ganados = [t for r, t, _, _ in resultados if r == GANA]
+    return {
+        "combates": n,
+        "gana": len(ganados) / n if n else 0.0,
+        "pierde": sum(1 for r in resultados if r[0] == PIERDE) / n if n else 0.0,
+        "t_gana": sum(ganados) / len(ganados) / 1000.0 if ganados else float("nan"),
+        "golpes": sum(r[2] for r in resultados) / n if n else 0.0,
+        "aciertos": sum(r[3] for r in resultados) / n if n else 0.0,
+    }
+
+
+def barrer(rejilla, combates=50, semilla=69, guion=None, modo="AUTO", procesos=None, por_tarea=10):
+    """Resumen por punto de ``rejilla`` (lista de dicts de LIVE CONFIG)."""
+    tareas = []
+    for i, config in enumerate(rejilla):
+        fuente, _ = generar(config, minificado=False)
+        diametro = config.get("DIAMETRO_RUEDA", 56)
+        eje = config.get("ANCHO_EJE", 80)
+        # Mismas semillas en todos los puntos: cada punto ve los mismos rivales
+        semillas = [semilla * 100003 + k for k in range(combates)]
+        for j in range(0, combates, por_tarea):
+            tareas.append((i, fuente, semillas[j:j + por_tarea], guion, modo, diametro, eje))
+    resultados = [[] for _ in rejilla]
+    if procesos == 1:
+        for indice, lote in map(_lote, tareas):
+            resultados[indice].extend(lote)
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            for indice, lote in pool.map(_lote, tareas):
+                resultados[indice].extend(lote)
+    return [resumir(r) for r in resultados]
+
+
+# ==============================================================================
+# --- SALIDA ---
+# ==============================================================================
+
+
+def _fmt(v):
+    return "/".join(str(x) for x in v) if isinstance(v, list) else str(v)
+
+
+def tabla(ejes, rejilla, resumen):
+    nombres = [n for n, _ in ejes]
+    print("  ".join("%12s" % n[:12] for n in nombres)
+          + " %8s %7s %7s %8s %7s %8s" % ("combates", "gana", "pierde", "t_gana_s", "golpes", "aciertos"))
+    for config, m in zip(rejilla, resumen):
+        print("  ".join("%12s" % _fmt(config[n]) for n in nombres)
+              + " %8d %6.0f%% %6.0f%% %8.1f %7.1f %8.1f" % (
+                  m["combates"], 100 * m["gana"], 100 * m["pierde"], m["t_gana"], m["golpes"], m["aciertos"]))
+
+
+def superficie(ejes, resumen, clave, titulo, formato, escala=1.0):
+    """Matriz filas = primer parámetro, columnas = segundo."""
+    (n1, v1), (n2, v2) = ejes
+    print("\n%s (%s \\ %s)" % (titulo, n1, n2))
+    print("%12s " % "" + " ".join("%9s" % _fmt(v)[:9] for v in v2))
+    for i, a in enumerate(v1):
+        fila = resumen[i * len(v2):(i + 1) * len(v2)]
+        print("%12s " % _fmt(a)[:12] + " ".join(formato % (m[clave] * escala) for m in fila))
+
+
+def escribir_csv(ejes, rejilla, resumen, destino):
+    import csv
+
+    campos = ("combates", "gana", "pierde", "t_gana", "golpes", "aciertos")
+    w = csv.writer(destino)
+    w.writerow([n for n, _ in ejes] + list(campos))
+    for config, m in zip(rejilla, resumen):
+        w.writerow([_fmt(config[n]) for n, _ in ejes] + [m[c] for c in campos])
+
+
+def escribir_npz(ejes, resumen, ruta):
+    """Superficies con la forma de la rejilla (un eje por parámetro)."""
+    forma = tuple(len(v) for _, v in ejes)
+    datos = {c: np.array([m[c] for m in resumen]).reshape(forma)
+             for c in ("gana", "pierde", "t_gana", "golpes", "aciertos")}
+    for k, (n, v) in enumerate(ejes):
+        datos["eje%d_%s" % (k, n)] = np.array([_fmt(x) for x in v])
+    np.savez(ruta, **datos)
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("-p", "--param", action="append", default=[],
+                    help="NOMBRE=v1,v2,... del LIVE CONFIG (listas como 350/650/1000)")
+    ap.add_argument("-n", "--combates", type=int, default=50, help="combates por punto")
+    ap.add_argument("--guion", choices=GUIONES, help="un solo tipo de rival (por defecto, al azar)")
+    ap.add_argument("--modo", choices=sorted(MODOS), default="AUTO")
+    ap.add_argument("--procesos", type=int, help="procesos del pool (por defecto, uno por CPU)")
+    ap.add_argument("--semilla", type=int, default=69)
+    ap.add_argument("--csv", help="resumen por punto en CSV ('-' = stdout)")
+    ap.add_argument("--npz", help="superficies como arrays de NumPy")
+    args = ap.parse_args(argv)
+
+    try:
+        ejes = [parsear_parametro(p) for p in args.param]
+    except ValueError as e:
+        ap.error(str(e))
+    if args.npz and np is None:
+        print("error: --npz necesita NumPy", file=sys.stderr)
+        return 1
+
+    rejilla = [dict(zip([n for n, _ in ejes], valores))
+               for valores in itertools.product(*[v for _, v in ejes])]
+    try:
+        resumen = barrer(rejilla, args.combates, args.semilla, args.guion, args.modo,
+                         args.procesos or os.cpu_count())
+    except ErrorConfig as e:
+        print("error:", e, file=sys.stderr)
+        return 2
+    except RuntimeError as e:
+        print("error:", e, file=sys.stderr)
+        return 1
+
+    tabla(ejes, rejilla, resumen)
+    if len(ejes) == 2:
+        superficie(ejes, resumen, "gana", "victorias", "%8.0f%%", 100.0)
+        superficie(ejes, resumen, "t_gana", "segundos hasta sacar al rival", "%9.1f")
+    if args.csv == "-":
+        escribir_csv(ejes, rejilla, resumen, sys.stdout)
+    elif args.csv:
+        with open(args.csv, "w", newline="") as f:
+            escribir_csv(ejes, rejilla, resumen, f)
+    if args.npz:
+        escribir_npz(ejes, resumen, args.npz)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
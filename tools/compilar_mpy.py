@@ -0,0 +1,214 @@
+"""Cross-compiles the generated hub program to MicroPython bytecode (.mpy).
+
+Runs a local mpy-cross (``--mpy-cross``, $MPY_CROSS, ``mpy-cross`` on PATH or
+the ``mpy_cross_v6`` / ``mpy_cross`` pip packages) on the output of
+generar_hub.py and packages the result in the multi-file format that Pybricks
+firmware (MPY ABI 6) accepts for download-and-run. ``--bench`` compares
+uploading source and bytecode: payload bytes, 20-byte BLE chunks, and a model
+of the hub's compile/load time and peak heap. mpy-cross is optional and not
+shipped with the repo; without it only the source rows of ``--bench`` run.
+
+    pip install mpy-cross                             # o mpy-cross-v6 (ABI 6)
+    python tools/compilar_mpy.py bot.json -o hub.bin
+    python tools/compilar_mpy.py --defecto --bench
+"""
+
+import ast
+import importlib
+import io
+import os
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import tokenize
+
+from generar_hub import PAQUETE_BLE, PLANTILLA, ErrorConfig, generar, paquetes
+
+ABI_PYBRICKS = 6
+ARGS_POR_DEFECTO = ["-msmall-int-bits=31"]  # como compila pybricksdev para los hubs
+
+# Modelo del hub (Cortex-M4, ~100 MHz). Sólo sirve para comparar variantes;
+# los valores absolutos hay que calibrarlos con tiempos medidos en el hub.
+US_TOKEN = 20            # léxico + análisis + emisión, por token del fuente
+US_BYTE_MPY = 0.5        # carga de .mpy: copia del bytecode e internado de qstr
+BYTES_NODO = 16          # nodo del árbol de análisis (cabecera + hijos)
+FACTOR_BYTECODE = 0.5    # bytecode de MicroPython frente a co_code de CPython 3.11
+MS_PAQUETE = 7.5         # un paquete de 20 B por evento de conexión BLE
+
+
+class ErrorCompilacion(RuntimeError):
+    pass
+
+
+# ==============================================================================
+# --- MPY-CROSS ---
+# ==============================================================================
+
+
+def buscar_mpy_cross(ruta=None):
+    """Comando (lista) para ejecutar mpy-cross, o None si no hay ninguno."""
+    for cand in (ruta, os.environ.get("MPY_CROSS"), shutil.which("mpy-cross")):
+        if cand:
+            return [cand]
+    # Paquetes de PyPI que traen el binario dentro
+    for modulo in ("mpy_cross_v6", "mpy_cross"):
+        try:
+            paquete = importlib.import_module(modulo)
+        except ImportError:
+            continue
+        binario = os.path.join(os.path.dirname(paquete.__file__), "mpy-cross")
+        if os.path.exists(binario):
+            return [binario]
+    return None
+
+
+def version_mpy(cmd):
+    """Versión de formato .mpy que emite ``cmd`` (None si no se reconoce)."""
+    salida = subprocess.run(cmd + ["--version"], capture_output=True, text=True).stdout
+    m = re.search(r"mpy v(\d+)", salida)
+    return int(m.group(1)) if m else None
+
+
+def compilar(codigo, cmd, args=ARGS_POR_DEFECTO, nombre="__main__"):
+    """Bytes .mpy de ``codigo`` compilado con mpy-cross."""
+    with tempfile.TemporaryDirectory() as d:
+        # Ruta relativa: es el nombre de fichero que verán las trazas del hub
+        fuente = nombre + ".py"
+        destino = os.path.join(d, nombre + ".mpy")
+        with open(os.path.join(d, fuente), "w", encoding="utf-8") as f:
+            f.write(codigo)
+        proc = subprocess.run(cmd + list(args) + ["-o", destino, fuente],
+                              capture_output=True, text=True, cwd=d)
+        if proc.returncode != 0:
+            raise ErrorCompilacion(proc.stderr.strip() or "mpy-cross falló (%d)" % proc.returncode)
+        with open(destino, "rb") as f:
+            return f.read()
+
+
+def empaquetar(modulos):
+    """Formato multi-.mpy de Pybricks: por módulo, tamaño u32 | nombre\\0 | mpy."""
+    partes = []
+    for nombre, mpy in modulos:
+        partes.append(struct.pack("<I", len(mpy)))
+        partes.append(nombre.encode("utf-8") + b"\x00")
+        partes.append(mpy)
+    return b"".join(partes)
+
+
+# ==============================================================================
+# --- MODELO DEL HUB ---
+# ==============================================================================
+
+
+def _tokens(codigo):
+    ignorar = (tokenize.NL, tokenize.COMMENT, tokenize.ENCODING, tokenize.ENDMARKER)
+    return sum(1 for t in tokenize.generate_tokens(io.StringIO(codigo).readline) if t.type not in ignorar)
+
+
+def _bytecode(codigo):
+    total = 0
+    pila = [compile(codigo, "<hub>", "exec")]
+    while pila:
+        co = pila.pop()
+        total += len(co.co_code)
+        pila.extend(c for c in co.co_consts if hasattr(c, "co_code"))
+    return int(total * FACTOR_BYTECODE)
+
+
+def modelo_fuente(codigo):
+    """Compilación en el hub: el texto, el árbol y el bytecode conviven en el pico."""
+    datos = codigo.encode("utf-8")
+    nodos = sum(1 for _ in ast.walk(ast.parse(codigo)))
+    return {
+        "bytes": len(datos),
+        "paquetes": paquetes(len(datos)),
+        "t_hub_ms": _tokens(codigo) * US_TOKEN / 1000.0,
+        "heap_pico": len(datos) + nodos * BYTES_NODO + _bytecode(codigo),
+    }
+
+
+def modelo_mpy(paquete, mpy):
+    """Carga de bytecode: sin compilar; el pico es el propio .mpy en RAM."""
+    return {
+        "bytes": len(paquete),
+        "paquetes": paquetes(len(paquete)),
+        "t_hub_ms": len(mpy) * US_BYTE_MPY / 1000.0,
+        "heap_pico": len(mpy),
+    }
+
+
+def tabla(filas):
+    print("%-18s %8s %9s %10s %9s %10s" % ("variante", "bytes", "paquetes", "subida_ms", "hub_ms", "heap_pico"))
+    for nombre, m in filas:
+        print("%-18s %8d %9d %10.0f %9.1f %10d" % (
+            nombre, m["bytes"], m["paquetes"], m["paquetes"] * MS_PAQUETE, m["t_hub_ms"], m["heap_pico"]))
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("config", nargs="?", help="config JSON del robot (ver generar_hub.py)")
+    ap.add_argument("--defecto", action="store_true", help="usa el LIVE CONFIG de la plantilla")
+    ap.add_argument("-o", "--salida", help="paquete .bin listo para subir")
+    ap.add_argument("--mpy", help="guarda también el .mpy suelto")
+    ap.add_argument("--mpy-cross", help="ruta del ejecutable mpy-cross")
+    ap.add_argument("--arg", action="append", help="argumento extra para mpy-cross (repetible)")
+    ap.add_argument("--bench", action="store_true", help="compara fuente y bytecode")
+    args = ap.parse_args(argv)
+    if not args.config and not args.defecto:
+        ap.error("indica un fichero de config o --defecto")
+
+    config = {}
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config = json.load(f)
+    try:
+        codigo, _ = generar(config)
+    except ErrorConfig as e:
+        print("error:", e, file=sys.stderr)
+        return 2
+
+    cmd = buscar_mpy_cross(args.mpy_cross)
+    mpy = paquete = None
+    if cmd is None:
+        print("mpy-cross no encontrado (pip install mpy-cross, o usa --mpy-cross)", file=sys.stderr)
+        if not args.bench:
+            return 1
+    else:
+        v = version_mpy(cmd)
+        if v is not None and v != ABI_PYBRICKS:
+            print("aviso: mpy-cross emite mpy v%d; Pybricks espera v%d" % (v, ABI_PYBRICKS), file=sys.stderr)
+        try:
+            mpy = compilar(codigo, cmd, ARGS_POR_DEFECTO + (args.arg or []))
+        except ErrorCompilacion as e:
+            print("error:", e, file=sys.stderr)
+            return 1
+        paquete = empaquetar([("__main__", mpy)])
+        if args.salida:
+            with open(args.salida, "wb") as f:
+                f.write(paquete)
+        if args.mpy:
+            with open(args.mpy, "wb") as f:
+                f.write(mpy)
+
+    if args.bench:
+        with open(PLANTILLA, encoding="utf-8") as f:
+            filas = [("plantilla .py", modelo_fuente(f.read())), ("generado .py", modelo_fuente(codigo))]
+        if paquete is not None:
+            filas.append(("generado .mpy", modelo_mpy(paquete, mpy)))
+        tabla(filas)
+        print("(paquetes de %d B a %.1f ms; tiempos y heap del hub según el modelo de este fichero)"
+              % (PAQUETE_BLE, MS_PAQUETE))
+    elif paquete is not None:
+        print("%s: %d B .mpy, %d B paquete, %d paquetes de %d B" % (
+            args.salida or "(sin salida)", len(mpy), len(paquete), paquetes(len(paquete)), PAQUETE_BLE))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
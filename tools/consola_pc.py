@@ -0,0 +1,428 @@
+"""Host-side sender for the framed PC-control protocol of SUMO_MASTER_V25.py.
+
+Builds command frames (drive with explicit speed/turn, stop, strike, ping,
+telemetry on/off, tick report, parameter hot-reload, match-trace dump), parses
+the hub's acknowledgements and measures round-trip command latency.
+
+    python tools/consola_pc.py --sim                       # hub simulado
+    python tools/consola_pc.py --cmd "pybricksdev run ble SUMO_MASTER_V25.py"
+    python tools/consola_pc.py --sim --ajustar DISTANCIA_DISPARO=120 UMBRAL_LINEA=40
+    python tools/consola_pc.py --cmd "..." --traza captura.bin   # para repeticion.py
+"""
+
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+# Debe coincidir con la sección CONSOLA PC del script del hub
+SYNC = 0xAA
+OP_CONDUCIR, OP_PARAR, OP_GOLPE, OP_PING, OP_TELEMETRIA, OP_INFORME = 1, 2, 3, 4, 5, 6
+OP_AJUSTE, OP_CONFIRMAR, OP_TRAZA = 7, 8, 9
+RESP_CONDUCIR, RESP_PING, RESP_AJUSTE, RESP_RECHAZO = 0x81, 0x84, 0x88, 0x89
+RESPUESTAS = (RESP_CONDUCIR, RESP_PING, RESP_AJUSTE, RESP_RECHAZO)
+
+# Parámetros ajustables en caliente: nombre -> (id, mínimo, máximo), como AJ_MIN/AJ_MAX
+PARAMETROS = {
+    "V_MAX": (0, 50, 1000),
+    "ACELERACION_BASE": (1, 100, 2000),
+    "G_VEL_SENS": (2, 20, 720),
+    "DISTANCIA_ATAQUE": (3, 40, 2000),
+    "DISTANCIA_DISPARO": (4, 40, 2000),
+    "DIST_RETROCESO": (5, 0, 500),
+    "UMBRAL_LINEA": (6, 0, 100),
+    "VELOCIDAD_GOLPE": (7, 50, 1500),
+}
+TAM_TELEMETRIA = 19  # tramas A5 5A de telemetria.py, se saltan enteras
+TAM_TRAZA = 38       # tramas A5 5C del grabador (las extrae repeticion.py), ídem
+TAM_RELE = 6         # tramas A5 5D del relé de difusión BLE (telemetria.py --rele), ídem
+
+
+def _trama(op, datos=b""):
+    return bytes((SYNC, op)) + datos + bytes(((op + sum(datos)) & 0xFF,))
+
+
+def trama_conducir(seq, v, giro):
+    return _trama(OP_CONDUCIR, struct.pack("<Bhh", seq & 0xFF, v, giro))
+
+
+def trama_parar():
+    return _trama(OP_PARAR)
+
+
+def trama_golpe():
+    return _trama(OP_GOLPE)
+
+
+def trama_ping(seq):
+    return _trama(OP_PING, bytes((seq & 0xFF,)))
+
+
+def trama_telemetria(activa):
+    return _trama(OP_TELEMETRIA, bytes((1 if activa else 0,)))
+
+
+def trama_informe():
+    return _trama(OP_INFORME)
+
+
+def trama_ajuste(nombre, valor):
+    ident, minimo, maximo = PARAMETROS[nombre]
+    if not minimo <= valor <= maximo:
+        raise ValueError("%s=%d fuera de rango [%d, %d]" % (nombre, valor, minimo, maximo))
+    return _trama(OP_AJUSTE, struct.pack("<Bh", ident, valor))
+
+
+def trama_confirmar(seq):
+    return _trama(OP_CONFIRMAR, bytes((seq & 0xFF,)))
+
+
+def trama_traza():
+    return _trama(OP_TRAZA)
+
+
+class LectorRespuestas:
+    """Extrae respuestas (op, seq) del flujo de stdout del hub.
+
+    El flujo mezcla texto de ``print``, tramas de telemetría y respuestas; lo
+    que no valida se descarta byte a byte.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def alimentar(self, datos):
+        self._buf.extend(datos)
+        salida = []
+        b = self._buf
+        i = 0
+        while i + 4 <= len(b):
+            if b[i] == 0xA5 and b[i + 1] == 0x5A and i + TAM_TELEMETRIA <= len(b):
+                if sum(b[i + 2:i + TAM_TELEMETRIA - 1]) & 0xFF == b[i + TAM_TELEMETRIA - 1]:
+                    i += TAM_TELEMETRIA
+                    continue
+            if b[i] == 0xA5 and b[i + 1] == 0x5C and i + TAM_TRAZA <= len(b):
+                if sum(b[i + 2:i + TAM_TRAZA - 1]) & 0xFF == b[i + TAM_TRAZA - 1]:
+                    i += TAM_TRAZA
+                    continue
+            if b[i] == 0xA5 and b[i + 1] == 0x5D and i + TAM_RELE <= len(b):
+                if sum(b[i + 2:i + TAM_RELE - 1]) & 0xFF == b[i + TAM_RELE - 1]:
+                    i += TAM_RELE
+                    continue
+            if b[i] == SYNC and b[i + 1] in RESPUESTAS \
+                    and (b[i + 1] + b[i + 2]) & 0xFF == b[i + 3]:
+                salida.append((b[i + 1], b[i + 2]))
+                i += 4
+                continue
+            i += 1
+        del b[:i]
+        return salida
+
+
+class Emisor:
+    """Envía órdenes numeradas y mide la latencia ida y vuelta de sus acks.
+
+    ``escribir`` recibe bytes y ``reloj`` devuelve milisegundos; así sirve
+    igual para un hub real que para el simulador. ``recibir`` puede llamarse
+    desde otro hilo (el lector de TransporteProceso): las órdenes en vuelo y
+    las latencias van bajo un cerrojo.
+    """
+
+    def __init__(self, escribir, reloj):
+        self._escribir = escribir
+        self._reloj = reloj
+        self._seq = 0
+        self._pendientes = {}
+        self._cerrojo = threading.Lock()
+        self.latencias = []
+        self.sustituidas = 0
+        self.ajustes = {}  # seq -> True (aplicado) / False (rechazado)
+        self.lector = LectorRespuestas()
+
+    def _siguiente(self):
+        self._seq = (self._seq + 1) & 0xFF
+        return self._seq
+
+    def _registrar(self, resp, seq):
+        with self._cerrojo:
+            self._pendientes[(resp, seq)] = self._reloj()
+
+    def conducir(self, v, giro):
+        seq = self._siguiente()
+        self._registrar(RESP_CONDUCIR, seq)
+        self._escribir(trama_conducir(seq, v, giro))
+        return seq
+
+    def ping(self):
+        seq = self._siguiente()
+        self._registrar(RESP_PING, seq)
+        self._escribir(trama_ping(seq))
+        return seq
+
+    def parar(self):
+        self._escribir(trama_parar())
+
+    def golpe(self):
+        self._escribir(trama_golpe())
+
+    def telemetria(self, activa):
+        self._escribir(trama_telemetria(activa))
+
+    def traza(self):
+        self._escribir(trama_traza())
+
+    def ajustar(self, cambios):
+        """Envía un lote {nombre: valor} y su confirmación; el hub responde una vez."""
+        tramas = b"".join(trama_ajuste(n, v) for n, v in cambios.items())
+        seq = self._siguiente()
+        self._registrar(RESP_AJUSTE, seq)
+        self._escribir(tramas + trama_confirmar(seq))
+        return seq
+
+    def recibir(self, datos, t_ms=None):
+        """Procesa bytes del hub; devuelve las respuestas reconocidas."""
+        t = self._reloj() if t_ms is None else t_ms
+        resp = self.lector.alimentar(datos)
+        with self._cerrojo:
+            for clave in resp:
+                if clave[0] in (RESP_AJUSTE, RESP_RECHAZO):
+                    self.ajustes[clave[1]] = clave[0] == RESP_AJUSTE
+                    clave = (RESP_AJUSTE, clave[1])
+                t0 = self._pendientes.pop(clave, None)
+                if t0 is None:
+                    continue
+                # Órdenes de conducción anteriores a la confirmada fueron sustituidas
+                if clave[0] == RESP_CONDUCIR:
+                    for k in [k for k in self._pendientes if k[0] == RESP_CONDUCIR and k[1] != clave[1]]:
+                        if self._pendientes[k] <= t0:
+                            del self._pendientes[k]
+                            self.sustituidas += 1
+                self.latencias.append(t - t0)
+        return resp
+
+    def resumen(self):
+        with self._cerrojo:
+            lat = sorted(self.latencias)
+            pendientes = len(self._pendientes)
+        if not lat:
+            return "sin respuestas (%d pendientes)" % pendientes
+        return "n=%d media=%.1f p50=%.1f p95=%.1f max=%.1f ms, sustituidas=%d, sin respuesta=%d" % (
+            len(lat), sum(lat) / len(lat), lat[len(lat) // 2], lat[int(len(lat) * 0.95)],
+            lat[-1], self.sustituidas, pendientes)
+
+
+# ==============================================================================
+# --- TRANSPORTES ---
+# ==============================================================================
+
+
+def rafaga_ordenes(emisor, i, rafaga):
+    """Ráfaga ``i`` de la medida: órdenes de conducción a velocidades concretas y un ping."""
+    for k in range(rafaga):
+        emisor.conducir(100 + (i * 37 + k) % 800, (i * 13) % 200 - 100)
+    emisor.ping()
+
+
+def sesion_simulada(script, ordenes=200, intervalo_ms=35, rafaga=3, bps=None):
+    """Mide la latencia contra el hub simulado (reloj virtual, en ms)."""
+    from pybricks_sim import Simulador
+
+    sim = Simulador()
+    if bps:
+        sim.enlace(bps)
+    salida = sim.stdout.buffer
+    emisor = Emisor(lambda datos: sim.stdin.alimentar(datos), sim.ahora)
+    leido = [0, 0]  # marcas procesadas, bytes procesados
+
+    def recoger():
+        # Entrega al emisor lo que ya ha llegado al host
+        while leido[0] < len(salida.marcas) and salida.marcas[leido[0]][0] <= sim.ahora():
+            llegada, fin = salida.marcas[leido[0]]
+            emisor.recibir(bytes(salida.datos[leido[1]:fin]), llegada)
+            leido[0] += 1
+            leido[1] = fin
+
+    def tick_host(i):
+        recoger()
+        if i < ordenes:
+            rafaga_ordenes(emisor, i, rafaga)
+
+    t0 = 3600.0
+    for i in range(ordenes + 20):
+        sim.en(t0 + i * intervalo_ms, lambda i=i: tick_host(i))
+    res = sim.ejecutar(script, t0 + (ordenes + 20) * intervalo_ms)
+    if res.error is not None:
+        raise RuntimeError("el script falló: %r" % (res.error,))
+    return emisor, res
+
+
+def ajuste_simulado(script, cambios, t_envio=3600.0):
+    """Envía un lote de ajustes al hub simulado; devuelve (emisor, seq, resultado)."""
+    from pybricks_sim import Simulador
+
+    sim = Simulador()
+    salida = sim.stdout.buffer
+    emisor = Emisor(lambda datos: sim.stdin.alimentar(datos), sim.ahora)
+    seq = []
+    sim.en(t_envio, lambda: seq.append(emisor.ajustar(cambios)))
+    res = sim.ejecutar(script, t_envio + 500)
+    if res.error is not None:
+        raise RuntimeError("el script falló: %r" % (res.error,))
+    fin = 0
+    for llegada, hasta in salida.marcas:
+        emisor.recibir(bytes(salida.datos[fin:hasta]), llegada)
+        fin = hasta
+    return emisor, seq[0], res
+
+
+def traza_simulada(script, t_envio=3600.0, espera_ms=3000):
+    """Pide el volcado de la traza al hub simulado; devuelve la captura cruda."""
+    from pybricks_sim import Simulador
+
+    sim = Simulador()
+    sim.en(t_envio, lambda: sim.stdin.alimentar(trama_traza()))
+    res = sim.ejecutar(script, t_envio + espera_ms)
+    if res.error is not None:
+        raise RuntimeError("el script falló: %r" % (res.error,))
+    return res.salida_bin
+
+
+def _parsear_ajustes(pares):
+    cambios = {}
+    for par in pares:
+        nombre, _, valor = par.partition("=")
+        if nombre not in PARAMETROS:
+            raise SystemExit("parámetro desconocido: %s (válidos: %s)" % (nombre, ", ".join(PARAMETROS)))
+        cambios[nombre] = int(valor)
+        trama_ajuste(nombre, cambios[nombre])  # valida el rango antes de enviar
+    return cambios
+
+
+class TransporteProceso:
+    """Conecta con un proceso que reenvía stdin/stdout del hub (p. ej. pybricksdev)."""
+
+    def __init__(self, cmd):
+        self.proc = subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.emisor = Emisor(self._escribir, lambda: time.monotonic() * 1000.0)
+        self.captura = None  # bytearray: guarda también el flujo crudo
+        self.t_ultimo = time.monotonic()
+        self._hilo = threading.Thread(target=self._leer, daemon=True)
+        self._hilo.start()
+
+    def _escribir(self, datos):
+        self.proc.stdin.write(datos)
+        self.proc.stdin.flush()
+
+    def _leer(self):
+        while True:
+            datos = self.proc.stdout.read1(256)
+            if not datos:
+                break
+            self.t_ultimo = time.monotonic()
+            if self.captura is not None:
+                self.captura.extend(datos)
+            self.emisor.recibir(datos)
+
+    def cerrar(self):
+        self.proc.terminate()
+
+
+def _estado_ajuste(emisor, seq):
+    estado = emisor.ajustes.get(seq)
+    return "sin respuesta" if estado is None else ("aplicado" if estado else "rechazado por el hub")
+
+
+def _guardar_traza(ruta, captura):
+    from repeticion import extraer
+
+    with open(ruta, "wb") as f:
+        f.write(captura)
+    traza, est = extraer(captura)
+    print("traza: %d bytes en %d tramas (%d corruptas, %d perdidas)%s -> %s" % (
+        len(traza), est["tramas"], est["corruptas"], est["perdidas"],
+        "" if est["completa"] else ", INCOMPLETA", ruta))
+    return 0 if est["completa"] else 1
+
+
+def main(argv=None):
+    import argparse
+    import os
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("--sim", action="store_true", help="usa el hub simulado")
+    g.add_argument("--cmd", help="comando que conecta con el hub por stdin/stdout")
+    ap.add_argument("--script", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                     os.pardir, "SUMO_MASTER_V25.py"))
+    ap.add_argument("--ordenes", type=int, default=200)
+    ap.add_argument("--intervalo", type=float, default=35.0, help="ms entre ráfagas")
+    ap.add_argument("--rafaga", type=int, default=3, help="órdenes de conducción por ráfaga")
+    ap.add_argument("--bps", type=int, help="ancho del enlace simulado (bytes/s)")
+    ap.add_argument("--ajustar", nargs="+", metavar="NOMBRE=VALOR",
+                    help="envía un lote de ajustes en caliente y espera su confirmación")
+    ap.add_argument("--traza", metavar="FICHERO",
+                    help="pide el volcado de la traza del combate y guarda la captura cruda")
+    args = ap.parse_args(argv)
+
+    if args.traza:
+        if args.sim:
+            return _guardar_traza(args.traza, traza_simulada(args.script))
+        tr = TransporteProceso(args.cmd)
+        try:
+            tr.captura = bytearray()
+            tr.emisor.traza()
+            # El volcado termina cuando el hub deja de hablar (o a los 60 s)
+            limite = time.monotonic() + 60.0
+            while time.monotonic() - tr.t_ultimo < 1.5 and time.monotonic() < limite:
+                time.sleep(0.05)
+        finally:
+            tr.cerrar()
+        return _guardar_traza(args.traza, bytes(tr.captura))
+
+    if args.ajustar:
+        try:
+            cambios = _parsear_ajustes(args.ajustar)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        if args.sim:
+            emisor, seq, res = ajuste_simulado(args.script, cambios)
+            aplicado = {n: res.globales.get(n) for n in cambios}
+            print("ajuste seq=%d: %s, %s" % (seq, _estado_ajuste(emisor, seq), emisor.resumen()))
+            print("valores en el hub:", aplicado)
+            return 0 if emisor.ajustes.get(seq) else 1
+        tr = TransporteProceso(args.cmd)
+        try:
+            seq = tr.emisor.ajustar(cambios)
+            limite = time.monotonic() + 2.0
+            while seq not in tr.emisor.ajustes and time.monotonic() < limite:
+                time.sleep(0.01)
+        finally:
+            tr.cerrar()
+        print("ajuste seq=%d: %s, %s" % (seq, _estado_ajuste(tr.emisor, seq), tr.emisor.resumen()))
+        return 0 if tr.emisor.ajustes.get(seq) else 1
+
+    if args.sim:
+        emisor, _ = sesion_simulada(args.script, args.ordenes, args.intervalo, args.rafaga, args.bps)
+        print("latencia (virtual):", emisor.resumen())
+        return 0
+
+    tr = TransporteProceso(args.cmd)
+    try:
+        time.sleep(5.0)  # arranque del programa y pausa de reglamento
+        # Las mismas ráfagas que en --sim: conducir con ack, ping y, al final, parar
+        for i in range(args.ordenes):
+            rafaga_ordenes(tr.emisor, i, args.rafaga)
+            time.sleep(args.intervalo / 1000.0)
+    finally:
+        try:
+            tr.emisor.parar()
+            time.sleep(0.5)
+        finally:
+            tr.cerrar()
+    print("latencia:", tr.emisor.resumen())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
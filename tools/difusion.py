@@ -0,0 +1,131 @@
+"""Hub-to-hub BLE broadcast bench on the simulated pybricks layer.
+
+Builds SUMO_MASTER_V25.py twice with generar_hub.py: a publisher
+(DIFUSION_CANAL) driven through one of bench_bucle.py's scenarios plus
+periodic mode changes, and an observer (DIFUSION_OBSERVAR, optionally
+DIFUSION_SEGUIR_MODO) listening on the same simulated medium
+(pybricks_sim.MedioBLE). Reports the advertisement size, the publication
+rate, the latency from publication to the observer's first read, the frames
+the observer relays and the mode changes it follows, and the publisher's tick
+periods with and without broadcasting.
+
+    python tools/difusion.py                                 # escenario AUTO, canal 1
+    python tools/difusion.py --escenario COMBAT --periodo 50 --recepcion 0.7
+"""
+
+import random
+import sys
+
+from bench_bucle import ESCENARIOS, MARCADOR_TICK, T_LISTO_MS, percentil
+from generar_hub import ErrorConfig, generar
+from pybricks_sim import DIFUSION_MAX_B, Button, MedioBLE, Simulador
+from telemetria import decodificar_rele
+
+DURACION_MS = 60000
+CANAL = 1
+CAMBIO_MODO_MS = 8000    # pulsación de CENTER en el publicador cada tanto
+
+
+def _modos(res):
+    # Cambios de modo: set_mode() enciende la luz del hub con COLORES_MODO[m]
+    colores = res.globales.get("COLORES_MODO", ())
+    return [(a.t, colores.index(a.args[0])) for a in res.filtrar("light", "on")
+            if a.args[0] in colores[:3]]
+
+
+def ejecutar(fuente, medio, escenario=None, duracion_ms=DURACION_MS, semilla=69, cambios_ms=0):
+    sim = Simulador(registrar_lecturas=True)
+    sim.medio_ble = medio
+    if escenario:
+        ESCENARIOS[escenario](sim, random.Random(semilla))
+    if cambios_ms:
+        for t in range(T_LISTO_MS + cambios_ms, duracion_ms, cambios_ms):
+            sim.pulsar_mando(t, Button.CENTER, 60)
+    res = sim.ejecutar("SUMO_MASTER_V25.py", duracion_ms, fuente=fuente)
+    if res.error is not None:
+        raise RuntimeError("el script falló: %r" % (res.error,))
+    return res
+
+
+def periodos(res):
+    marcas = [t for t, clave, _ in res.lecturas if clave == MARCADOR_TICK and t >= T_LISTO_MS]
+    p = [b - a for a, b in zip(marcas, marcas[1:])]
+    return {"p50": percentil(p, 50), "p95": percentil(p, 95), "stall": max(p) if p else 0.0,
+            "overruns": res.globales.get("tick_overruns", 0)}
+
+
+def seguimiento(emisor, receptor):
+    """Latencias (ms) de cada cambio de modo del emisor que el receptor repite."""
+    propios = _modos(receptor)
+    latencias = []
+    for t, m in _modos(emisor)[1:]:
+        siguiente = next((tr for tr, mr in propios if tr >= t and mr == m), None)
+        if siguiente is not None:
+            latencias.append(siguiente - t)
+    return latencias
+
+
+def bench(escenario="AUTO", periodo=100, lectura=50, seguir=True, intervalo_ms=100.0,
+          p_recepcion=0.9, duracion_ms=DURACION_MS, semilla=69, cambios_ms=CAMBIO_MODO_MS):
+    base = {"DIFUSION_PERIODO": periodo, "DIFUSION_LECTURA": lectura}
+    emisor = generar(dict(base, DIFUSION_CANAL=CANAL), minificado=False)[0]
+    receptor = generar(dict(base, DIFUSION_OBSERVAR=CANAL, DIFUSION_SEGUIR_MODO=seguir),
+                       minificado=False)[0]
+    sin = generar({}, minificado=False)[0]
+
+    medio = MedioBLE(intervalo_ms, p_recepcion, semilla=semilla)
+    res_sin = ejecutar(sin, None, escenario, duracion_ms, semilla, cambios_ms)
+    res_em = ejecutar(emisor, medio, escenario, duracion_ms, semilla, cambios_ms)
+    res_rx = ejecutar(receptor, medio, None, duracion_ms, semilla)
+    rele, est = decodificar_rele(res_rx.salida_bin)
+    seguidos = seguimiento(res_em, res_rx)
+    return {
+        "sin_difusion": periodos(res_sin),
+        "con_difusion": periodos(res_em),
+        "medio": medio.resumen(CANAL),
+        "rele": len(rele), "rele_corruptas": est["corruptas"],
+        "cambios": len(_modos(res_em)) - 1, "seguidos": len(seguidos),
+        "lat_modo": sum(seguidos) / len(seguidos) if seguidos else 0.0,
+    }
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--escenario", choices=sorted(ESCENARIOS), default="AUTO")
+    ap.add_argument("--periodo", type=int, default=100, help="DIFUSION_PERIODO (ms)")
+    ap.add_argument("--lectura", type=int, default=50, help="DIFUSION_LECTURA (ms)")
+    ap.add_argument("--no-seguir", action="store_true", help="el receptor no adopta el modo")
+    ap.add_argument("--intervalo", type=float, default=100.0, help="intervalo de anuncio BLE (ms)")
+    ap.add_argument("--recepcion", type=float, default=0.9, help="probabilidad de captar un anuncio")
+    ap.add_argument("--ms", type=int, default=DURACION_MS)
+    ap.add_argument("--semilla", type=int, default=69)
+    args = ap.parse_args(argv)
+
+    try:
+        r = bench(args.escenario, args.periodo, args.lectura, not args.no_seguir, args.intervalo,
+                  args.recepcion, args.ms, args.semilla)
+    except ErrorConfig as e:
+        print("error:", e, file=sys.stderr)
+        return 2
+
+    print("%-14s %7s %7s %8s %9s" % ("publicador", "p50", "p95", "stall", "overruns"))
+    for nombre in ("sin_difusion", "con_difusion"):
+        p = r[nombre]
+        print("%-14s %7.1f %7.1f %8.1f %9d" % (nombre, p["p50"], p["p95"], p["stall"], p["overruns"]))
+    m = r["medio"]
+    print("publicaciones  %d (%.1f/s), anuncio de %d B (máx %d)"
+          % (m["publicaciones"], m["por_s"], m["bytes_max"], DIFUSION_MAX_B))
+    print("vistas         %d/%d, latencia p50 %.0f ms, p95 %.0f ms, máx %.0f ms"
+          % (m["vistas"], m["publicaciones"], m["lat_p50"], m["lat_p95"], m["lat_max"]))
+    print("relé           %d tramas A5 5D (%d corruptas)" % (r["rele"], r["rele_corruptas"]))
+    print("modo seguido   %d/%d cambios, latencia media %.0f ms"
+          % (r["seguidos"], r["cambios"], r["lat_modo"]))
+    print("(medio simulado: anuncio cada %.0f ms, %.0f%% captados; escenario %s, %d ms)"
+          % (args.intervalo, 100 * args.recepcion, args.escenario, args.ms))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
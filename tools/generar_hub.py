@@ -0,0 +1,689 @@
+"""Config-driven generator for the hub script.
+
+Takes SUMO_MASTER_V25.py as the single template, overrides its LIVE CONFIG with
+a JSON bot config (LIVE CONFIG names, or the web app's SumoConfig / BotProfile
+schema from sumo69/src/types.ts), folds the constants, drops unreachable
+branches, unused definitions and imports, and minifies the result.
+
+    python tools/generar_hub.py bot.json -o hub.py
+    python tools/generar_hub.py bot.json -o hub.py --legible   # sin minificar
+    python tools/generar_hub.py --defecto -o hub.py            # LIVE CONFIG tal cual
+"""
+
+import ast
+import io
+import json
+import operator
+import os
+import sys
+import tokenize
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+PLANTILLA = os.path.join(AQUI, os.pardir, "SUMO_MASTER_V25.py")
+PAQUETE_BLE = 20  # bytes por escritura en el canal de subida de Pybricks
+
+# SumoConfig (web app) -> LIVE CONFIG, para los campos con otro nombre o unidad.
+# Los que se llaman igual (ACELERACION_BASE, ESTRATEGIA_ARIETE, ...) pasan directos.
+MAPA_SUMOCONFIG = {
+    "MARCHAS_CAJA": ("MARCHAS_CONDUCCION", lambda v: [int(x) * 10 for x in v]),  # % de 1000 mm/s
+    "VELOCIDAD_GIRO_BUSQUEDA": ("G_VEL_SENS", int),
+    "PERSISTENCIA_FLASH": ("ALMACEN_ACTIVO", bool),
+}
+SIN_EQUIVALENTE = {
+    "SENSIBILIDAD_GIRO", "GOLPE_MANUAL_REPETICIONES", "EMBRAGUE_PALA_ACTIVO", "LIFT_HIGH_POS",
+    "MODO_BUSQUEDA", "OPERAR_TUMBADO", "CANAL_HACKER", "MAPEO_ACCIONES",
+}
+MODELOS = ("YELLOW", "TEST")  # la plantilla es el robot martillo
+
+# Funciones que reasignan LIVE CONFIG desde el almacén: si la compilación fija
+# un valor, sus asignaciones a él se eliminan en lugar de impedir el plegado.
+CARGADORES = {"cargar_almacen"}
+
+# Llamadas sin efectos secundarios (se pueden eliminar si su resultado no se usa)
+PURAS = {
+    "array", "bytearray", "bytes", "tuple", "list", "dict", "len", "min", "max", "abs",
+    "range", "int", "bool", "StopWatch", "select.poll", "struct.calcsize", "struct.pack",
+}
+METODOS_PUROS = {"replace", "split", "join", "startswith", "endswith", "find"}
+
+_BINARIOS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Div: operator.truediv,
+    ast.LShift: operator.lshift, ast.RShift: operator.rshift, ast.BitOr: operator.or_,
+    ast.BitAnd: operator.and_, ast.BitXor: operator.xor,
+}
+_UNARIOS = {ast.USub: operator.neg, ast.UAdd: operator.pos, ast.Not: operator.not_,
+            ast.Invert: operator.invert}
+_COMPARACIONES = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Is: operator.is_, ast.IsNot: operator.is_not,
+}
+_ESCALARES = (bool, int, float, type(None))
+
+
+class ErrorConfig(ValueError):
+    pass
+
+
+# ==============================================================================
+# --- CONFIGURACIÓN ---
+# ==============================================================================
+
+
+def live_config(arbol, fuente):
+    """Diccionario nombre -> nodo Assign de las asignaciones del bloque LIVE CONFIG."""
+    lineas = fuente.splitlines()
+    ini = next(i for i, l in enumerate(lineas) if "=== LIVE CONFIG ===" in l) + 1
+    fin = next(i for i in range(ini + 1, len(lineas)) if lineas[i].startswith("# ====")) + 1
+    bloque = {}
+    for nodo in arbol.body:
+        if isinstance(nodo, ast.Assign) and ini < nodo.lineno < fin \
+                and len(nodo.targets) == 1 and isinstance(nodo.targets[0], ast.Name):
+            bloque[nodo.targets[0].id] = nodo
+    return bloque
+
+
+def _literal(nodo):
+    try:
+        return ast.literal_eval(nodo)
+    except ValueError:
+        return None
+
+
+def _validar(nombre, valor, defecto):
+    # El tipo del valor por defecto manda; V_MAX no es literal (sale de las marchas)
+    if isinstance(defecto, bool):
+        if not isinstance(valor, bool):
+            raise ErrorConfig("%s debe ser true/false" % nombre)
+    elif isinstance(defecto, list):
+        if not isinstance(valor, list) or len(valor) != len(defecto) \
+                or not all(isinstance(x, int) and not isinstance(x, bool) for x in valor):
+            raise ErrorConfig("%s debe ser una lista de %d enteros" % (nombre, len(defecto)))
+    elif isinstance(defecto, str):
+        if not isinstance(valor, str):
+            raise ErrorConfig("%s debe ser un texto" % nombre)
+    elif isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        raise ErrorConfig("%s debe ser numérico" % nombre)
+    elif isinstance(defecto, int) or defecto is None:
+        if valor != int(valor):
+            raise ErrorConfig("%s debe ser entero" % nombre)
+        valor = int(valor)
+    return valor
+
+
+def normalizar_config(datos, bloque):
+    """Traduce la config JSON a {nombre LIVE CONFIG: valor}; devuelve (valores, avisos)."""
+    if isinstance(datos.get("config"), dict):  # BotProfile del taller de la web app
+        datos = datos["config"]
+    valores, avisos = {}, []
+    for clave, valor in datos.items():
+        if clave == "ROBOT_MODEL":
+            if valor not in MODELOS:
+                raise ErrorConfig("ROBOT_MODEL %r no soportado por la plantilla (%s)"
+                                  % (valor, ", ".join(MODELOS)))
+            continue
+        if clave in MAPA_SUMOCONFIG and clave not in bloque:
+            nombre, conv = MAPA_SUMOCONFIG[clave]
+            valor = conv(valor)
+        elif clave in bloque:
+            nombre = clave
+        elif clave in SIN_EQUIVALENTE:
+            avisos.append("%s no tiene equivalente en la plantilla; se ignora" % clave)
+            continue
+        else:
+            raise ErrorConfig("clave desconocida: %s" % clave)
+        valores[nombre] = _validar(nombre, valor, _literal(bloque[nombre].value))
+    return valores, avisos
+
+
+def estrategias(arbol):
+    """Claves del diccionario ESTRATEGIAS de la plantilla (máquina de estados)."""
+    for nodo in arbol.body:
+        if isinstance(nodo, ast.Assign) and isinstance(nodo.value, ast.Dict) \
+                and any(isinstance(t, ast.Name) and t.id == "ESTRATEGIAS" for t in nodo.targets):
+            return {_literal(k) for k in nodo.value.keys}
+    return set()
+
+
+def _validar_estrategias(arbol, bloque, valores):
+    nombres = estrategias(arbol)
+    for nombre in bloque:
+        if nombre.startswith("ESTRATEGIA_") and isinstance(_literal(bloque[nombre].value), str):
+            valor = valores.get(nombre, _literal(bloque[nombre].value))
+            if valor not in nombres:
+                raise ErrorConfig("%s: estrategia %r desconocida (%s)"
+                                  % (nombre, valor, ", ".join(sorted(nombres))))
+
+
+def aplicar_config(bloque, valores):
+    for nombre, valor in valores.items():
+        nodo = bloque[nombre]
+        nodo.value = ast.copy_location(ast.parse(repr(valor), mode="eval").body, nodo.value)
+
+
+# ==============================================================================
+# --- PLEGADO DE CONSTANTES ---
+# ==============================================================================
+
+
+def _nombres_guardados(nodos, excluir_defs=True):
+    """Nombres con contexto Store/Del bajo ``nodos`` (sin entrar en funciones)."""
+    pila = list(nodos)
+    while pila:
+        n = pila.pop()
+        if excluir_defs and isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef,
+                                           ast.ClassDef, ast.Lambda)):
+            if not isinstance(n, ast.Lambda):
+                yield n.name
+            continue
+        if isinstance(n, ast.Name) and not isinstance(n.ctx, ast.Load):
+            yield n.id
+        elif isinstance(n, (ast.Import, ast.ImportFrom)):
+            for a in n.names:
+                yield (a.asname or a.name).split(".")[0]
+        elif isinstance(n, ast.comprehension):
+            yield from _nombres_guardados([n.target], False)
+        pila.extend(ast.iter_child_nodes(n))
+
+
+def _funciones(arbol):
+    return [n for n in ast.walk(arbol) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+
+
+def _globales(funcion):
+    return {g for n in ast.walk(funcion) if isinstance(n, ast.Global) for g in n.names}
+
+
+def constantes(arbol):
+    """Nombres de módulo con un único valor escalar que nadie reasigna."""
+    asignaciones = {}
+    for nombre in _nombres_guardados(arbol.body):
+        asignaciones[nombre] = asignaciones.get(nombre, 0) + 1
+    for f in _funciones(arbol):
+        if f.name in CARGADORES:
+            continue
+        globales = _globales(f)
+        for nombre in _nombres_guardados(f.body):
+            if nombre in globales:
+                asignaciones[nombre] = asignaciones.get(nombre, 0) + 1
+    valores = {}
+    for nodo in arbol.body:
+        if not isinstance(nodo, ast.Assign) or len(nodo.targets) != 1:
+            continue
+        destino, valor = nodo.targets[0], nodo.value
+        if isinstance(destino, ast.Tuple) and isinstance(valor, ast.Tuple) \
+                and len(destino.elts) == len(valor.elts):
+            pares = zip(destino.elts, valor.elts)  # A, B = 1, 2
+        else:
+            pares = [(destino, valor)]
+        for d, v in pares:
+            if isinstance(d, ast.Name) and isinstance(v, ast.Constant) \
+                    and isinstance(v.value, _ESCALARES) and asignaciones.get(d.id) == 1:
+                valores[d.id] = v.value
+    return valores
+
+
+def funciones_vacias(arbol):
+    """Funciones de módulo que no hacen nada (p. ej. tras podar su única rama)."""
+    vacias = set()
+    for s in arbol.body:
+        if isinstance(s, ast.FunctionDef) and all(
+                isinstance(n, (ast.Pass, ast.Global)) or (isinstance(n, ast.Return) and (
+                    n.value is None or _constante(n.value))) for n in s.body):
+            vacias.add(s.name)
+    return vacias
+
+
+def _constante(nodo):
+    return isinstance(nodo, ast.Constant) and isinstance(nodo.value, _ESCALARES + (str, bytes))
+
+
+def _pura(nodo, propios=(), puras=PURAS):
+    """True si evaluar ``nodo`` no tiene efectos fuera de los nombres ``propios``."""
+    for n in ast.walk(nodo):
+        if isinstance(n, ast.Call):
+            f = n.func
+            if isinstance(f, ast.Attribute) and isinstance(f.value, ast.Name) \
+                    and f.value.id in propios:
+                continue
+            if _nombre_punteado(f) not in puras:
+                return False
+        elif isinstance(n, (ast.Yield, ast.YieldFrom, ast.Await, ast.NamedExpr)):
+            return False
+    return True
+
+
+def _nombre_punteado(nodo):
+    if isinstance(nodo, ast.Name):
+        return nodo.id
+    if isinstance(nodo, ast.Attribute):
+        base = _nombre_punteado(nodo.value)
+        return base and base + "." + nodo.attr
+    return None
+
+
+def _verdad(nodo):
+    """Valor de verdad conocido de una condición (True/False) o None."""
+    if _constante(nodo):
+        return bool(nodo.value)
+    if isinstance(nodo, ast.UnaryOp) and isinstance(nodo.op, ast.Not):
+        v = _verdad(nodo.operand)
+        return None if v is None else not v
+    if isinstance(nodo, ast.BoolOp):
+        corta = isinstance(nodo.op, ast.Or)  # valor que decide la expresión
+        for i, v in enumerate(nodo.values):
+            if _verdad(v) is corta and all(_pura(p) for p in nodo.values[:i]):
+                return corta
+        if all(_verdad(v) is (not corta) for v in nodo.values):
+            return not corta
+    return None
+
+
+class Plegador(ast.NodeTransformer):
+    """Sustituye constantes, evalúa expresiones constantes y poda ramas muertas."""
+
+    def __init__(self, valores, vacias=()):
+        self.valores = valores
+        self.vacias = vacias
+        self.locales = set()
+
+    # --- ámbitos ---
+
+    def visit_FunctionDef(self, nodo):
+        previos = self.locales
+        args = nodo.args
+        todos = args.posonlyargs + args.args + args.kwonlyargs
+        todos += [a for a in (args.vararg, args.kwarg) if a]
+        globales = _globales(nodo)
+        self.locales = ({a.arg for a in todos} | set(_nombres_guardados(nodo.body))) - globales
+        if nodo.name in CARGADORES:
+            self._neutralizar(nodo)
+        for n in ast.walk(nodo):
+            if isinstance(n, ast.Global):
+                n.names = [g for g in n.names if g not in self.valores]
+        nodo.body = self._bloque(nodo.body)
+        self.locales = previos
+        return nodo
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _neutralizar(self, funcion):
+        # Asignaciones del cargador a valores fijados: a `_` o fuera
+        for n in ast.walk(funcion):
+            if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store) and n.id in self.valores:
+                n.id = "_"
+        for n in ast.walk(funcion):
+            for campo in ("body", "orelse", "finalbody"):
+                bloque = getattr(n, campo, None)
+                if isinstance(bloque, list):
+                    bloque[:] = [s for s in bloque if not (
+                        isinstance(s, ast.Assign) and all(
+                            isinstance(t, ast.Name) and t.id == "_" for t in s.targets)
+                        and _pura(s.value))]
+
+    # --- expresiones ---
+
+    def visit_Name(self, nodo):
+        if isinstance(nodo.ctx, ast.Load) and nodo.id in self.valores and nodo.id not in self.locales:
+            return ast.copy_location(ast.Constant(self.valores[nodo.id]), nodo)
+        return nodo
+
+    def visit_BinOp(self, nodo):
+        self.generic_visit(nodo)
+        op = _BINARIOS.get(type(nodo.op))
+        if op and _constante(nodo.left) and _constante(nodo.right):
+            try:
+                return ast.copy_location(ast.Constant(op(nodo.left.value, nodo.right.value)), nodo)
+            except (ArithmeticError, TypeError, ValueError):
+                pass
+        return nodo
+
+    def visit_UnaryOp(self, nodo):
+        self.generic_visit(nodo)
+        op = _UNARIOS.get(type(nodo.op))
+        if op and _constante(nodo.operand):
+            try:
+                return ast.copy_location(ast.Constant(op(nodo.operand.value)), nodo)
+            except TypeError:
+                pass
+        return nodo
+
+    def visit_Compare(self, nodo):
+        self.generic_visit(nodo)
+        operandos = [nodo.left] + nodo.comparators
+        if all(_constante(o) for o in operandos) and all(type(o) in _COMPARACIONES for o in nodo.ops):
+            resultado = all(_COMPARACIONES[type(op)](a.value, b.value)
+                            for op, a, b in zip(nodo.ops, operandos, operandos[1:]))
+            return ast.copy_location(ast.Constant(resultado), nodo)
+        return nodo
+
+    def visit_BoolOp(self, nodo):
+        self.generic_visit(nodo)
+        # Sólo se pliegan prefijos constantes: el valor (no sólo la verdad) se conserva
+        corta = isinstance(nodo.op, ast.Or)
+        valores = list(nodo.values)
+        while len(valores) > 1 and _constante(valores[0]):
+            if bool(valores[0].value) is corta:
+                return valores[0]
+            valores.pop(0)
+        if len(valores) == 1:
+            return valores[0]
+        nodo.values = valores
+        return nodo
+
+    def visit_IfExp(self, nodo):
+        self.generic_visit(nodo)
+        v = _verdad(nodo.test)
+        if v is None:
+            return nodo
+        return nodo.body if v else nodo.orelse
+
+    # --- sentencias ---
+
+    def _bloque(self, sentencias):
+        salida = []
+        for s in sentencias:
+            r = self.visit(s)
+            if r is None:
+                continue
+            salida.extend(r if isinstance(r, list) else [r])
+            if salida and isinstance(salida[-1], (ast.Return, ast.Raise, ast.Break, ast.Continue)):
+                # Lo que sigue es inalcanzable (salvo un yield, que hace generador a la función)
+                resto = sentencias[sentencias.index(s) + 1:]
+                if not any(isinstance(n, (ast.Yield, ast.YieldFrom)) for r in resto for n in ast.walk(r)):
+                    break
+        return salida
+
+    def generic_visit(self, nodo):
+        for campo in ("body", "orelse", "finalbody"):
+            bloque = getattr(nodo, campo, None)
+            if isinstance(bloque, list) and bloque and isinstance(bloque[0], ast.stmt):
+                nuevo = self._bloque(bloque)
+                if not nuevo and campo == "body":
+                    nuevo = [ast.Pass()]
+                setattr(nodo, campo, nuevo)
+        for campo, valor in ast.iter_fields(nodo):
+            if campo in ("body", "orelse", "finalbody") and isinstance(valor, list) \
+                    and (not valor or isinstance(valor[0], ast.stmt)):
+                continue
+            if isinstance(valor, list):
+                nuevos = []
+                for v in valor:
+                    if isinstance(v, ast.AST):
+                        v = self.visit(v)
+                        if v is None:
+                            continue
+                    nuevos.append(v)
+                valor[:] = nuevos
+            elif isinstance(valor, ast.AST):
+                setattr(nodo, campo, self.visit(valor))
+        return nodo
+
+    def visit_If(self, nodo):
+        nodo.test = self.visit(nodo.test)
+        v = _verdad(nodo.test)
+        if v is True:
+            return self._bloque(nodo.body)
+        if v is False:
+            return self._bloque(nodo.orelse) or None
+        self.generic_visit(nodo)
+        if not nodo.orelse and all(isinstance(s, ast.Pass) for s in nodo.body) and _pura(nodo.test):
+            return None
+        return nodo
+
+    def visit_While(self, nodo):
+        nodo.test = self.visit(nodo.test)
+        if _verdad(nodo.test) is False:
+            return self._bloque(nodo.orelse) or None
+        return self.generic_visit(nodo)
+
+    def visit_Global(self, nodo):
+        return nodo if nodo.names else None
+
+    def visit_Expr(self, nodo):
+        # Docstrings y expresiones constantes sueltas
+        nodo = self.generic_visit(nodo)
+        v = nodo.value
+        if _constante(v):
+            return None
+        if isinstance(v, ast.Call) and isinstance(v.func, ast.Name) and v.func.id in self.vacias \
+                and v.func.id not in self.locales and all(_pura(a) for a in v.args + v.keywords):
+            return None
+        return nodo
+
+
+# ==============================================================================
+# --- ELIMINACIÓN DE CÓDIGO MUERTO ---
+# ==============================================================================
+
+
+def _definidos(s):
+    """Nombres que define o modifica una sentencia de módulo."""
+    if isinstance(s, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return {s.name}
+    if isinstance(s, (ast.Import, ast.ImportFrom)):
+        return {(a.asname or a.name).split(".")[0] for a in s.names}
+    nombres = set()
+    if isinstance(s, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
+        for t in (s.targets if isinstance(s, ast.Assign) else [s.target]):
+            for n in ast.walk(t):
+                if isinstance(n, ast.Name):
+                    nombres.add(n.id)
+    elif isinstance(s, ast.Expr) and isinstance(s.value, ast.Call) \
+            and isinstance(s.value.func, ast.Attribute) and isinstance(s.value.func.value, ast.Name):
+        nombres.add(s.value.func.value.id)  # x.metodo(...) sólo afecta a x
+    return nombres
+
+
+def _funcion_pura(f, puras):
+    # Sin globales ni generadores; sólo llama a funciones puras o a métodos de
+    # sus variables locales, y sólo modifica objetos locales
+    args = f.args
+    locales = {a.arg for a in args.posonlyargs + args.args + args.kwonlyargs}
+    locales |= set(_nombres_guardados(f.body))
+    for n in ast.walk(f):
+        if isinstance(n, (ast.Global, ast.Nonlocal, ast.Yield, ast.YieldFrom)):
+            return False
+        if isinstance(n, ast.Call):
+            fn = n.func
+            if isinstance(fn, ast.Attribute):
+                if not (isinstance(fn.value, ast.Name) and fn.value.id in locales) \
+                        and fn.attr not in METODOS_PUROS:
+                    return False
+            elif _nombre_punteado(fn) not in puras:
+                return False
+        if isinstance(n, (ast.Subscript, ast.Attribute)) and not isinstance(n.ctx, ast.Load):
+            base = n.value
+            while isinstance(base, (ast.Subscript, ast.Attribute)):
+                base = base.value
+            if not (isinstance(base, ast.Name) and base.id in locales):
+                return False
+    return True
+
+
+def funciones_puras(arbol):
+    """Funciones de módulo cuya llamada se puede eliminar si no se usa el resultado."""
+    defs = [s for s in arbol.body if isinstance(s, ast.FunctionDef)]
+    puras = set(PURAS)
+    cambio = True
+    while cambio:
+        cambio = False
+        for f in defs:
+            if f.name not in puras and _funcion_pura(f, puras):
+                puras.add(f.name)
+                cambio = True
+    return puras
+
+
+def _eliminable(s, definidos, puras):
+    if isinstance(s, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Import, ast.ImportFrom)):
+        return True
+    if isinstance(s, (ast.Assign, ast.AugAssign)):
+        return _pura(s, definidos, puras)
+    if isinstance(s, ast.Expr):
+        return bool(definidos) and _pura(s.value, definidos, puras)
+    return False
+
+
+def _referencias(s):
+    return {n.id for n in ast.walk(s) if isinstance(n, ast.Name)} | \
+        {g for n in ast.walk(s) if isinstance(n, ast.Global) for g in n.names}
+
+
+def eliminar_muerto(arbol):
+    """Quita definiciones, asignaciones e imports de módulo que nadie usa."""
+    sentencias = arbol.body
+    puras = funciones_puras(arbol)
+    info = [(s, _definidos(s)) for s in sentencias]
+    eliminables = [_eliminable(s, d, puras) for s, d in info]
+    referencias = []
+    for s, d in info:
+        refs = _referencias(s)
+        if isinstance(s, (ast.Assign, ast.AugAssign, ast.Expr, ast.Import, ast.ImportFrom)):
+            # Lo que una sentencia define no cuenta como uso de sí misma
+            refs -= d if not isinstance(s, ast.AugAssign) else set()
+            if isinstance(s, ast.Assign):
+                refs |= {n.id for n in ast.walk(s.value) if isinstance(n, ast.Name)}
+        elif isinstance(s, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            refs.discard(s.name)
+        referencias.append(refs)
+
+    vivos = set()
+    necesarias = [not e for e in eliminables]
+    for i, n in enumerate(necesarias):
+        if n:
+            vivos |= referencias[i]
+    cambio = True
+    while cambio:
+        cambio = False
+        for i, (s, d) in enumerate(info):
+            if not necesarias[i] and d & vivos:
+                necesarias[i] = True
+                vivos |= referencias[i]
+                cambio = True
+
+    cuerpo = []
+    for (s, d), necesaria in zip(info, necesarias):
+        if not necesaria:
+            continue
+        if isinstance(s, (ast.Import, ast.ImportFrom)):
+            s.names = [a for a in s.names if (a.asname or a.name).split(".")[0] in vivos]
+        cuerpo.append(s)
+    arbol.body = cuerpo
+    return arbol
+
+
+# ==============================================================================
+# --- MINIFICADO ---
+# ==============================================================================
+
+
+def minificar(codigo):
+    """Sangría de un espacio, sin líneas vacías ni espacios superfluos entre tokens."""
+    salida = []
+    nivel = 0
+    linea = []
+    previo = ""
+    for tok in tokenize.generate_tokens(io.StringIO(codigo).readline):
+        tipo, texto = tok.type, tok.string
+        if tipo == tokenize.INDENT:
+            nivel += 1
+        elif tipo == tokenize.DEDENT:
+            nivel -= 1
+        elif tipo == tokenize.NEWLINE:
+            if linea:
+                salida.append(" " * nivel + "".join(linea))
+            linea, previo = [], ""
+        elif tipo in (tokenize.NL, tokenize.COMMENT, tokenize.ENDMARKER):
+            continue
+        else:
+            if previo and (previo[-1].isalnum() or previo[-1] in "_\"'") \
+                    and (texto[0].isalnum() or texto[0] in "_\"'"):
+                linea.append(" ")
+            linea.append(texto)
+            previo = texto
+    return "\n".join(salida) + "\n"
+
+
+# ==============================================================================
+# --- GENERACIÓN ---
+# ==============================================================================
+
+
+def generar(config=None, plantilla=PLANTILLA, minificado=True):
+    """Devuelve (código, avisos) del script del hub para ``config`` (dict)."""
+    with open(plantilla, encoding="utf-8") as f:
+        fuente = f.read()
+    arbol = ast.parse(fuente)
+    bloque = live_config(arbol, fuente)
+    valores, avisos = normalizar_config(config or {}, bloque)
+    _validar_estrategias(arbol, bloque, valores)
+    aplicar_config(bloque, valores)
+
+    # Plegar y podar hasta que no cambie nada (una rama muerta puede dejar
+    # sin uso una función, y eso a su vez una asignación)
+    codigo = None
+    while True:
+        arbol = Plegador(constantes(arbol), funciones_vacias(arbol)).visit(arbol)
+        arbol = eliminar_muerto(arbol)
+        nuevo = ast.unparse(ast.fix_missing_locations(arbol))
+        if nuevo == codigo:
+            break
+        codigo = nuevo
+    compile(codigo, "<generado>", "exec")
+    return (minificar(codigo) if minificado else codigo + "\n"), avisos
+
+
+def paquetes(n_bytes):
+    return -(-n_bytes // PAQUETE_BLE)
+
+
+def informe(nombre, n_bytes, base=None):
+    linea = "%-11s %7d B %6d paquetes de %d B" % (nombre, n_bytes, paquetes(n_bytes), PAQUETE_BLE)
+    if base:
+        linea += "  (%+.1f%%)" % (100.0 * (n_bytes - base) / base)
+    return linea
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("config", nargs="?", help="config JSON del robot ('-' = stdin)")
+    ap.add_argument("--defecto", action="store_true", help="usa el LIVE CONFIG de la plantilla")
+    ap.add_argument("-o", "--salida", help="script generado ('-' = stdout)")
+    ap.add_argument("--plantilla", default=PLANTILLA)
+    ap.add_argument("--legible", action="store_true", help="no minifica (sangría y espacios normales)")
+    args = ap.parse_args(argv)
+    if not args.config and not args.defecto:
+        ap.error("indica un fichero de config o --defecto")
+
+    config = {}
+    if args.config == "-":
+        config = json.load(sys.stdin)
+    elif args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config = json.load(f)
+    try:
+        codigo, avisos = generar(config, args.plantilla, not args.legible)
+    except ErrorConfig as e:
+        print("error:", e, file=sys.stderr)
+        return 2
+    for a in avisos:
+        print("aviso:", a, file=sys.stderr)
+
+    datos = codigo.encode("utf-8")
+    if args.salida == "-":
+        sys.stdout.write(codigo)
+    elif args.salida:
+        with open(args.salida, "wb") as f:
+            f.write(datos)
+    with open(args.plantilla, "rb") as f:
+        base = len(f.read())
+    print(informe("plantilla", base), file=sys.stderr)
+    print(informe("generado", len(datos), base), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
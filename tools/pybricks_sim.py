@@ -0,0 +1,1123 @@
+"""Host-side Pybricks stand-in for running hub scripts on Linux.
+
+Provides fake ``pybricks.hubs``, ``pybricks.pupdevices``, ``pybricks.robotics``,
+``pybricks.parameters`` and ``pybricks.tools`` modules driven by a deterministic
+virtual clock. ``wait()`` is instant in wall time, sensor inputs and remote
+buttons are scripted on a timeline, and every actuator call is recorded with
+its timestamp.
+
+Uso:
+    sim = Simulador()
+    sim.distancia(2000, 80)                 # rival a 80 mm en t=2000 ms
+    sim.pulsar_mando(5000, Button.CENTER, 100)
+    res = sim.ejecutar("SUMO_MASTER_V25.py", duracion_ms=20000)
+    print(res.acciones[:10])
+
+    python tools/pybricks_sim.py SUMO_MASTER_V25.py --ms 10000
+"""
+
+import builtins
+import heapq
+import io
+import math
+import random
+import sys
+import types
+
+# ==============================================================================
+# --- PARÁMETROS (pybricks.parameters) ---
+# ==============================================================================
+
+
+class _Enum:
+    """Valor enumerado con nombre legible, comparable por identidad."""
+
+    __slots__ = ("nombre",)
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __repr__(self):
+        return self.nombre
+
+    def __str__(self):
+        return self.nombre
+
+
+def _enum(clase, nombres):
+    tipo = type(clase, (), {})
+    for n in nombres:
+        setattr(tipo, n, _Enum(clase + "." + n))
+    return tipo
+
+
+Button = _enum("Button", [
+    "LEFT", "RIGHT", "CENTER", "BLUETOOTH", "UP", "DOWN",
+    "LEFT_PLUS", "LEFT_MINUS", "RIGHT_PLUS", "RIGHT_MINUS",
+])
+Color = _enum("Color", [
+    "NONE", "BLACK", "GRAY", "WHITE", "RED", "ORANGE", "BROWN",
+    "YELLOW", "GREEN", "CYAN", "BLUE", "VIOLET", "MAGENTA",
+])
+Direction = _enum("Direction", ["CLOCKWISE", "COUNTERCLOCKWISE"])
+Port = _enum("Port", ["A", "B", "C", "D", "E", "F"])
+Side = _enum("Side", ["TOP", "BOTTOM", "FRONT", "BACK", "LEFT", "RIGHT"])
+Stop = _enum("Stop", ["COAST", "COAST_SMART", "BRAKE", "HOLD", "NONE"])
+Axis = _enum("Axis", ["X", "Y", "Z"])
+
+
+def _icono(filas):
+    return [[100 if c == "9" else 0 for c in f] for f in filas.split(":")]
+
+
+class Icon:
+    TRUE = _icono("00000:00009:00090:90900:09000")
+    FALSE = _icono("90009:09090:00900:09090:90009")
+    HAPPY = _icono("00000:09090:00000:90009:09990")
+    SAD = _icono("00000:09090:00000:09990:90009")
+    CLOCK = _icono("09990:90909:90999:90009:09990")
+    QUESTION = _icono("09990:90009:00990:00000:00900")
+    UP = _icono("00900:09990:90909:00900:00900")
+    DOWN = _icono("00900:00900:90909:09990:00900")
+
+
+# ==============================================================================
+# --- RELOJ VIRTUAL ---
+# ==============================================================================
+
+
+class SimulacionTerminada(BaseException):
+    """Se lanza al agotar la duración simulada.
+
+    Hereda de BaseException y se relanza en cada llamada posterior al
+    hardware, de modo que los ``except:`` desnudos del script no la absorben.
+    """
+
+
+class RelojVirtual:
+    """Reloj determinista en milisegundos con cola de eventos programados."""
+
+    def __init__(self, limite_ms=None):
+        self.ahora = 0.0
+        self.limite = limite_ms
+        self._eventos = []
+        self._seq = 0
+
+    def programar(self, t_ms, fn):
+        heapq.heappush(self._eventos, (t_ms, self._seq, fn))
+        self._seq += 1
+
+    def _procesar(self):
+        while self._eventos and self._eventos[0][0] <= self.ahora:
+            _, _, fn = heapq.heappop(self._eventos)
+            fn()
+
+    def avanzar(self, ms):
+        """Avanza ``ms`` procesando los eventos que caen dentro del intervalo."""
+        self.comprobar()
+        fin = self.ahora + max(0.0, ms)
+        while self._eventos and self._eventos[0][0] <= fin:
+            self.ahora = max(self.ahora, self._eventos[0][0])
+            self._procesar()
+        self.ahora = fin
+        self.comprobar()
+
+    def comprobar(self):
+        if self.limite is not None and self.ahora >= self.limite:
+            raise SimulacionTerminada()
+
+
+# ==============================================================================
+# --- SIMULADOR ---
+# ==============================================================================
+
+# Coste por defecto (ms virtuales) de cada llamada a un dispositivo. Evita que
+# los bucles de espera activa sin wait() congelen el reloj.
+COSTE_LLAMADA_MS = 0.05
+
+COSTES_POR_DEFECTO = {
+    "ultrasonic.distance": 0.2,
+    "color.reflection": 0.2,
+    "imu.up": 0.1,
+    "remote.pressed": 0.3,
+    "remote.connect": 2.0,   # arranque y parada del escaneo BLE, haya mando o no
+    "hub.pressed": 0.05,
+    "display.pixel": 0.05,
+    "ble.broadcast": 1.0,    # rehacer el anuncio BLE
+    "ble.observe": 0.1,
+}
+
+
+class Accion:
+    """Llamada a un actuador registrada con su instante de inicio."""
+
+    __slots__ = ("t", "disp", "metodo", "args")
+
+    def __init__(self, t, disp, metodo, args):
+        self.t, self.disp, self.metodo, self.args = t, disp, metodo, args
+
+    def __iter__(self):
+        return iter((self.t, self.disp, self.metodo, self.args))
+
+    def __repr__(self):
+        return "Accion(%.1f, %s.%s%r)" % (self.t, self.disp, self.metodo, self.args)
+
+
+class Resultado:
+    """Estado final de una ejecución simulada."""
+
+    def __init__(self, sim, ns, error):
+        self.t_final = sim.reloj.ahora
+        self.acciones = sim.acciones
+        self.lecturas = sim.lecturas
+        self.esperas = sim.esperas
+        self.salida = sim.stdout.getvalue()
+        self.salida_bin = bytes(sim.stdout.buffer.datos)
+        self.globales = ns
+        self.error = error
+
+    def filtrar(self, disp=None, metodo=None):
+        return [a for a in self.acciones
+                if (disp is None or a.disp == disp) and (metodo is None or a.metodo == metodo)]
+
+
+class Simulador:
+    """Entorno Pybricks virtual con entradas programables."""
+
+    def __init__(self, costes=None, coste_llamada_ms=COSTE_LLAMADA_MS, registrar_lecturas=False):
+        self.reloj = RelojVirtual()
+        self.costes = dict(COSTES_POR_DEFECTO)
+        if costes:
+            self.costes.update(costes)
+        self.coste_llamada = coste_llamada_ms
+        self.acciones = []
+        self.esperas = []
+        self.lecturas = [] if registrar_lecturas else None
+        self.observadores = []
+
+        # Estado de las entradas
+        self.dist_mm = 2000
+        self.reflejo = 60
+        self.color = Color.WHITE
+        self.lado_arriba = Side.FRONT
+        self.botones_mando = set()
+        self.botones_hub = set()
+        self.mando_conectado = True
+        self.stdin = _Stdin()
+        self.stdout = _Stdout(self)
+        self.almacen = bytearray(512)
+        self.medio_ble = None
+
+        self.motores = {}
+        self.base = None
+        self.hub = None
+        self.mando = None
+
+    # --- Programación de entradas ---
+
+    def en(self, t_ms, fn):
+        """Ejecuta ``fn()`` cuando el reloj virtual alcance ``t_ms``."""
+        self.reloj.programar(t_ms, fn)
+
+    def distancia(self, t_ms, mm):
+        self.en(t_ms, lambda: setattr(self, "dist_mm", mm))
+
+    def reflexion(self, t_ms, valor):
+        self.en(t_ms, lambda: setattr(self, "reflejo", valor))
+
+    def orientacion(self, t_ms, lado):
+        self.en(t_ms, lambda: setattr(self, "lado_arriba", lado))
+
+    def conexion_mando(self, t_ms, conectado):
+        self.en(t_ms, lambda: setattr(self, "mando_conectado", conectado))
+
+    def pulsar_mando(self, t_ms, botones, duracion_ms=100):
+        botones = _conjunto(botones)
+        self.en(t_ms, lambda: self.botones_mando.update(botones))
+        self.en(t_ms + duracion_ms, lambda: self.botones_mando.difference_update(botones))
+
+    def mantener_mando(self, t_ms, botones):
+        botones = _conjunto(botones)
+        self.en(t_ms, lambda: (self.botones_mando.clear(), self.botones_mando.update(botones)))
+
+    def pulsar_hub(self, t_ms, botones, duracion_ms=100):
+        botones = _conjunto(botones)
+        self.en(t_ms, lambda: self.botones_hub.update(botones))
+        self.en(t_ms + duracion_ms, lambda: self.botones_hub.difference_update(botones))
+
+    def mantener_hub(self, t_ms, botones):
+        botones = _conjunto(botones)
+        self.en(t_ms, lambda: (self.botones_hub.clear(), self.botones_hub.update(botones)))
+
+    def escribir_stdin(self, t_ms, datos):
+        if isinstance(datos, str):
+            datos = datos.encode()
+        self.en(t_ms, lambda: self.stdin.alimentar(datos))
+
+    def enlace(self, bps, capacidad=256):
+        """Limita la salida a ``bps`` bytes/s con ``capacidad`` bytes en vuelo."""
+        self.stdout.buffer.bps = bps
+        self.stdout.buffer.capacidad = capacidad
+
+    def angulo_motor(self, t_ms, puerto, angulo):
+        """Fuerza el ángulo de un motor (p. ej. al mover el arma a mano)."""
+        def _fijar():
+            m = self.motores.get(puerto)
+            if m is not None:
+                m._fijar(angulo)
+        self.en(t_ms, _fijar)
+
+    # --- Hooks internos de los dispositivos ---
+
+    def ahora(self):
+        return self.reloj.ahora
+
+    def _coste(self, clave):
+        self.reloj.avanzar(self.costes.get(clave, self.coste_llamada))
+
+    def _leer(self, clave, valor):
+        self._coste(clave)
+        if self.lecturas is not None:
+            self.lecturas.append((self.reloj.ahora, clave, valor))
+        return valor
+
+    def _accion(self, disp, metodo, args, bloqueo_ms=0.0):
+        self.reloj.comprobar()
+        acc = Accion(self.reloj.ahora, disp, metodo, args)
+        self.acciones.append(acc)
+        for obs in self.observadores:
+            obs(acc)
+        self.reloj.avanzar(self.coste_llamada + bloqueo_ms)
+
+    def _wait(self, ms):
+        self.esperas.append((self.reloj.ahora, ms))
+        self.reloj.avanzar(ms)
+
+    def _wait_scan(self, ms):
+        # Escaneo BLE: bloquea el reloj hasta el timeout o hasta que aparezca el mando
+        fin = self.reloj.ahora + ms
+        while self.reloj.ahora < fin and not self.mando_conectado:
+            self.reloj.avanzar(min(10.0, fin - self.reloj.ahora))
+
+    # --- Ejecución ---
+
+    def modulos(self):
+        """Diccionario nombre -> módulo falso para el import del script."""
+        return _construir_modulos(self)
+
+    def ejecutar(self, ruta, duracion_ms=10000, fuente=None):
+        """Ejecuta un script de hub hasta agotar ``duracion_ms`` virtuales."""
+        if fuente is None:
+            with open(ruta, encoding="utf-8") as f:
+                fuente = f.read()
+        self.reloj.limite = self.reloj.ahora + duracion_ms
+        ns = crear_entorno(self)
+        ns["__file__"] = ruta
+        error = None
+        try:
+            exec(compile(fuente, ruta, "exec"), ns)
+        except SimulacionTerminada:
+            pass
+        except SystemExit:
+            pass
+        except Exception as e:  # noqa: BLE001 - se informa en el resultado
+            error = e
+        # Sin límite: las tareas que queden vivas se cierran (GeneratorExit del
+        # script, que aún puede mover motores) sin volver a cortar la simulación
+        self.reloj.limite = None
+        return Resultado(self, ns, error)
+
+
+def _conjunto(botones):
+    if isinstance(botones, (set, frozenset, list, tuple)):
+        return set(botones)
+    return {botones}
+
+
+def crear_entorno(sim):
+    """Globales de ejecución con import, print y stdio redirigidos al simulador."""
+    modulos = sim.modulos()
+    import_real = builtins.__import__
+
+    def _import(nombre, globs=None, locs=None, fromlist=(), level=0):
+        if nombre in modulos:
+            mod = modulos[nombre]
+            if not fromlist and "." in nombre:
+                return modulos[nombre.split(".")[0]]
+            return mod
+        return import_real(nombre, globs, locs, fromlist, level)
+
+    def _print(*args, sep=" ", end="\n", file=None):
+        (file or sim.stdout).write(sep.join(str(a) for a in args) + end)
+
+    b = dict(vars(builtins))
+    b["__import__"] = _import
+    b["print"] = _print
+    return {"__builtins__": b, "__name__": "__main__"}
+
+
+# ==============================================================================
+# --- STDIO ---
+# ==============================================================================
+
+
+class _Stdin:
+    def __init__(self):
+        self.datos = bytearray()
+        self.buffer = self
+
+    def alimentar(self, datos):
+        self.datos.extend(datos)
+
+    def pendiente(self):
+        return len(self.datos)
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = len(self.datos)
+        trozo = bytes(self.datos[:n])
+        del self.datos[:n]
+        return trozo.decode("latin-1")
+
+    def readinto(self, buf):
+        n = min(len(buf), len(self.datos))
+        buf[:n] = self.datos[:n]
+        del self.datos[:n]
+        return n
+
+
+PAQUETE_BLE = 20
+
+
+class _BufferSalida:
+    """Salida binaria con un enlace opcional de ``bps`` bytes/s.
+
+    Con el enlace limitado, ``capacidad`` bytes caben en el buffer del
+    transporte; escribir más bloquea el reloj hasta que se vacía lo necesario.
+    """
+
+    def __init__(self, sim):
+        self._sim = sim
+        self.datos = bytearray()
+        self.bps = None
+        self.capacidad = 256
+        self._cola = 0.0
+        self._t = 0.0
+        self.marcas = []  # (instante de llegada al host, fin en datos) por escritura
+
+    def _drenar(self):
+        ahora = self._sim.reloj.ahora
+        if self.bps:
+            self._cola = max(0.0, self._cola - (ahora - self._t) * self.bps / 1000.0)
+        self._t = ahora
+
+    def libre(self):
+        # POLLOUT: cabe al menos un paquete BLE completo (20 bytes)
+        self._drenar()
+        return not self.bps or self._cola <= self.capacidad - PAQUETE_BLE
+
+    def write(self, b):
+        self._drenar()
+        if self.bps:
+            exceso = self._cola + len(b) - self.capacidad
+            if exceso > 0:
+                self._sim.reloj.avanzar(exceso * 1000.0 / self.bps)
+                self._drenar()
+            self._cola += len(b)
+        self.datos.extend(b)
+        llegada = self._sim.reloj.ahora
+        if self.bps:
+            llegada += self._cola * 1000.0 / self.bps
+        self.marcas.append((llegada, len(self.datos)))
+        return len(b)
+
+    def flush(self):
+        pass
+
+
+class _Stdout(io.StringIO):
+    def __init__(self, sim):
+        super().__init__()
+        self.buffer = _BufferSalida(sim)
+
+    def write(self, texto):
+        # El texto comparte el enlace con las tramas binarias
+        self.buffer.write(texto.encode("utf-8"))
+        return super().write(texto)
+
+
+# ==============================================================================
+# --- DISPOSITIVOS ---
+# ==============================================================================
+
+
+class _Luz:
+    def __init__(self, sim, nombre):
+        self._sim, self._n = sim, nombre
+
+    def on(self, color):
+        self._sim._accion(self._n, "on", (color,))
+
+    def off(self):
+        self._sim._accion(self._n, "off", ())
+
+    def blink(self, color, duraciones):
+        self._sim._accion(self._n, "blink", (color, tuple(duraciones)))
+
+    def pulse(self, color, ms):
+        self._sim._accion(self._n, "pulse", (color, ms))
+
+    def animate(self, colores, intervalo):
+        self._sim._accion(self._n, "animate", (tuple(colores), intervalo))
+
+
+class _Pantalla:
+    def __init__(self, sim):
+        self._sim = sim
+        self.matriz = [[0] * 5 for _ in range(5)]
+
+    def pixel(self, fila, col, brillo=100):
+        self._sim._coste("display.pixel")
+        self.matriz[fila][col] = brillo
+        self._sim._accion("display", "pixel", (fila, col, brillo))
+
+    def icon(self, icono):
+        self.matriz = [list(f) for f in icono]
+        self._sim._accion("display", "icon", (tuple(tuple(f) for f in icono),))
+
+    def off(self):
+        self.matriz = [[0] * 5 for _ in range(5)]
+        self._sim._accion("display", "off", ())
+
+    def char(self, c):
+        self._sim._accion("display", "char", (c,))
+
+    def number(self, n):
+        self._sim._accion("display", "number", (n,))
+
+    def text(self, texto, on=500, off=50):
+        self._sim._accion("display", "text", (texto,), len(texto) * (on + off))
+
+    def animate(self, matrices, intervalo):
+        self._sim._accion("display", "animate", (len(matrices), intervalo))
+
+    def orientation(self, lado):
+        self._sim._accion("display", "orientation", (lado,))
+
+
+class _Altavoz:
+    def __init__(self, sim):
+        self._sim = sim
+        self._vol = 100
+
+    def volume(self, v=None):
+        if v is None:
+            return self._vol
+        self._vol = v
+        self._sim._accion("speaker", "volume", (v,))
+
+    def beep(self, frecuencia=500, duracion=100):
+        # Duración negativa: el tono sigue sonando y la llamada vuelve al instante
+        self._sim._accion("speaker", "beep", (frecuencia, duracion), max(0, duracion))
+
+    def play_notes(self, notas, tempo=120):
+        notas = tuple(notas)
+        self._sim._accion("speaker", "play_notes", (notas, tempo), len(notas) * 60000 / tempo / 4)
+
+
+class _BotonesHub:
+    def __init__(self, sim):
+        self._sim = sim
+
+    def pressed(self):
+        return self._sim._leer("hub.pressed", set(self._sim.botones_hub))
+
+
+class _IMU:
+    def __init__(self, sim):
+        self._sim = sim
+
+    def up(self, calibrated=True):
+        return self._sim._leer("imu.up", self._sim.lado_arriba)
+
+    def ready(self):
+        return True
+
+    def stationary(self):
+        return True
+
+    def tilt(self, calibrated=True):
+        return self._sim._leer("imu.tilt", (0, 0))
+
+    def heading(self):
+        return self._sim._leer("imu.heading", 0.0)
+
+    def reset_heading(self, angulo):
+        self._sim._accion("imu", "reset_heading", (angulo,))
+
+    def acceleration(self, axis=None, calibrated=True):
+        return self._sim._leer("imu.acceleration", 0.0 if axis is not None else (0.0, 0.0, 9810.0))
+
+    def angular_velocity(self, axis=None, calibrated=True):
+        return self._sim._leer("imu.angular_velocity", 0.0 if axis is not None else (0.0, 0.0, 0.0))
+
+
+class _Sistema:
+    def __init__(self, sim):
+        self._sim = sim
+
+    def set_stop_button(self, boton):
+        self._sim._accion("system", "set_stop_button", (boton,))
+
+    def storage(self, offset, write=None, read=None):
+        alm = self._sim.almacen
+        if write is not None:
+            if offset < 0 or offset + len(write) > len(alm):
+                raise ValueError("storage out of range")
+            alm[offset:offset + len(write)] = write
+            self._sim._accion("system", "storage", (offset, len(write)))
+            return None
+        if read is None or offset < 0 or offset + read > len(alm):
+            raise ValueError("storage out of range")
+        self._sim._coste("system.storage")
+        return bytes(alm[offset:offset + read])
+
+    def reset_storage(self):
+        self._sim.almacen[:] = bytes(len(self._sim.almacen))
+
+    def info(self):
+        return {"name": "sim"}
+
+    def shutdown(self):
+        raise SystemExit
+
+
+class _Bateria:
+    def __init__(self, sim):
+        self._sim = sim
+
+    def voltage(self):
+        return 8000
+
+    def current(self):
+        return 200
+
+
+class _BLE:
+    def __init__(self, sim, canal, observados):
+        self._sim, self._canal, self._obs = sim, canal, tuple(observados)
+
+    def broadcast(self, datos):
+        if self._canal is None:
+            raise RuntimeError("broadcast_channel not set")
+        if tamano_difusion(datos) > DIFUSION_MAX_B:
+            raise ValueError("broadcast data too large")
+        self._sim._accion("ble", "broadcast", (datos,), self._sim.costes["ble.broadcast"])
+        if self._sim.medio_ble is not None:
+            self._sim.medio_ble.emitir(self._sim, self._canal, datos)
+
+    def observe(self, canal):
+        if canal not in self._obs:
+            raise ValueError("channel not observed")
+        self._sim._coste("ble.observe")
+        if self._sim.medio_ble is None:
+            return None
+        return self._sim.medio_ble.recibir(self._sim, canal)
+
+    def signal_strength(self, canal):
+        return -128 if self.observe(canal) is None else -60
+
+
+# Formato de broadcast de Pybricks: marca de objeto suelto (si no es tupla) y,
+# por valor, 1 B de tipo y tamaño más los datos; caben 26 B tras las cabeceras
+# del anuncio (31 B de anuncio BLE clásico)
+DIFUSION_MAX_B = 26
+
+
+def _tamano_valor(v):
+    if v is None or isinstance(v, bool):
+        return 1
+    if isinstance(v, int):
+        if -128 <= v < 128:
+            return 2
+        if -32768 <= v < 32768:
+            return 3
+        if -2 ** 31 <= v < 2 ** 31:
+            return 5
+        raise OverflowError("broadcast int out of range")
+    if isinstance(v, float):
+        return 5
+    if isinstance(v, str):
+        return 1 + len(v.encode())
+    if isinstance(v, (bytes, bytearray)):
+        return 1 + len(v)
+    raise TypeError("broadcast: unsupported type %s" % type(v).__name__)
+
+
+def tamano_difusion(datos):
+    """Bytes que ocupa ``datos`` en el anuncio de ``hub.ble.broadcast``."""
+    if isinstance(datos, (tuple, list)):
+        return sum(_tamano_valor(v) for v in datos)
+    return 1 + _tamano_valor(datos)
+
+
+class MedioBLE:
+    """Aire compartido por varios simuladores para ``ble.broadcast``/``observe``.
+
+    Cada publicación rehace el anuncio del canal, que se repite cada
+    ``intervalo_ms`` (más 0-10 ms de retardo aleatorio, como en BLE); quien
+    escucha capta cada repetición con probabilidad ``p_recepcion`` y
+    ``observe`` devuelve lo último captado, o None si hace más de
+    ``caducidad_ms`` que no capta nada. Cada simulador lleva su propio reloj,
+    así que se ejecutan primero los que publican (el medio guarda cada
+    publicación con su instante) y después los que escuchan: el tráfico va en
+    un solo sentido.
+    """
+
+    def __init__(self, intervalo_ms=100.0, p_recepcion=0.9, caducidad_ms=1000.0, semilla=1):
+        self.intervalo_ms = intervalo_ms
+        self.p_recepcion = p_recepcion
+        self.caducidad_ms = caducidad_ms
+        self.semilla = semilla
+        self.emisiones = {}    # canal -> [(t, datos, bytes)]
+        self.latencias = []    # (canal, ms desde la publicación hasta el primer observe que la ve)
+        self._vistas = set()
+
+    def emitir(self, sim, canal, datos):
+        self.emisiones.setdefault(canal, []).append((sim.ahora(), datos, tamano_difusion(datos)))
+
+    def _captada(self, canal, j, n):
+        # Determinista por (canal, publicación, repetición): igual en cada ejecución
+        rng = random.Random((self.semilla * 1000003 + canal) * 1000003 + j * 65537 + n)
+        return rng.random() * 10.0, rng.random() < self.p_recepcion
+
+    def recibir(self, sim, canal):
+        t = sim.ahora()
+        lista = self.emisiones.get(canal, ())
+        j = len(lista) - 1
+        while j >= 0 and lista[j][0] > t:
+            j -= 1
+        while j >= 0:
+            t_j = lista[j][0]
+            fin = lista[j + 1][0] if j + 1 < len(lista) and lista[j + 1][0] <= t else t
+            if fin < t - self.caducidad_ms:
+                break
+            for n in range(int((fin - t_j) / self.intervalo_ms), -1, -1):
+                retardo, ok = self._captada(canal, j, n)
+                t_n = t_j + n * self.intervalo_ms + retardo
+                if t_n > fin or not ok:
+                    continue
+                if t - t_n > self.caducidad_ms:
+                    return None
+                clave = (id(sim), canal, j)
+                if clave not in self._vistas:
+                    self._vistas.add(clave)
+                    self.latencias.append((canal, t - t_j))
+                return lista[j][1]
+            j -= 1
+        return None
+
+    def resumen(self, canal=None):
+        """Publicaciones, bytes por anuncio y latencias de lo captado."""
+        emisiones = [e for c, l in self.emisiones.items() if canal in (None, c) for e in l]
+        lat = sorted(ms for c, ms in self.latencias if canal in (None, c))
+        duracion = (emisiones[-1][0] - emisiones[0][0]) / 1000.0 if len(emisiones) > 1 else 0.0
+
+        def p(q):
+            return lat[min(len(lat) - 1, int(q * len(lat)))] if lat else 0.0
+
+        return {
+            "publicaciones": len(emisiones),
+            "por_s": (len(emisiones) - 1) / duracion if duracion else 0.0,
+            "bytes_max": max((e[2] for e in emisiones), default=0),
+            "vistas": len(lat),
+            "lat_p50": p(0.5), "lat_p95": p(0.95), "lat_max": lat[-1] if lat else 0.0,
+        }
+
+    def version(self):
+        return "sim"
+
+
+class PrimeHub:
+    def __init__(self, top_side=Axis.Z, front_side=Axis.X, broadcast_channel=None, observe_channels=()):
+        sim = _SIM_ACTIVO
+        self.light = _Luz(sim, "light")
+        self.display = _Pantalla(sim)
+        self.speaker = _Altavoz(sim)
+        self.buttons = _BotonesHub(sim)
+        self.imu = _IMU(sim)
+        self.system = _Sistema(sim)
+        self.battery = _Bateria(sim)
+        self.ble = _BLE(sim, broadcast_channel, observe_channels)
+        sim.hub = self
+
+
+class InventorHub(PrimeHub):
+    pass
+
+
+# Motor: modelo cinemático simple. Los movimientos con wait=False interpolan
+# el ángulo en el tiempo; con wait=True bloquean el reloj durante el recorrido.
+
+class Motor:
+    def __init__(self, port, positive_direction=Direction.CLOCKWISE, gears=None, reset_angle=True):
+        self._sim = _SIM_ACTIVO
+        self._puerto = port
+        self._nombre = "motor" + str(port).split(".")[-1]
+        self._mov = (0.0, 0.0, 0.0, 0.0)  # t0, a0, a1, duración
+        self._vel = 0
+        self._sim.motores[port] = self
+
+    def _fijar(self, angulo):
+        t = self._sim.ahora()
+        self._mov = (t, angulo, angulo, 0.0)
+
+    def angle(self):
+        t0, a0, a1, dur = self._mov
+        t = self._sim.ahora()
+        self._sim._coste("motor.angle")
+        if self._vel and dur == 0.0:
+            return int(a0 + self._vel * (t - t0) / 1000.0)
+        if dur <= 0 or t >= t0 + dur:
+            return int(a1)
+        return int(a0 + (a1 - a0) * (t - t0) / dur)
+
+    def speed(self):
+        return self._vel
+
+    def done(self):
+        t0, _, _, dur = self._mov
+        return self._sim.ahora() >= t0 + dur
+
+    def reset_angle(self, angle=0):
+        self._fijar(angle)
+
+    def _congelar(self):
+        self._fijar(self.angle())
+        self._vel = 0
+
+    def stop(self, then=None):
+        self._congelar()
+        self._sim._accion(self._nombre, "stop", () if then is None else (then,))
+
+    def brake(self):
+        self._congelar()
+        self._sim._accion(self._nombre, "brake", ())
+
+    def hold(self):
+        self._congelar()
+        self._sim._accion(self._nombre, "hold", ())
+
+    def run(self, speed):
+        self._congelar()
+        self._vel = speed
+        self._mov = (self._sim.ahora(), self._mov[1], self._mov[1], 0.0)
+        self._sim._accion(self._nombre, "run", (speed,))
+
+    def dc(self, duty):
+        self._sim._accion(self._nombre, "dc", (duty,))
+
+    def track_target(self, target):
+        self._fijar(target)
+        self._sim._accion(self._nombre, "track_target", (target,))
+
+    def run_target(self, speed, target_angle, then=Stop.HOLD, wait=True):
+        origen = self.angle()
+        self._vel = 0
+        dur = abs(target_angle - origen) * 1000.0 / max(1, abs(speed))
+        self._mov = (self._sim.ahora(), origen, target_angle, dur)
+        self._sim._accion(self._nombre, "run_target", (speed, target_angle), dur if wait else 0.0)
+
+    def run_angle(self, speed, rotation_angle, then=Stop.HOLD, wait=True):
+        self.run_target(speed, self.angle() + rotation_angle, then, wait)
+
+    def run_time(self, speed, time, then=Stop.HOLD, wait=True):
+        origen = self.angle()
+        self._mov = (self._sim.ahora(), origen, origen + speed * time / 1000.0, float(time))
+        self._sim._accion(self._nombre, "run_time", (speed, time), time if wait else 0.0)
+
+
+class UltrasonicSensor:
+    def __init__(self, port):
+        self._sim = _SIM_ACTIVO
+        self.lights = types.SimpleNamespace(on=lambda *a: None, off=lambda: None)
+
+    def distance(self):
+        return self._sim._leer("ultrasonic.distance", int(self._sim.dist_mm))
+
+    def presence(self):
+        return False
+
+
+class ColorSensor:
+    def __init__(self, port):
+        self._sim = _SIM_ACTIVO
+        self.lights = types.SimpleNamespace(on=lambda *a: None, off=lambda: None)
+
+    def reflection(self):
+        return self._sim._leer("color.reflection", int(self._sim.reflejo))
+
+    def color(self, surface=True):
+        return self._sim._leer("color.color", self._sim.color)
+
+    def ambient(self):
+        return self._sim._leer("color.ambient", 10)
+
+
+class ForceSensor:
+    def __init__(self, port):
+        self._sim = _SIM_ACTIVO
+
+    def force(self):
+        return self._sim._leer("force.force", 0.0)
+
+    def pressed(self, force=3):
+        return self._sim._leer("force.pressed", False)
+
+    def touched(self):
+        return self._sim._leer("force.touched", False)
+
+
+class _BotonesMando:
+    def __init__(self, mando):
+        self._m = mando
+
+    def pressed(self):
+        sim = self._m._sim
+        if not sim.mando_conectado:
+            sim._coste("remote.pressed")
+            raise OSError("remote disconnected")
+        return sim._leer("remote.pressed", set(sim.botones_mando))
+
+
+class Remote:
+    """Mando LEGO. Sin mando conectado consume ``timeout`` ms y lanza OSError."""
+
+    def __init__(self, name=None, timeout=10000):
+        sim = _SIM_ACTIVO
+        self._sim = sim
+        sim._coste("remote.connect")
+        if not sim.mando_conectado:
+            sim._wait_scan(10000 if timeout is None else timeout)
+            if not sim.mando_conectado:
+                raise OSError("timed out")
+        sim._accion("remote", "connect", (timeout,))
+        self.buttons = _BotonesMando(self)
+        self.light = _Luz(sim, "remote.light")
+        sim.mando = self
+
+    def name(self, nombre=None):
+        return "Handset"
+
+    def disconnect(self):
+        self._sim.mando_conectado = False
+
+
+class DriveBase:
+    """Base motriz con perfil trapezoidal para straight/turn bloqueantes."""
+
+    def __init__(self, left_motor, right_motor, wheel_diameter, axle_track):
+        self._sim = _SIM_ACTIVO
+        self.diametro, self.eje = wheel_diameter, axle_track
+        self._cfg = [wheel_diameter * 4, wheel_diameter * 4, axle_track * 4, axle_track * 4]
+        self._vel, self._giro = 0, 0
+        self._fin = 0.0  # instante en que termina la maniobra en curso
+        self._sim.base = self
+
+    def settings(self, straight_speed=None, straight_acceleration=None, turn_rate=None, turn_acceleration=None):
+        nuevos = (straight_speed, straight_acceleration, turn_rate, turn_acceleration)
+        if all(v is None for v in nuevos):
+            return tuple(self._cfg)
+        for i, v in enumerate(nuevos):
+            if v is not None:
+                self._cfg[i] = v
+        self._sim._accion("db", "settings", tuple(self._cfg))
+
+    @staticmethod
+    def _duracion(d, v, a):
+        d, v, a = abs(d), max(1, abs(v)), max(1, abs(a))
+        if d >= v * v / a:
+            return (d / v + v / a) * 1000.0
+        return 2.0 * math.sqrt(d / a) * 1000.0
+
+    def drive(self, speed, turn_rate):
+        self._vel, self._giro = speed, turn_rate
+        self._fin = self._sim.ahora()
+        self._sim._accion("db", "drive", (speed, turn_rate))
+
+    def stop(self):
+        self._vel, self._giro = 0, 0
+        self._fin = self._sim.ahora()
+        self._sim._accion("db", "stop", ())
+
+    def brake(self):
+        self.stop()
+
+    def straight(self, distance, then=Stop.HOLD, wait=True):
+        dur = self._duracion(distance, self._cfg[0], self._cfg[1])
+        self._vel, self._giro = 0, 0
+        self._fin = self._sim.ahora() + dur
+        self._sim._accion("db", "straight", (distance,), dur if wait else 0.0)
+
+    def turn(self, angle, then=Stop.HOLD, wait=True):
+        dur = self._duracion(angle, self._cfg[2], self._cfg[3])
+        self._vel, self._giro = 0, 0
+        self._fin = self._sim.ahora() + dur
+        self._sim._accion("db", "turn", (angle,), dur if wait else 0.0)
+
+    def distance(self):
+        return 0
+
+    def angle(self):
+        return 0
+
+    def state(self):
+        return (0, self._vel, 0, self._giro)
+
+    def done(self):
+        self._sim._coste("db.done")
+        return self._sim.ahora() >= self._fin
+
+    def reset(self):
+        self._sim._accion("db", "reset", ())
+
+    def use_gyro(self, use_gyro):
+        self._sim._accion("db", "use_gyro", (use_gyro,))
+
+
+# ==============================================================================
+# --- TOOLS ---
+# ==============================================================================
+
+
+class StopWatch:
+    def __init__(self):
+        self._sim = _SIM_ACTIVO
+        self._t0 = self._sim.ahora()
+        self._pausa = None
+
+    def time(self):
+        fin = self._pausa if self._pausa is not None else self._sim.ahora()
+        return int(fin - self._t0)
+
+    def reset(self):
+        self._t0 = self._sim.ahora()
+        if self._pausa is not None:
+            self._pausa = self._t0
+
+    def pause(self):
+        if self._pausa is None:
+            self._pausa = self._sim.ahora()
+
+    def resume(self):
+        if self._pausa is not None:
+            self._t0 += self._sim.ahora() - self._pausa
+            self._pausa = None
+
+
+def wait(ms):
+    _SIM_ACTIVO._wait(ms)
+
+
+# ==============================================================================
+# --- CONSTRUCCIÓN DE MÓDULOS ---
+# ==============================================================================
+
+_SIM_ACTIVO = None
+
+
+def _modulo(nombre, **attrs):
+    m = types.ModuleType(nombre)
+    m.__dict__.update(attrs)
+    return m
+
+
+class _Poll:
+    def __init__(self, sim):
+        self._sim, self._fds = sim, []
+
+    def register(self, obj, mask=1):
+        self._fds.append((obj, mask))
+
+    def unregister(self, obj):
+        self._fds = [f for f in self._fds if f[0] is not obj]
+
+    def poll(self, timeout=-1):
+        sim = self._sim
+        sim._coste("stdin.poll")
+        listos = []
+        for obj, mask in self._fds:
+            if mask & 1 and obj is sim.stdin and sim.stdin.pendiente():
+                listos.append((obj, 1))
+            elif mask & 4 and obj in (sim.stdout, sim.stdout.buffer) and sim.stdout.buffer.libre():
+                listos.append((obj, 4))
+        return listos
+
+    def ipoll(self, timeout=-1, flags=0):
+        return iter(self.poll(timeout))
+
+
+def _construir_modulos(sim):
+    global _SIM_ACTIVO
+    _SIM_ACTIVO = sim
+    g = globals()
+    params = _modulo("pybricks.parameters", **{n: g[n] for n in
+                     ("Button", "Color", "Direction", "Port", "Side", "Stop", "Axis", "Icon")})
+    hubs = _modulo("pybricks.hubs", PrimeHub=PrimeHub, InventorHub=InventorHub)
+    pup = _modulo("pybricks.pupdevices", Motor=Motor, UltrasonicSensor=UltrasonicSensor,
+                  ColorSensor=ColorSensor, ForceSensor=ForceSensor, Remote=Remote)
+    robotics = _modulo("pybricks.robotics", DriveBase=DriveBase)
+    tools = _modulo("pybricks.tools", wait=wait, StopWatch=StopWatch)
+    raiz = _modulo("pybricks", hubs=hubs, pupdevices=pup, parameters=params,
+                   robotics=robotics, tools=tools)
+    select = _modulo("select", poll=lambda: _Poll(sim), POLLIN=1, POLLOUT=4)
+    usys = _modulo("sys", stdin=sim.stdin, stdout=sim.stdout, stderr=sim.stdout,
+                   exit=sys.exit, implementation=types.SimpleNamespace(name="micropython"),
+                   print_exception=lambda e, f=None: (f or sim.stdout).write(repr(e) + "\n"))
+    mods = {
+        "pybricks": raiz,
+        "pybricks.hubs": hubs,
+        "pybricks.pupdevices": pup,
+        "pybricks.parameters": params,
+        "pybricks.robotics": robotics,
+        "pybricks.tools": tools,
+        "select": select,
+        "uselect": select,
+        "sys": usys,
+        "usys": usys,
+    }
+    return mods
+
+
+# ==============================================================================
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Ejecuta un script de hub en el simulador Pybricks.")
+    ap.add_argument("script")
+    ap.add_argument("--ms", type=int, default=10000, help="duración simulada (ms)")
+    ap.add_argument("--acciones", action="store_true", help="lista las llamadas a actuadores")
+    args = ap.parse_args(argv)
+
+    import time
+    sim = Simulador()
+    t0 = time.perf_counter()
+    res = sim.ejecutar(args.script, args.ms)
+    dt = time.perf_counter() - t0
+    if args.acciones:
+        for a in res.acciones:
+            print(a)
+    if res.salida:
+        print(res.salida, end="")
+    print("simulado: %.0f ms en %.3f s reales (x%.0f), %d acciones, %d esperas"
+          % (res.t_final, dt, res.t_final / 1000.0 / max(dt, 1e-9), len(res.acciones), len(res.esperas)))
+    if res.error is not None:
+        print("error:", repr(res.error))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,423 @@
+"""Deterministic replay of hub match recordings, diffing actuator commands.
+
+Extracts the trace dumped by the GRABADOR DE COMBATE section of
+SUMO_MASTER_V25.py (``A5 5C`` frames in a raw capture of the hub's stdout, key
+``g`` or ``consola_pc.py --traza``), feeds every recorded sensor read, remote
+and hub button, remote connection, PC console byte and observed broadcast
+channel back to a script on the simulated pybricks layer at its recorded
+instant (hammer and chassis moves last what they lasted on the hub), and
+diffs the drive, stop, straight, turn and hammer commands it issues against the ones recorded on the
+hub. Each replay runs hundreds of times faster than real time and many
+captures run in a process pool, so a whole tournament day can be re-checked
+after every logic change. Exit status 1 if any capture diverges.
+
+    python tools/repeticion.py captura.bin
+    python tools/repeticion.py torneo/*.bin --script nuevo.py --procesos 4 -v
+    python tools/repeticion.py captura.bin --eventos     # traza decodificada
+"""
+
+import difflib
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bench_bucle import SCRIPT_POR_DEFECTO
+from pybricks_sim import Button, Port, Side, Simulador
+
+# Debe coincidir con la sección GRABADOR DE COMBATE del script del hub
+SYNC = b"\xa5\x5c"
+GR_DATOS = 32
+TAM_TRAMA = GR_DATOS + 6
+GR_CAB = 5
+GR_VERSION = 1
+OPS = ("tick", "tick_l", "ojos", "ojos_d", "suelo", "lado", "mando", "botones",
+       "conexion", "pc", "conducir", "parar", "recto", "giro", "arma", "inicio",
+       "arma_lista", "chasis_listo", "vecino")
+LARGO = (1, 2, 2, 1, 1, 1, 1, 1, 1, 1, 4, 0, 2, 2, 4, 0, 0, 0, 2)
+FORMATO = {"tick": "<B", "tick_l": "<H", "ojos": "<H", "ojos_d": "<b", "suelo": "<B",
+           "lado": "<B", "mando": "<B", "botones": "<B", "conexion": "<B", "pc": "<B",
+           "conducir": "<hh", "recto": "<h", "giro": "<h", "arma": "<hh", "vecino": "<H"}
+BOTONES = ("LEFT", "RIGHT", "CENTER", "BLUETOOTH", "LEFT_PLUS", "LEFT_MINUS", "RIGHT_PLUS", "RIGHT_MINUS")
+LADOS = ("TOP", "BOTTOM", "FRONT", "BACK", "LEFT", "RIGHT")
+DIF_NADA = 0xFFFF    # vecino sin dato
+MARGEN_MS = 100      # se simula un poco más allá del último evento
+PERIODO_MS = 20      # PERIODO_CONTROL del hub
+
+
+# ==============================================================================
+# --- TRAZA ---
+# ==============================================================================
+
+
+def extraer(datos):
+    """Traza del último volcado de una captura cruda de stdout del hub.
+
+    Devuelve ``(traza, estadísticas)``. Una captura que ya empieza por la
+    cabecera "GR" se toma tal cual. Las tramas corruptas se saltan; las que
+    faltan (saltos de seq) dejan la traza incompleta.
+    """
+    if datos[:2] == b"GR":
+        return bytes(datos), {"tramas": 0, "corruptas": 0, "perdidas": 0, "completa": True}
+    partes, corruptas, completa = {}, 0, False
+    i = 0
+    while True:
+        i = datos.find(SYNC, i)
+        if i < 0 or i + TAM_TRAMA > len(datos):
+            break
+        cuerpo = datos[i + 2:i + TAM_TRAMA - 1]
+        if sum(cuerpo) & 0xFF != datos[i + TAM_TRAMA - 1] or cuerpo[2] > GR_DATOS:
+            corruptas += 1
+            i += 1
+            continue
+        seq, n = cuerpo[0] | cuerpo[1] << 8, cuerpo[2]
+        if seq == 0:
+            partes, completa = {}, False  # volcado nuevo: manda el último
+        if n == 0:
+            completa = True
+        else:
+            partes[seq] = bytes(cuerpo[3:3 + n])
+        i += TAM_TRAMA
+    fin = max(partes) + 1 if partes else 0
+    perdidas = sum(1 for s in range(fin) if s not in partes)
+    traza = b"".join(partes.get(s, b"") for s in range(fin))
+    return traza, {"tramas": len(partes), "corruptas": corruptas, "perdidas": perdidas,
+                   "completa": completa and not perdidas}
+
+
+def decodificar(traza):
+    """(imagen del almacén, eventos) con cada evento como (t ms, nombre, valor)."""
+    if len(traza) < GR_CAB or traza[:2] != b"GR":
+        raise ValueError("no es una traza del grabador")
+    _, version, n_alm = struct.unpack_from("<2sBH", traza, 0)
+    if version != GR_VERSION:
+        raise ValueError("versión de traza %d no soportada" % version)
+    almacen = traza[GR_CAB:GR_CAB + n_alm]
+    eventos = []
+    t, ojos = 0, -1000
+    i = GR_CAB + n_alm
+    while i < len(traza):
+        op = traza[i]
+        if op >= len(OPS) or i + 1 + LARGO[op] > len(traza):
+            raise ValueError("traza corrupta en el byte %d" % i)
+        nombre = OPS[op]
+        valor = struct.unpack_from(FORMATO[nombre], traza, i + 1) if nombre in FORMATO else ()
+        i += 1 + LARGO[op]
+        if nombre in ("tick", "tick_l"):
+            t += valor[0]
+            continue
+        if nombre == "ojos_d":
+            nombre, valor = "ojos", (ojos + valor[0],)
+        if nombre == "ojos":
+            ojos = valor[0]
+        eventos.append((t, nombre, valor[0] if len(valor) == 1 else valor or None))
+    return almacen, eventos
+
+
+def _botones(mascara):
+    return {getattr(Button, n) for k, n in enumerate(BOTONES) if mascara >> k & 1}
+
+
+class MedioGrabado:
+    """Medio BLE que devuelve lo que el hub leyó del canal escuchado, en su instante."""
+
+    def __init__(self):
+        self.dato = None
+
+    def emitir(self, sim, canal, datos):
+        pass
+
+    def recibir(self, sim, canal):
+        return self.dato
+
+    def fijar(self, valor):
+        # Como en el aire: int16 con signo (el hub hace & 0xFFFF)
+        self.dato = None if valor == DIF_NADA else valor - 65536 if valor >= 32768 else valor
+
+
+def programar(sim, eventos, desfase=0.0):
+    """Programa en ``sim`` las entradas grabadas, desplazadas ``desfase`` ms."""
+    sim.mando_conectado = False  # la conexión también es una entrada grabada
+    pc, t_pc = bytearray(), None
+    for t, nombre, valor in eventos:
+        ts = t + desfase
+        if nombre == "pc":
+            # Los bytes de un mismo tick llegan juntos
+            if t_pc is not None and t != t_pc:
+                sim.escribir_stdin(t_pc + desfase, bytes(pc))
+                pc = bytearray()
+            pc.append(valor)
+            t_pc = t
+        elif nombre == "ojos":
+            sim.distancia(ts, valor)
+        elif nombre == "suelo":
+            sim.reflexion(ts, valor)
+        elif nombre == "lado":
+            sim.orientacion(ts, getattr(Side, LADOS[valor]))
+        elif nombre == "mando":
+            sim.mantener_mando(ts, _botones(valor))
+        elif nombre == "botones":
+            sim.mantener_hub(ts, _botones(valor))
+        elif nombre == "conexion":
+            sim.conexion_mando(ts, bool(valor))
+        elif nombre == "vecino":
+            if sim.medio_ble is None:
+                sim.medio_ble = MedioGrabado()
+            sim.en(ts, lambda v=valor: sim.medio_ble.fijar(v))
+    if pc:
+        sim.escribir_stdin(t_pc + desfase, bytes(pc))
+
+
+def duraciones(eventos):
+    """Duración grabada de cada movimiento del martillo y de cada recto/giro.
+
+    Es el tick en que la tarea vio ``done()``: el simulador no sabe cuánto
+    tarda el motor real. None si el movimiento se interrumpió antes.
+    """
+    salida = {"arma": [], "chasis": []}
+    pendiente = {"arma": None, "chasis": None}
+    for t, nombre, _ in eventos:
+        clase = "arma" if nombre in ("arma", "arma_lista") else "chasis"
+        if nombre in ("arma", "recto", "giro"):
+            salida[clase].append(None)
+            pendiente[clase] = (len(salida[clase]) - 1, t)
+        elif nombre in ("conducir", "parar"):
+            pendiente["chasis"] = None
+        elif nombre in ("arma_lista", "chasis_listo") and pendiente[clase] is not None:
+            k, t0 = pendiente[clase]
+            salida[clase][k] = t - t0
+            pendiente[clase] = None
+    return salida
+
+
+def _fijar_duraciones(sim, dur):
+    # Observador: impone a cada movimiento la duración que tuvo en el hub. La
+    # orden y la consulta de done() caen en puntos distintos del tick, así que
+    # el movimiento acaba medio tick antes del tick grabado
+    cuenta = {"arma": 0, "chasis": 0}
+
+    def observar(acc):
+        if acc.disp == "motorD" and acc.metodo == "run_target":
+            clase = "arma"
+        elif acc.disp == "db" and acc.metodo in ("straight", "turn"):
+            clase = "chasis"
+        else:
+            return
+        k = cuenta[clase]
+        cuenta[clase] += 1
+        if k >= len(dur[clase]) or dur[clase][k] is None:
+            return
+        d = max(0.0, dur[clase][k] - PERIODO_MS / 2.0)
+        if clase == "arma":
+            m = sim.motores[Port.D]
+            t0, a0, a1, _ = m._mov
+            m._mov = (t0, a0, a1, d)
+        else:
+            sim.base._fin = acc.t + d
+
+    sim.observadores.append(observar)
+
+
+def ordenes_grabadas(eventos):
+    """(t, orden) de los eventos de actuadores, en el formato de ordenes_simuladas."""
+    salida = []
+    for t, nombre, valor in eventos:
+        if nombre == "parar":
+            salida.append((t, ("parar",)))
+        elif nombre in ("conducir", "arma"):
+            salida.append((t, (nombre,) + valor))
+        elif nombre in ("recto", "giro"):
+            salida.append((t, (nombre, valor)))
+    return salida
+
+
+def ordenes_simuladas(acciones, desfase=0.0, t_max=None):
+    """Órdenes de las acciones del simulador, con la misma poda que el grabador.
+
+    conducir y parar sólo cuentan si cambian la última orden del chasis; recto,
+    giro y el martillo cuentan siempre.
+    """
+    salida, chasis = [], None
+    for a in acciones:
+        if a.disp == "db":
+            if a.metodo == "drive":
+                o = ("conducir",) + tuple(a.args)
+            elif a.metodo == "stop":
+                o = ("parar",)
+            elif a.metodo == "straight":
+                o = ("recto", a.args[0])
+            elif a.metodo == "turn":
+                o = ("giro", a.args[0])
+            else:
+                continue
+            if o == chasis and o[0] in ("conducir", "parar"):
+                continue
+            chasis = o
+        elif a.disp == "motorD" and a.metodo == "run_target":
+            o = ("arma",) + tuple(a.args)
+        else:
+            continue
+        t = a.t - desfase
+        if t_max is not None and t > t_max:
+            break
+        salida.append((t, o))
+    return salida
+
+
+# ==============================================================================
+# --- REPETICIÓN ---
+# ==============================================================================
+
+
+def _simular(fuente, ruta, almacen, eventos, desfase, duracion_ms):
+    sim = Simulador()
+    sim.almacen[:len(almacen)] = almacen
+    programar(sim, eventos, desfase)
+    _fijar_duraciones(sim, duraciones(eventos))
+    res = sim.ejecutar(ruta, duracion_ms, fuente=fuente)
+    if res.error is not None:
+        raise RuntimeError("el script falló: %r" % (res.error,))
+    return res
+
+
+def _inicio(res):
+    # Arranque del bucle según el propio grabador del script repetido
+    gr = res.globales.get("gr_buf")
+    if not gr or gr[:2] != b"GR":
+        return None
+    _, eventos = decodificar(bytes(gr[:res.globales["gr_n"]]))
+    return next((t for t, n, _ in eventos if n == "inicio"), None)
+
+
+def repetir(traza, script=SCRIPT_POR_DEFECTO):
+    """Repite una traza en ``script``; devuelve (grabadas, repetidas, info)."""
+    almacen, eventos = decodificar(traza)
+    with open(script, encoding="utf-8") as f:
+        fuente = f.read()
+    t_fin = eventos[-1][0] if eventos else 0
+    inicio = next((t for t, n, _ in eventos if n == "inicio"), None)
+
+    # El hub y el simulador no tardan lo mismo en arrancar: se alinea el primer
+    # tick del bucle para que cada lectura caiga en el mismo tick que en el hub
+    desfase = 0.0
+    if inicio is not None:
+        previa = _simular(fuente, script, almacen, eventos, 0.0, inicio + MARGEN_MS)
+        inicio_sim = _inicio(previa)
+        if inicio_sim is not None:
+            desfase = inicio_sim - inicio
+
+    t0 = time.perf_counter()
+    res = _simular(fuente, script, almacen, eventos, desfase, t_fin + desfase + MARGEN_MS)
+    dt = time.perf_counter() - t0
+    info = {"duracion_ms": t_fin, "real_s": dt, "desfase_ms": desfase, "eventos": len(eventos)}
+    return ordenes_grabadas(eventos), ordenes_simuladas(res.acciones, desfase, t_fin), info
+
+
+def comparar(grabadas, repetidas, tolerancia=20.0):
+    """Alinea las dos secuencias de órdenes y clasifica las diferencias.
+
+    ``diferencias`` lista (marca, t, orden, dt): '-' sólo en el hub, '+' sólo
+    en la repetición, '~' la misma orden desplazada más de ``tolerancia`` ms.
+    """
+    a = [o for _, o in grabadas]
+    b = [o for _, o in repetidas]
+    diferencias, iguales, desplazadas, dt_max = [], 0, 0, 0.0
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                dt = repetidas[j][0] - grabadas[i][0]
+                dt_max = max(dt_max, abs(dt))
+                if abs(dt) > tolerancia:
+                    desplazadas += 1
+                    diferencias.append(("~", grabadas[i][0], a[i], dt))
+                else:
+                    iguales += 1
+            continue
+        diferencias.extend(("-", grabadas[i][0], a[i], None) for i in range(i1, i2))
+        diferencias.extend(("+", repetidas[j][0], b[j], None) for j in range(j1, j2))
+    diferencias.sort(key=lambda d: d[1])
+    return {"grabadas": len(a), "repetidas": len(b), "iguales": iguales, "desplazadas": desplazadas,
+            "distintas": sum(1 for d in diferencias if d[0] != "~"), "dt_max": dt_max,
+            "diferencias": diferencias}
+
+
+def _trabajo(tarea):
+    # Una captura por proceso: (ruta, resumen o mensaje de error)
+    ruta, script, tolerancia = tarea
+    try:
+        with open(ruta, "rb") as f:
+            traza, est = extraer(f.read())
+        grabadas, repetidas, info = repetir(traza, script)
+    except (OSError, ValueError, RuntimeError) as e:
+        return ruta, str(e)
+    m = comparar(grabadas, repetidas, tolerancia)
+    m.update(info)
+    m["completa"] = est["completa"]
+    return ruta, m
+
+
+def _orden(o):
+    return "%s(%s)" % (o[0], ", ".join(str(x) for x in o[1:]))
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("capturas", nargs="+", help="capturas de stdout del hub con el volcado de la traza")
+    ap.add_argument("--script", default=SCRIPT_POR_DEFECTO, help="lógica a repetir")
+    ap.add_argument("--tolerancia", type=float, default=20.0,
+                    help="ms de desplazamiento admitidos en una misma orden (un tick)")
+    ap.add_argument("--procesos", type=int, help="procesos del pool (por defecto, uno por CPU)")
+    ap.add_argument("-v", "--diferencias", action="store_true", help="lista las órdenes que difieren")
+    ap.add_argument("--eventos", action="store_true", help="sólo decodifica y lista las trazas")
+    args = ap.parse_args(argv)
+
+    if args.eventos:
+        for ruta in args.capturas:
+            with open(ruta, "rb") as f:
+                traza, est = extraer(f.read())
+            try:
+                almacen, eventos = decodificar(traza)
+            except ValueError as e:
+                print("%s: %s" % (ruta, e), file=sys.stderr)
+                return 2
+            print("# %s: %d bytes, almacén %d B, %d eventos%s" % (
+                ruta, len(traza), len(almacen), len(eventos), "" if est["completa"] else " (incompleta)"))
+            for t, nombre, valor in eventos:
+                print("%8d %-9s %s" % (t, nombre, "" if valor is None else valor))
+        return 0
+
+    tareas = [(ruta, args.script, args.tolerancia) for ruta in args.capturas]
+    procesos = args.procesos or os.cpu_count()
+    if procesos == 1 or len(tareas) == 1:
+        resultados = list(map(_trabajo, tareas))
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            resultados = list(pool.map(_trabajo, tareas))
+
+    print("%-28s %7s %7s %7s %8s %8s %9s %6s" % (
+        "captura", "ordenes", "iguales", "desplaz", "distintas", "dt_max", "combate_s", "x_real"))
+    fallos = 0
+    for ruta, m in resultados:
+        nombre = os.path.basename(ruta)[-28:]
+        if isinstance(m, str):
+            print("%-28s error: %s" % (nombre, m))
+            fallos += 1
+            continue
+        print("%-28s %7d %7d %7d %8d %8.1f %9.1f %6.0f%s" % (
+            nombre, m["grabadas"], m["iguales"], m["desplazadas"], m["distintas"], m["dt_max"],
+            m["duracion_ms"] / 1000.0, m["duracion_ms"] / 1000.0 / max(m["real_s"], 1e-9),
+            "" if m["completa"] else "  (traza incompleta)"))
+        if m["desplazadas"] or m["distintas"]:
+            fallos += 1
+            if args.diferencias:
+                for marca, t, o, dt in m["diferencias"]:
+                    extra = "" if dt is None else "  (%+.0f ms)" % dt
+                    print("    %s %8.0f %s%s" % (marca, t, _orden(o), extra))
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,595 @@
+"""Pipelined script uploader for the hub's paste-mode REPL protocol.
+
+Same sequence as sumo69's usePybricksBle.uploadScript (Ctrl-C, Ctrl-E, the
+program in chunks, Ctrl-D), but the chunk size follows the negotiated ATT MTU,
+up to a bounded window of writes stays in flight instead of sleeping after each
+one, the REPL prompts are awaited instead of fixed delays, and only the chunks
+the link reports as failed are sent again. Transports are pluggable: a virtual
+BLE link with an in-process hub stand-in (virtual clock, deterministic) and any
+tty, including a PTY served by the same stand-in.
+
+    python tools/subida.py --bench                       # app vs. ventana/MTU, enlace virtual
+    python tools/subida.py --bench --perdida 0.02        # con escrituras fallidas
+    python tools/subida.py SUMO_MASTER_V25.py --pty      # hub de prueba en un PTY
+    python tools/subida.py prog.py --tty /dev/ttyACM0    # placa MicroPython real por USB
+"""
+
+import os
+import random
+import select
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+from generar_hub import PAQUETE_BLE
+
+CTRL_C, CTRL_D, CTRL_E = b"\x03", b"\x04", b"\x05"
+PROMPT_REPL = b">>> "
+PROMPT_PEGAR = b"=== "
+AVISO_PEGAR = b"\r\npaste mode; Ctrl-C to cancel, Ctrl-D to finish\r\n" + PROMPT_PEGAR
+
+# ATT: 3 B de cabecera (opcode + handle) por escritura; el MTU por defecto
+# de BLE (23) deja los 20 B útiles que usa la app
+CABECERA_ATT = 3
+MTU_MINIMO = PAQUETE_BLE + CABECERA_ATT
+MTU_PEDIDO = 247
+
+# Valores por defecto del subidor
+VENTANA = 8
+REINTENTOS = 3
+PLAZO_S = 2.0
+ESPERA_FALLO_S = 0.03     # pausa tras un rechazo, para que el hub vacíe su buffer
+
+# Lo que hace hoy la app (usePybricksBle.ts): pausas fijas en ms
+APP_PAUSA_CTRL_C, APP_PAUSA_CTRL_E = 500, 800
+APP_PAUSA_TROZO, APP_PAUSA_TROZO_GRANDE, APP_UMBRAL_GRANDE = 60, 80, 2000
+
+
+class ErrorSubida(RuntimeError):
+    pass
+
+
+# ==============================================================================
+# --- TRANSPORTES ---
+# ==============================================================================
+# Contrato: escribir() encola un trozo y devuelve un ticket; esperar() espera
+# hasta que termine alguna escritura y devuelve [(ticket, ok)]. Los trozos
+# aceptados llegan en orden; si uno falla, el transporte descarta los que iban
+# detrás en la cola y también los da por fallidos (como la cola de escrituras
+# GATT), así que reenviar exactamente los fallidos, en orden, mantiene el flujo
+# de bytes íntegro.
+
+
+class Transporte(ABC):
+    """Enlace con el REPL del hub: EnlaceVirtual (BLE simulado) o TransporteTTY."""
+
+    def negociar_mtu(self, pedido):
+        return MTU_MINIMO
+
+    @abstractmethod
+    def escribir(self, datos, respuesta=False):
+        """Encola ``datos`` (con ``respuesta``, escritura GATT con ack); devuelve su ticket."""
+
+    @abstractmethod
+    def esperar(self, plazo_s):
+        """Espera hasta ``plazo_s`` a que acaben escrituras; devuelve [(ticket, ok), ...]."""
+
+    @abstractmethod
+    def leer(self):
+        """Bytes que ha enviado el hub desde la última llamada."""
+
+    def ahora(self):
+        return time.monotonic()
+
+    def dormir(self, segundos):
+        time.sleep(segundos)
+
+    def cerrar(self):
+        pass
+
+
+class HubEco:
+    """REPL de MicroPython reducido a lo que usa la subida: Ctrl-C, modo pegar y Ctrl-D.
+
+    Como pyexec.c: en modo pegar se hace eco de cada byte y cada '\\r' se
+    contesta con '\\r\\n=== '. El programa terminado se compila con compile()
+    para devolver el SyntaxError igual que lo haría el hub.
+    """
+
+    def __init__(self):
+        self.estado = "programa"
+        self.pegado = bytearray()
+        self.programas = []
+
+    def procesar(self, datos):
+        salida = bytearray()
+        for b in datos:
+            c = bytes((b,))
+            if self.estado == "pegar":
+                if c == CTRL_C:
+                    salida += b"\r\n" + PROMPT_REPL
+                    self.estado = "repl"
+                elif c == CTRL_D:
+                    salida += b"\r\n"
+                    salida += self._ejecutar(bytes(self.pegado))
+                elif c == b"\r":
+                    self.pegado += c
+                    salida += b"\r\n" + PROMPT_PEGAR
+                else:
+                    self.pegado += c
+                    salida += c
+            elif c == CTRL_C:
+                salida += b"\r\nKeyboardInterrupt\r\n" + PROMPT_REPL
+                self.estado = "repl"
+            elif c == CTRL_E and self.estado == "repl":
+                salida += AVISO_PEGAR
+                self.pegado = bytearray()
+                self.estado = "pegar"
+        return bytes(salida)
+
+    def _ejecutar(self, programa):
+        self.programas.append(programa)
+        self.estado = "programa"
+        try:
+            compile(programa.replace(b"\r", b"\n"), "<stdin>", "exec")
+        except SyntaxError as e:
+            self.estado = "repl"
+            return ("Traceback (most recent call last):\r\n  File \"<stdin>\", line %s\r\n"
+                    "SyntaxError: %s\r\n" % (e.lineno, e.msg)).encode() + PROMPT_REPL
+        return b""
+
+
+class EnlaceVirtual(Transporte):
+    """Enlace BLE simulado con reloj virtual hasta un HubEco en el mismo proceso.
+
+    Modelo: eventos de conexión cada ``intervalo_ms`` con ``paquetes_evento``
+    paquetes de enlace de ``ll_util`` B (27 sin DLE, 251 con DLE); cada
+    escritura ATT lleva 3 B de cabecera ATT + 4 de L2CAP. Las escrituras con
+    respuesta no se solapan (ATT admite una petición pendiente) y terminan un
+    evento después. El hub tiene ``buffer_hub`` B de recepción que vacía a
+    ``consumo_b_ms``: un trozo que no cabe se rechaza, igual que uno perdido
+    con probabilidad ``perdida``. Lo que responde el hub llega un evento más
+    tarde.
+    """
+
+    def __init__(self, mtu_max=MTU_PEDIDO, intervalo_ms=15.0, paquetes_evento=6, ll_util=251,
+                 buffer_hub=1024, consumo_b_ms=20.0, perdida=0.0, semilla=1):
+        self.mtu_max = mtu_max
+        self.intervalo_ms = intervalo_ms
+        self.paquetes_evento = paquetes_evento
+        self.ll_util = ll_util
+        self.buffer_hub = buffer_hub
+        self.consumo_b_ms = consumo_b_ms
+        self.perdida = perdida
+        self.rng = random.Random(semilla)
+        self.hub = HubEco()
+        self.t_ms = 0.0
+        self.cola = deque()       # [ticket, datos, fragmentos pendientes, respuesta]
+        self.hechas = []          # (ticket, ok)
+        self.con_respuesta = None  # (ticket, evento en que llega la respuesta)
+        self.salida = deque()     # (t visible, bytes)
+        self.ocupado = 0.0
+        self.t_drenado = 0.0
+        self.tickets = 0
+        self.bytes_aire = 0
+
+    def negociar_mtu(self, pedido):
+        return max(MTU_MINIMO, min(pedido, self.mtu_max))
+
+    def escribir(self, datos, respuesta=False):
+        self.tickets += 1
+        fragmentos = -(-(len(datos) + CABECERA_ATT + 4) // self.ll_util)
+        self.cola.append([self.tickets, bytes(datos), fragmentos, respuesta])
+        return self.tickets
+
+    def esperar(self, plazo_s):
+        limite = self.t_ms + plazo_s * 1000.0
+        while not self.hechas and self.t_ms < limite:
+            self._evento()
+        hechas, self.hechas = self.hechas, []
+        return hechas
+
+    def leer(self):
+        datos = bytearray()
+        while self.salida and self.salida[0][0] <= self.t_ms:
+            datos += self.salida.popleft()[1]
+        return bytes(datos)
+
+    def ahora(self):
+        return self.t_ms / 1000.0
+
+    def dormir(self, segundos):
+        fin = self.t_ms + segundos * 1000.0
+        while self.t_ms + self.intervalo_ms <= fin:
+            self._evento()
+        self.t_ms = max(self.t_ms, fin)
+
+    def _evento(self):
+        # Siguiente evento de conexión
+        self.t_ms = (int(self.t_ms / self.intervalo_ms) + 1) * self.intervalo_ms
+        if self.con_respuesta is not None:
+            if self.con_respuesta[1] > self.t_ms:
+                return
+            self.hechas.append((self.con_respuesta[0], True))
+            self.con_respuesta = None
+        cupo = self.paquetes_evento
+        while self.cola and cupo > 0 and self.con_respuesta is None:
+            escritura = self.cola[0]
+            n = min(cupo, escritura[2])
+            escritura[2] -= n
+            cupo -= n
+            if escritura[2]:
+                break
+            self.cola.popleft()
+            ticket, datos, _, respuesta = escritura
+            self.bytes_aire += len(datos) + CABECERA_ATT
+            if not self._entregar(datos):
+                self.hechas.append((ticket, False))
+                while self.cola:
+                    self.hechas.append((self.cola.popleft()[0], False))
+            elif respuesta:
+                self.con_respuesta = (ticket, self.t_ms + self.intervalo_ms)
+            else:
+                self.hechas.append((ticket, True))
+
+    def _entregar(self, datos):
+        self.ocupado = max(0.0, self.ocupado - (self.t_ms - self.t_drenado) * self.consumo_b_ms)
+        self.t_drenado = self.t_ms
+        if self.perdida and self.rng.random() < self.perdida:
+            return False
+        if self.ocupado + len(datos) > self.buffer_hub:
+            return False
+        self.ocupado += len(datos)
+        respuesta = self.hub.procesar(datos)
+        if respuesta:
+            self.salida.append((self.t_ms + self.intervalo_ms, respuesta))
+        return True
+
+
+class TransporteTTY(Transporte):
+    """Cualquier tty (puerto serie USB o PTY): una escritura es un write() al descriptor.
+
+    No hay MTU que negociar; el trozo es el que se pide. Una escritura de la
+    que el núcleo no acepta ni un byte (EAGAIN) cuenta como fallida.
+    """
+
+    def __init__(self, fd, cerrar_fd=False):
+        self.fd = fd
+        self.cerrar_fd = cerrar_fd
+        self.hechas = []
+        self.entrada = bytearray()
+        self.tickets = 0
+        os.set_blocking(fd, False)
+
+    @classmethod
+    def abrir(cls, ruta):
+        import termios
+        import tty
+        fd = os.open(ruta, os.O_RDWR | os.O_NOCTTY)
+        try:
+            tty.setraw(fd)
+        except termios.error:
+            pass
+        return cls(fd, cerrar_fd=True)
+
+    def negociar_mtu(self, pedido):
+        return pedido
+
+    def escribir(self, datos, respuesta=False):
+        # Lo que el núcleo ya aceptó no se puede retirar: una escritura parcial
+        # se termina (esperando a que el tty admita más) en vez de darla por fallida
+        self.tickets += 1
+        hecho = 0
+        while hecho < len(datos):
+            try:
+                hecho += os.write(self.fd, datos[hecho:])
+            except BlockingIOError:
+                if not hecho:
+                    break
+                self._vaciar()
+                select.select([], [self.fd], [], PLAZO_S)
+        self.hechas.append((self.tickets, hecho == len(datos)))
+        return self.tickets
+
+    def esperar(self, plazo_s):
+        # Se lee siempre lo que haya: un eco sin leer llena el tty y bloquea al hub
+        if not self.hechas:
+            select.select([self.fd], [], [], plazo_s)
+        self._vaciar()
+        hechas, self.hechas = self.hechas, []
+        return hechas
+
+    def leer(self):
+        self._vaciar()
+        datos, self.entrada = bytes(self.entrada), bytearray()
+        return datos
+
+    def _vaciar(self):
+        while True:
+            try:
+                trozo = os.read(self.fd, 4096)
+            except OSError:
+                break
+            if not trozo:
+                break
+            self.entrada += trozo
+
+    def cerrar(self):
+        if self.cerrar_fd:
+            os.close(self.fd)
+
+
+class HubPTY:
+    """HubEco servido en un hilo al otro lado de un PTY en modo raw."""
+
+    def __init__(self):
+        import pty
+        import threading
+        import tty
+        self.maestro, self.esclavo = pty.openpty()
+        tty.setraw(self.esclavo)
+        self.ruta = os.ttyname(self.esclavo)
+        self.hub = HubEco()
+        self.activo = True
+        self.hilo = threading.Thread(target=self._servir, daemon=True)
+        self.hilo.start()
+
+    def _servir(self):
+        while self.activo:
+            listo, _, _ = select.select([self.maestro], [], [], 0.05)
+            if not listo:
+                continue
+            try:
+                datos = os.read(self.maestro, 4096)
+            except OSError:
+                break
+            respuesta = self.hub.procesar(datos)
+            if respuesta:
+                os.write(self.maestro, respuesta)
+
+    def cerrar(self):
+        self.activo = False
+        self.hilo.join()
+        os.close(self.maestro)
+        os.close(self.esclavo)
+
+
+# ==============================================================================
+# --- SUBIDA ---
+# ==============================================================================
+
+
+class Subida:
+    """Sube un programa en modo pegar con ventana de escrituras y reintento por trozo."""
+
+    def __init__(self, transporte, ventana=VENTANA, mtu=MTU_PEDIDO, reintentos=REINTENTOS,
+                 plazo_s=PLAZO_S, verificar=True):
+        self.t = transporte
+        self.ventana = ventana
+        self.mtu = mtu
+        self.reintentos = reintentos
+        self.plazo_s = plazo_s
+        self.verificar = verificar
+        self.recibido = bytearray()
+
+    def subir(self, programa):
+        if isinstance(programa, str):
+            programa = programa.encode("utf-8")
+        if any(c in programa for c in (CTRL_C, CTRL_D, CTRL_E)):
+            raise ErrorSubida("el programa contiene bytes de control de la REPL")
+        t0 = self.t.ahora()
+        mtu = self.t.negociar_mtu(self.mtu)
+        tam = mtu - CABECERA_ATT
+
+        self._control(CTRL_C, PROMPT_REPL)
+        inicio = self._control(CTRL_E, AVISO_PEGAR)
+        trozos = [programa[i:i + tam] for i in range(0, len(programa), tam)]
+        reenvios = self._enviar(trozos)
+        self._control(CTRL_D, None)
+        if self.verificar:
+            self._comprobar_eco(programa, inicio)
+
+        t = self.t.ahora() - t0
+        return {
+            "bytes": len(programa), "mtu": mtu, "trozo": tam, "ventana": self.ventana,
+            "escrituras": len(trozos) + reenvios + 3, "reintentos": reenvios,
+            "t_s": t, "kB_s": len(programa) / 1000.0 / t if t > 0 else 0.0,
+        }
+
+    def _control(self, byte, prompt):
+        """Envía un byte de control; sin ventana, para no adelantarse al prompt."""
+        for _ in range(self.reintentos + 1):
+            ticket = self.t.escribir(byte)
+            if self._resultado(ticket):
+                break
+        else:
+            raise ErrorSubida("el enlace rechaza el byte de control %r" % byte)
+        if prompt is not None:
+            return self._esperar_texto(prompt)
+        return len(self.recibido)
+
+    def _resultado(self, ticket):
+        limite = self.t.ahora() + self.plazo_s
+        while self.t.ahora() < limite:
+            for t, ok in self.t.esperar(limite - self.t.ahora()):
+                if t == ticket:
+                    return ok
+        raise ErrorSubida("sin confirmación del enlace en %.1f s" % self.plazo_s)
+
+    def _esperar_texto(self, marca):
+        desde = len(self.recibido)
+        limite = self.t.ahora() + self.plazo_s
+        while True:
+            self.recibido += self.t.leer()
+            fin = self.recibido.find(marca, desde)
+            if fin >= 0:
+                return fin + len(marca)
+            if self.t.ahora() >= limite:
+                raise ErrorSubida("el hub no responde con %r" % marca)
+            self.t.esperar(0.02)
+
+    def _enviar(self, trozos):
+        # Ventana adaptativa: se parte a la mitad con cada rechazo (el hub no
+        # da abasto) y crece de uno en uno con las confirmaciones hasta el tope
+        pendientes = deque(range(len(trozos)))
+        en_vuelo = {}
+        fallos = [0] * len(trozos)
+        reenvios = 0
+        ventana = float(self.ventana)
+        while pendientes or en_vuelo:
+            while pendientes and len(en_vuelo) < int(ventana):
+                i = pendientes.popleft()
+                en_vuelo[self.t.escribir(trozos[i])] = i
+            hechas = self.t.esperar(self.plazo_s)
+            if not hechas:
+                raise ErrorSubida("sin confirmación del enlace en %.1f s" % self.plazo_s)
+            fallidos = []
+            for ticket, ok in hechas:
+                i = en_vuelo.pop(ticket, None)
+                if i is None:
+                    continue
+                if ok:
+                    ventana = min(self.ventana, ventana + 1.0 / int(ventana))
+                else:
+                    fallidos.append(i)
+            if fallidos:
+                # Solo el primero cuenta como fallo: los de detrás se descartaron
+                # por ir tras él. Todos van antes que lo que quedaba por enviar
+                fallidos.sort()
+                fallos[fallidos[0]] += 1
+                if fallos[fallidos[0]] > self.reintentos:
+                    raise ErrorSubida("trozo %d fallido %d veces" % (fallidos[0], fallos[fallidos[0]]))
+                reenvios += len(fallidos)
+                pendientes.extendleft(reversed(fallidos))
+                ventana = max(1.0, ventana / 2)
+                if not en_vuelo:
+                    self.t.dormir(ESPERA_FALLO_S)
+        return reenvios
+
+    def _comprobar_eco(self, programa, inicio):
+        limite = self.t.ahora() + self.plazo_s
+        esperado = programa.replace(b"\r", b"\r\n" + PROMPT_PEGAR)
+        while len(self.recibido) - inicio < len(esperado) and self.t.ahora() < limite:
+            self.t.esperar(0.02)
+            self.recibido += self.t.leer()
+        eco = bytes(self.recibido[inicio:inicio + len(esperado)])
+        if eco != esperado:
+            raise ErrorSubida("el eco del hub no coincide con el programa (%d/%d B)"
+                              % (len(eco), len(esperado)))
+
+
+def subida_app(transporte, programa):
+    """Lo que hace hoy usePybricksBle.uploadScript: 20 B con respuesta y pausas fijas."""
+    if isinstance(programa, str):
+        programa = programa.encode("utf-8")
+    t0 = transporte.ahora()
+    transporte.escribir(CTRL_C, respuesta=True)
+    transporte.dormir(APP_PAUSA_CTRL_C / 1000.0)
+    transporte.escribir(CTRL_E, respuesta=True)
+    transporte.dormir(APP_PAUSA_CTRL_E / 1000.0)
+    pausa = APP_PAUSA_TROZO_GRANDE if len(programa) > APP_UMBRAL_GRANDE else APP_PAUSA_TROZO
+    for i in range(0, len(programa), PAQUETE_BLE):
+        ticket = transporte.escribir(programa[i:i + PAQUETE_BLE], respuesta=True)
+        while ticket not in (t for t, _ in transporte.esperar(PLAZO_S)):
+            pass
+        transporte.dormir(pausa / 1000.0)
+    transporte.escribir(CTRL_D, respuesta=True)
+    transporte.esperar(PLAZO_S)
+    t = transporte.ahora() - t0
+    return {
+        "bytes": len(programa), "mtu": MTU_MINIMO, "trozo": PAQUETE_BLE, "ventana": 1,
+        "escrituras": -(-len(programa) // PAQUETE_BLE) + 3, "reintentos": 0,
+        "t_s": t, "kB_s": len(programa) / 1000.0 / t,
+    }
+
+
+# ==============================================================================
+# --- BENCH ---
+# ==============================================================================
+
+VARIANTES = (
+    # nombre, ventana, MTU pedido
+    ("ventana 1, MTU 23", 1, MTU_MINIMO),
+    ("ventana 4, MTU 23", 4, MTU_MINIMO),
+    ("ventana 8, MTU 23", 8, MTU_MINIMO),
+    ("ventana 4, MTU 247", 4, 247),
+    ("ventana 8, MTU 247", 8, 247),
+    ("ventana 16, MTU 247", 16, 247),
+)
+
+
+def bench(programa, perdida=0.0, semilla=1, **enlace):
+    filas = [("app (20 B, pausas)", subida_app(EnlaceVirtual(semilla=semilla, **enlace), programa))]
+    for nombre, ventana, mtu in VARIANTES:
+        t = EnlaceVirtual(perdida=perdida, semilla=semilla, **enlace)
+        try:
+            filas.append((nombre, Subida(t, ventana=ventana, mtu=mtu).subir(programa)))
+        except ErrorSubida as e:
+            print("%s: %s" % (nombre, e), file=sys.stderr)
+    return filas
+
+
+def tabla(filas):
+    print("%-20s %5s %6s %7s %11s %10s %8s %8s" % (
+        "variante", "mtu", "trozo", "ventana", "escrituras", "reintentos", "t_s", "kB/s"))
+    for nombre, r in filas:
+        print("%-20s %5d %6d %7d %11d %10d %8.2f %8.2f" % (
+            nombre, r["mtu"], r["trozo"], r["ventana"], r["escrituras"], r["reintentos"],
+            r["t_s"], r["kB_s"]))
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("script", nargs="?", help="programa a subir (por defecto, el script generado)")
+    ap.add_argument("--bench", action="store_true", help="compara la subida de la app con ventana/MTU")
+    ap.add_argument("--pty", action="store_true", help="sube a un hub de prueba servido en un PTY")
+    ap.add_argument("--tty", help="sube por un tty real (p. ej. /dev/ttyACM0)")
+    ap.add_argument("--ventana", type=int, default=VENTANA)
+    ap.add_argument("--mtu", type=int, default=MTU_PEDIDO)
+    ap.add_argument("--reintentos", type=int, default=REINTENTOS)
+    ap.add_argument("--perdida", type=float, default=0.0, help="probabilidad de escritura fallida (virtual)")
+    ap.add_argument("--intervalo", type=float, default=15.0, help="intervalo de conexión en ms (virtual)")
+    ap.add_argument("--sin-dle", action="store_true", help="paquetes de enlace de 27 B (virtual)")
+    ap.add_argument("--semilla", type=int, default=1)
+    args = ap.parse_args(argv)
+
+    if args.script:
+        with open(args.script, "rb") as f:
+            programa = f.read()
+    else:
+        from generar_hub import generar
+        programa = generar()[0].encode("utf-8")
+    enlace = {"intervalo_ms": args.intervalo, "ll_util": 27 if args.sin_dle else 251}
+
+    if args.bench:
+        tabla(bench(programa, args.perdida, args.semilla, **enlace))
+        print("(enlace virtual: intervalo %.1f ms, paquetes de enlace de %d B; %d B de programa)"
+              % (args.intervalo, enlace["ll_util"], len(programa)))
+        return 0
+
+    hub = None
+    if args.tty:
+        t = TransporteTTY.abrir(args.tty)
+    elif args.pty:
+        hub = HubPTY()
+        t = TransporteTTY.abrir(hub.ruta)
+    else:
+        t = EnlaceVirtual(perdida=args.perdida, semilla=args.semilla, **enlace)
+    try:
+        r = Subida(t, ventana=args.ventana, mtu=args.mtu, reintentos=args.reintentos).subir(programa)
+    except ErrorSubida as e:
+        print("error:", e, file=sys.stderr)
+        return 1
+    finally:
+        t.cerrar()
+        if hub is not None:
+            hub.cerrar()
+    tabla([(args.tty or ("pty" if args.pty else "virtual"), r)])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
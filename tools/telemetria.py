@@ -0,0 +1,152 @@
+"""Decoder for the binary telemetry frames streamed by SUMO_MASTER_V25.py.
+
+The hub sends one frame per recorded tick once telemetry is toggled on with
+the PC console key ``r``. Frames share stdout with normal ``print`` output, so
+the decoder resynchronises on the sync bytes and validates the checksum. A hub
+that observes another hub's BLE broadcast relays each new state in its own
+frames, decoded with ``--rele``.
+
+    python tools/telemetria.py captura.bin -o captura.csv
+    python tools/telemetria.py captura.bin --npz captura.npz   # requiere NumPy
+    python tools/telemetria.py captura.bin --rele -o vecino.csv
+"""
+
+import csv
+import struct
+import sys
+
+# Debe coincidir con TEL_FMT / TEL_REG del script del hub
+SYNC = b"\xa5\x5a"
+FMT_REGISTRO = "<IBHBBhhB"
+TAM_REGISTRO = struct.calcsize(FMT_REGISTRO)
+TAM_TRAMA = TAM_REGISTRO + 5
+
+CAMPOS = ("seq", "t", "trabajo", "dist", "suelo", "modo", "v", "giro", "flags")
+
+FLAGS = {
+    "caido": 1,
+    "pc": 2,
+    "arma": 4,
+    "ariete": 8,
+    "escape": 16,
+    "mando": 32,
+}
+
+
+def decodificar(datos):
+    """Devuelve (registros, estadísticas) a partir de los bytes capturados.
+
+    Cada registro es una tupla con los campos de ``CAMPOS``. Las estadísticas
+    cuentan tramas corruptas y saltos de secuencia (tramas perdidas en el hub).
+    """
+    registros = []
+    corruptas = 0
+    perdidas = 0
+    seq_prev = None
+    i = 0
+    n = len(datos)
+    while True:
+        i = datos.find(SYNC, i)
+        if i < 0 or i + TAM_TRAMA > n:
+            break
+        cuerpo = datos[i + 2:i + TAM_TRAMA - 1]
+        if sum(cuerpo) & 0xFF != datos[i + TAM_TRAMA - 1]:
+            corruptas += 1
+            i += 1
+            continue
+        seq = cuerpo[0] | cuerpo[1] << 8
+        if seq_prev is not None:
+            perdidas += (seq - seq_prev - 1) & 0xFFFF
+        seq_prev = seq
+        registros.append((seq,) + struct.unpack(FMT_REGISTRO, cuerpo[2:]))
+        i += TAM_TRAMA
+    return registros, {"tramas": len(registros), "corruptas": corruptas, "perdidas": perdidas}
+
+
+# Relé de la sección DIFUSIÓN BLE: A5 5D | canal u8 | dato u16 | suma u8
+SYNC_RELE = b"\xa5\x5d"
+TAM_RELE = 6
+CAMPOS_RELE = ("canal", "seq", "modo", "marcha", "caido", "dist_cm")
+
+
+def estado_difusion(dato):
+    """Campos del entero que publica el hub (sin el canal)."""
+    dato &= 0xFFFF
+    return (dato >> 13, (dato >> 8) & 3, (dato >> 10) & 3, (dato >> 12) & 1, dato & 0xFF)
+
+
+def decodificar_rele(datos):
+    """Estados reenviados por el hub que escucha: (registros, estadísticas)."""
+    registros = []
+    corruptas = 0
+    i = 0
+    while True:
+        i = datos.find(SYNC_RELE, i)
+        if i < 0 or i + TAM_RELE > len(datos):
+            break
+        cuerpo = datos[i + 2:i + TAM_RELE - 1]
+        if sum(cuerpo) & 0xFF != datos[i + TAM_RELE - 1]:
+            corruptas += 1
+            i += 1
+            continue
+        registros.append((cuerpo[0],) + estado_difusion(cuerpo[1] | cuerpo[2] << 8))
+        i += TAM_RELE
+    return registros, {"tramas": len(registros), "corruptas": corruptas, "perdidas": 0}
+
+
+def a_columnas(registros):
+    """Diccionario campo -> lista de valores."""
+    return {c: [r[k] for r in registros] for k, c in enumerate(CAMPOS)}
+
+
+def a_numpy(registros):
+    """Array estructurado de NumPy con un campo por columna."""
+    import numpy as np
+
+    tipos = [("seq", "u2"), ("t", "u4"), ("trabajo", "u1"), ("dist", "u2"), ("suelo", "u1"),
+             ("modo", "u1"), ("v", "i2"), ("giro", "i2"), ("flags", "u1")]
+    return np.array(registros, dtype=tipos)
+
+
+def escribir_csv(registros, destino, campos=CAMPOS):
+    w = csv.writer(destino)
+    w.writerow(campos)
+    w.writerows(registros)
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("entrada", help="captura binaria de stdout del hub ('-' = stdin)")
+    ap.add_argument("-o", "--csv", help="fichero CSV de salida ('-' = stdout)")
+    ap.add_argument("--npz", help="guarda las columnas como arrays de NumPy")
+    ap.add_argument("--rele", action="store_true", help="decodifica el relé de difusión BLE (A5 5D)")
+    args = ap.parse_args(argv)
+    if args.rele and args.npz:
+        ap.error("--npz sólo admite la telemetría")
+
+    if args.entrada == "-":
+        datos = sys.stdin.buffer.read()
+    else:
+        with open(args.entrada, "rb") as f:
+            datos = f.read()
+    registros, est = decodificar_rele(datos) if args.rele else decodificar(datos)
+    campos = CAMPOS_RELE if args.rele else CAMPOS
+
+    if args.csv == "-":
+        escribir_csv(registros, sys.stdout, campos)
+    elif args.csv:
+        with open(args.csv, "w", newline="") as f:
+            escribir_csv(registros, f, campos)
+    if args.npz:
+        import numpy as np
+
+        arr = a_numpy(registros)
+        np.savez(args.npz, **{c: arr[c] for c in CAMPOS})
+    print("tramas=%(tramas)d corruptas=%(corruptas)d perdidas=%(perdidas)d" % est, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
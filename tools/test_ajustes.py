@@ -0,0 +1,72 @@
+"""Ajustes en caliente contra el hub simulado: lo derivado sigue al valor nuevo.
+
+    python -m pytest tools/test_ajustes.py
+"""
+
+import os
+
+from bench_bucle import T_LISTO_MS
+from consola_pc import Emisor, trama_conducir
+from generar_hub import generar
+from pybricks_sim import Button, Simulador
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "SUMO_MASTER_V25.py")
+
+
+def _conducir_tras_ajuste(cambios, v, marchas=0, config=None):
+    """Sube ``marchas`` con el mando, ajusta y pide conducir a ``v``; devuelve (emisor, seq, res).
+
+    ``config`` sobrescribe el LIVE CONFIG del script (vía generar_hub).
+    """
+    sim = Simulador()
+    emisor = Emisor(lambda datos: sim.stdin.alimentar(datos), sim.ahora)
+    t = T_LISTO_MS + 200
+    for _ in range(marchas):
+        sim.pulsar_mando(t, Button.RIGHT, 60)
+        t += 400
+    seq = []
+    sim.en(t, lambda: seq.append(emisor.ajustar(cambios)))
+    sim.escribir_stdin(t + 200, trama_conducir(1, v, 0))
+    fuente = generar(config, minificado=False)[0] if config else None
+    res = sim.ejecutar(SCRIPT, t + 400, fuente=fuente)
+    assert res.error is None, res.error
+    salida = sim.stdout.buffer
+    fin = 0
+    for llegada, hasta in salida.marcas:
+        emisor.recibir(bytes(salida.datos[fin:hasta]), llegada)
+        fin = hasta
+    return emisor, seq[0], res
+
+
+def test_limite_pc_sigue_a_v_max():
+    # Marcha media y V_MAX recargado por encima de la marcha más larga: ése es el tope
+    emisor, seq, res = _conducir_tras_ajuste({"V_MAX": 900}, 1000,
+                                             config={"MARCHAS_CONDUCCION": [350, 650, 800]})
+    g = res.globales
+    assert emisor.ajustes.get(seq) is True
+    assert g["gear_idx"] == 1 and g["V_MAX"] == 900
+    assert g["MARCHAS_CONDUCCION"] == [350, 650, 800]  # la tabla guardable no cambia
+    assert g["PC_V_LIMITE"] == 900
+    assert res.filtrar("db", "drive")[-1].args[0] == 900
+
+
+def test_v_max_menor_no_toca_las_marchas():
+    emisor, seq, res = _conducir_tras_ajuste({"V_MAX": 600}, 1000, marchas=1)
+    g = res.globales
+    assert emisor.ajustes.get(seq) is True
+    assert g["gear_idx"] == 2 and g["V_MAX"] == 600
+    assert g["MARCHAS_CONDUCCION"] == [350, 650, 1000]
+    assert res.filtrar("db", "drive")[-1].args[0] == 1000
+
+
+def test_limite_pc_sin_ajuste():
+    _, _, res = _conducir_tras_ajuste({}, 1000, marchas=1)
+    assert res.globales["PC_V_LIMITE"] == 1000
+    assert res.filtrar("db", "drive")[-1].args[0] == 1000
+
+
+def test_t_arma_sigue_a_velocidad_golpe():
+    emisor, seq, res = _conducir_tras_ajuste({"VELOCIDAD_GOLPE": 500}, 0)
+    g = res.globales
+    assert emisor.ajustes.get(seq) is True
+    assert g["t_arma"] == g["ANGULO_GOLPE"] * 1000 // 500